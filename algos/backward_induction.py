@@ -0,0 +1,220 @@
+import time
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from models.agent import Agent
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
+
+
+class BackwardInduction(Agent):
+    def __init__(self, actions: Enum, horizon: int, gamma: Optional[float] = 1.0, checkpoint: Optional[int] = None,
+                 recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that solves the finite-horizon MDP problem with backward induction: the utility of a
+        state with k steps left is its reward plus the discounted best expected utility with k-1 steps left, and
+        the best action at time t is the one of stage k = horizon - t. Every stage is one batched Bellman backup.
+
+        Storing the action of every state at every stage takes horizon * states bytes. With checkpoint set, only
+        the utilities of every checkpoint-th stage are kept, and the actions of a stage are recomputed from the
+        checkpoint below it on demand, a segment of checkpoint stages at a time, so a pass through the whole plan
+        recomputes every stage once. Memory drops to horizon / checkpoint float64 utility vectors plus one segment
+        of int8 actions, which is smallest for checkpoint near sqrt(8 * horizon).
+
+        Args:
+            horizon (int): Number of time steps of the plan
+            gamma (float): Discount factor (optional, default = 1.0)
+            checkpoint (int): Stages between kept utilities (optional, default = None keeps the actions of every stage)
+            recorder (Recorder): Convergence telemetry recorder, records once per stage (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, recorder)
+        assert horizon > 0, "horizon must be positive"
+        assert checkpoint is None or checkpoint > 0, "checkpoint must be positive"
+        self.horizon = horizon
+        self.gamma = gamma
+        self.checkpoint = checkpoint
+        self.backups: int = 0
+
+        self.model: Optional[TransitionModel] = None
+        self.successors: Optional[np.ndarray] = None
+        self.initial_state: Optional[Tuple[int, int]] = None
+
+        # Actions of every stage, or utilities of every checkpoint-th stage and the last recomputed segment of actions
+        self.policies: Optional[np.ndarray] = None
+        self.checkpoints: Dict[int, np.ndarray] = {}
+        self.segment: Tuple[int, Optional[np.ndarray]] = (-1, None)
+
+        self.recomputed_stages: int = 0
+        self.recompute_time: float = 0.0
+
+    def backup(self, utilities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        One stage of backward induction
+
+        Args:
+            utilities (np.ndarray): Utilities with k-1 steps left
+
+        Returns:
+            Utilities with k steps left and the best action index of every state with k steps left
+        """
+        model: TransitionModel = self.model
+        action_expected_utility: np.ndarray = model.move_probabilities @ utilities[self.successors]
+        policy: np.ndarray = action_expected_utility.argmax(axis=0).astype(np.int8)
+
+        new_utilities: np.ndarray = action_expected_utility.max(axis=0)
+        new_utilities *= self.gamma
+        new_utilities += model.rewards
+        new_utilities[model.terminal_states] = model.rewards[model.terminal_states]
+
+        return new_utilities, policy
+
+    def solve_stages(self, model: TransitionModel) -> np.ndarray:
+        """
+        Backward induction from the last time step to the first, keeping the actions or checkpoints of the stages
+
+        Returns:
+            Utilities of all states with horizon steps left
+        """
+        # With no steps left a state is worth its reward
+        utilities: np.ndarray = model.rewards.astype(np.float64)
+
+        # Actions of every stage, or of the current segment only, which ends as the segment of the first time steps
+        self.policies = np.empty((self.horizon, model.n_states), dtype=np.int8) if self.checkpoint is None else None
+        segment: np.ndarray = np.empty((min(self.checkpoint or 1, self.horizon), model.n_states), dtype=np.int8)
+        self.checkpoints = {}
+
+        for stage in range(1, self.horizon + 1):
+            if self.checkpoint is not None and (stage - 1) % self.checkpoint == 0:
+                self.checkpoints[stage - 1] = utilities
+
+            new_utilities, policy = self.backup(utilities)
+            if self.policies is not None:
+                self.policies[stage - 1] = policy
+            else:
+                segment[(stage - 1) % self.checkpoint] = policy
+
+            # Record stage for analysis
+            self.recorder.record(new_utilities, np.abs(new_utilities - utilities).max(initial=0.0))
+            utilities = new_utilities
+
+        base: int = (self.horizon - 1) // self.checkpoint * self.checkpoint if self.checkpoint is not None else -1
+        self.segment = (base, segment[:self.horizon - base] if self.checkpoint is not None else None)
+
+        self.backups = self.horizon * model.n_states
+        return utilities
+
+    def stage_policy(self, stage: int) -> np.ndarray:
+        """
+        Best action index of every state with stage steps left, recomputing its segment from a checkpoint if needed
+        """
+        assert 1 <= stage <= self.horizon, f"stage {stage} is not in 1..{self.horizon}"
+        if self.policies is not None:
+            return self.policies[stage - 1]
+
+        base: int = (stage - 1) // self.checkpoint * self.checkpoint
+        if self.segment[0] != base:
+            start: float = time.perf_counter()
+            with self.profiler.phase("recompute"):
+                stages: int = min(self.checkpoint, self.horizon - base)
+                segment: np.ndarray = np.empty((stages, self.model.n_states), dtype=np.int8)
+                utilities: np.ndarray = self.checkpoints[base]
+                for offset in range(stages):
+                    utilities, segment[offset] = self.backup(utilities)
+            self.segment = (base, segment)
+            self.recomputed_stages += stages
+            self.recompute_time += time.perf_counter() - start
+            self.profiler.count("backups", stages * self.model.n_states)
+
+        return self.segment[1][stage - base - 1]
+
+    def policy_at(self, t: int) -> np.ndarray:
+        """
+        Best action of every cell at time step t
+
+        Args:
+            t (int): Time step, 0 is the first step from the initial state
+
+        Returns:
+            (height, width) int8 action indices, -1 for walls
+        """
+        assert 0 <= t < self.horizon, f"time step {t} is not in 0..{self.horizon - 1}"
+        return self.model.to_grid(self.stage_policy(self.horizon - t), fill=-1)
+
+    def plan(self, start: Optional[Tuple[int, int]] = None) -> List[Tuple[Tuple[int, int], Any]]:
+        """
+        Nominal plan: the action of every time step along the path of intended moves, staying in place
+        when a move is blocked and stopping at a terminal state
+
+        Args:
+            start (Tuple[int, int]): Start state (optional, default = environment's initial state)
+
+        Returns:
+            (state, ACTIONS member) of every time step
+        """
+        model: TransitionModel = self.model
+        actions: List = list(self.ACTIONS)
+        state: Tuple[int, int] = tuple(start) if start is not None else self.initial_state
+        index: int = int(model.state_index[state])
+        assert index >= 0, "Start state must not be a wall"
+
+        steps: List[Tuple[Tuple[int, int], Any]] = []
+        for t in range(self.horizon):
+            if model.terminal[index]:
+                break
+            action = actions[int(self.stage_policy(self.horizon - t)[index])]
+            steps.append((state, action))
+
+            row, col = state[0] + action.value[0], state[1] + action.value[1]
+            if 0 <= row < model.height and 0 <= col < model.width and model.state_index[row, col] >= 0:
+                state, index = (row, col), int(model.state_index[row, col])
+
+        return steps
+
+    def memory(self) -> dict:
+        """
+        Returns:
+            Bytes of the kept stages, bytes of the full (horizon, height, width) int8 policy tensor,
+            and the stages recomputed so far with their wall time
+        """
+        stored: int = self.policies.nbytes if self.policies is not None else \
+            sum(utilities.nbytes for utilities in self.checkpoints.values()) + (self.segment[1].nbytes if self.segment[1] is not None else 0)
+        return {"stored_bytes": stored, "tensor_bytes": self.horizon * self.model.height * self.model.width,
+                "recomputed_stages": self.recomputed_stages, "recompute_time": self.recompute_time}
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that calculates the utilities and time-dependent policy of all states
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results including utilities with horizon steps left, the policy of the first time step, no. of stages and memory use
+        """
+        self.model = self.get_transition_model(env)
+        self.successors = np.ascontiguousarray(self.model.successors.T)
+        self.initial_state = tuple(env.agent_pos)
+        self.recomputed_stages, self.recompute_time = 0, 0.0
+
+        self.recorder.start(self.model)
+        with self.profiler.phase("evaluation"):
+            utilities: np.ndarray = self.solve_stages(self.model)
+        self.recorder.close()
+        self.profiler.count("backups", self.backups)
+        self.profiler.count("sweeps", self.horizon)
+
+        with self.profiler.phase("policy_extraction"):
+            policy_grid: List[List] = self.policy_to_grid(self.stage_policy(self.horizon), self.model)
+
+        return {
+            "utilities": self.model.to_grid(utilities),
+            "policy": policy_grid,
+            "iterations": self.horizon,
+            "backups": self.backups,
+            "horizon": self.horizon,
+            "memory": self.memory(),
+            "algorithm": "backward_induction"
+        }
@@ -0,0 +1,153 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from models.agent import Agent
+from models.environment import Environment
+from models.transition_model import TransitionModel
+
+
+class BatchValueIteration(Agent):
+    def __init__(self, actions: Enum, gammas: Sequence[float] = (0.99,), epsilons: Sequence[float] = (0.1,),
+                 workers: Optional[int] = None, output_dir: Optional[str] = None):
+        """
+        Initializes an agent that solves many environments for many (gamma, epsilon) settings
+        using Value Iteration. Environments of the same shape are stacked and solved together
+        with one vectorized Bellman backup, groups of different shapes run on a process pool.
+
+        Args:
+            gammas (Sequence[float]): Discount factors to solve every environment for (optional, default = (0.99,))
+            epsilons (Sequence[float]): Maximum errors to solve every environment for (optional, default = (0.1,))
+            workers (int): Processes used for groups of different shapes, 1 solves in-process (optional, default = cpu count)
+            output_dir (str): Directory to save utilities to as .npy files (optional, default = None)
+        """
+        super().__init__(actions)
+        self.actions = {action.name: action.value for action in self.ACTIONS}
+        self.gammas = list(gammas)
+        self.epsilons = list(epsilons)
+        self.workers = workers
+        self.output_dir = output_dir
+
+    def solve(self, envs: List[Environment], ids: Optional[List] = None) -> pd.DataFrame:
+        """
+        Solves every environment for every (gamma, epsilon) setting
+
+        Args:
+            envs (List[Environment]): Environments to solve
+            ids (List): Identifier of each environment (optional, default = position in envs)
+
+        Returns:
+            One row per (grid_id, gamma, epsilon) with iterations, wall time and utilities path
+        """
+        ids = list(range(len(envs))) if ids is None else list(ids)
+        if self.output_dir is not None:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        # Group environments by shape and slip model, which together fix the stacked move probabilities
+        groups: DefaultDict[Tuple, List[int]] = defaultdict(list)
+        for index, env in enumerate(envs):
+            groups[(env.grid_height, env.grid_width, tuple(sorted(env.slip.items())))].append(index)
+
+        jobs: List[Tuple] = [(self.actions, [envs[i] for i in group], [ids[i] for i in group],
+                              self.gammas, self.epsilons, self.output_dir) for group in groups.values()]
+
+        if self.workers == 1 or len(jobs) <= 1:
+            rows: List[dict] = [row for job in jobs for row in solve_group(*job)]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                rows = [row for result in executor.map(solve_group, *zip(*jobs)) for row in result]
+
+        # Restore the order of the input environments
+        order: dict = {grid_id: index for index, grid_id in enumerate(ids)}
+        rows.sort(key=lambda row: order[row["grid_id"]])
+
+        return pd.DataFrame(rows, columns=["grid_id", "gamma", "epsilon", "iterations", "wall_time", "utilities_path"])
+
+
+def solve_group(actions: dict, envs: List[Environment], ids: List, gammas: List[float], epsilons: List[float],
+                output_dir: Optional[str] = None) -> List[dict]:
+    """
+    Solves same-shaped environments for every (gamma, epsilon) setting with one vectorized Bellman backup.
+    Every (environment, gamma, epsilon) item owns a block of the stacked state vector and stops updating
+    once it meets its own epsilon*(1-gamma)/gamma threshold.
+
+    Returns:
+        Summary row of every item
+    """
+    start: float = time.perf_counter()
+    models: List[TransitionModel] = [env.get_transition_model(list(actions.values())) for env in envs]
+    move_probabilities: np.ndarray = models[0].move_probabilities
+    assert all(model.moves == models[0].moves and np.array_equal(model.move_probabilities, move_probabilities)
+               for model in models), "Stacked environments must share the same transition model"
+
+    items: List[Tuple[int, float, float]] = [(g, gamma, epsilon) for g in range(len(envs)) for gamma in gammas for epsilon in epsilons]
+    sizes: np.ndarray = np.array([models[g].n_states for g, _, _ in items], dtype=np.int64)
+    offsets: np.ndarray = np.concatenate([[0], np.cumsum(sizes)])
+
+    # Stacked state vector of all items
+    successors: np.ndarray = np.concatenate([models[g].successors.T + offsets[n] for n, (g, _, _) in enumerate(items)], axis=1)
+    rewards: np.ndarray = np.concatenate([models[g].rewards for g, _, _ in items])
+    terminal: np.ndarray = np.concatenate([models[g].terminal for g, _, _ in items])
+    terminals: np.ndarray = np.flatnonzero(terminal)
+    discounts: np.ndarray = np.repeat([gamma for _, gamma, _ in items], sizes)
+    thresholds: np.ndarray = np.array([epsilon * (1 - gamma) / gamma for _, gamma, epsilon in items])
+
+    utilities: np.ndarray = np.zeros(offsets[-1], dtype=np.float64)
+    solved: np.ndarray = np.zeros(offsets[-1], dtype=np.float64)
+    iterations: np.ndarray = np.zeros(len(items), dtype=np.int64)
+    wall_time: np.ndarray = np.zeros(len(items), dtype=np.float64)
+
+    # Items without states are solved without any sweep
+    active: np.ndarray = sizes > 0
+    iteration: int = 0
+
+    while active.any():
+        iteration += 1
+
+        # Bellman Update of every state of every active item
+        new_utilities: np.ndarray = (move_probabilities @ utilities[successors]).max(axis=0)
+        new_utilities *= discounts
+        new_utilities += rewards
+        new_utilities[terminals] = rewards[terminals]
+
+        # Delta of every active item, its states are contiguous in the stacked vector
+        live: np.ndarray = np.nonzero(active)[0]
+        segments: np.ndarray = np.concatenate([[0], np.cumsum(sizes[live])[:-1]])
+        delta: np.ndarray = np.maximum.reduceat(np.abs(new_utilities - utilities), segments)
+        utilities = new_utilities
+
+        converged: np.ndarray = delta <= thresholds[live]
+        if not converged.any():
+            continue
+
+        # Store converged items and drop their states from the stacked vector
+        elapsed: float = time.perf_counter() - start
+        for n, segment in zip(live[converged], segments[converged]):
+            solved[offsets[n]:offsets[n+1]] = utilities[segment:segment+sizes[n]]
+            iterations[n] = iteration
+            wall_time[n] = elapsed
+
+        keep: np.ndarray = np.repeat(~converged, sizes[live])
+        remap: np.ndarray = np.cumsum(keep) - 1
+        successors = remap[successors[:, keep]]
+        utilities, rewards, discounts, terminal = utilities[keep], rewards[keep], discounts[keep], terminal[keep]
+        terminals = np.flatnonzero(terminal)
+        active[live[converged]] = False
+
+    rows: List[dict] = []
+    for n, (g, item_gamma, epsilon) in enumerate(items):
+        path: Optional[str] = None
+        if output_dir is not None:
+            path = os.path.join(output_dir, f"grid{ids[g]}_gamma{item_gamma}_epsilon{epsilon}.npy")
+            np.save(path, models[g].to_grid(solved[offsets[n]:offsets[n+1]]))
+
+        rows.append({"grid_id": ids[g], "gamma": item_gamma, "epsilon": epsilon, "iterations": int(iterations[n]),
+                     "wall_time": float(wall_time[n]), "utilities_path": path})
+
+    return rows
@@ -0,0 +1,194 @@
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from models.agent import Agent
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
+
+
+class ModifiedPolicyIteration(Agent):
+    # Fractions of states changing action below which the number of evaluation sweeps doubles, and above which it halves
+    LOW_CHANGE_RATE = 0.01
+    HIGH_CHANGE_RATE = 0.05
+
+    # Margin below which an action is never eliminated, guards against rounding errors
+    ELIMINATION_TOLERANCE = 1e-9
+
+    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99, min_sweeps: Optional[int] = 1,
+                 max_sweeps: Optional[int] = 128, elimination: Optional[bool] = True, recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that solves the MDP problem using Modified Policy Iteration: every greedy
+        improvement step is followed by a few sweeps evaluating the current policy. The number of
+        sweeps doubles while few states change action and halves while many do.
+        Actions that are provably suboptimal are eliminated, so improvement steps only back up the surviving actions.
+
+        Args:
+            epsilon (float): Maximum error allowed in the utility of any state
+            gamma (float): Discount factor (optional, default = 0.99)
+            min_sweeps (int): Fewest evaluation sweeps per iteration (optional, default = 1)
+            max_sweeps (int): Most evaluation sweeps per iteration (optional, default = 128)
+            elimination (bool): Eliminate suboptimal actions with bounds on the optimal utilities (optional, default = True)
+            recorder (Recorder): Convergence telemetry recorder (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, recorder)
+        self.epsilon = epsilon
+        self.gamma = gamma
+        self.min_sweeps = min_sweeps
+        self.max_sweeps = max_sweeps
+        self.elimination = elimination
+        self.backups: int = 0
+
+    def improvement(self, utilities: np.ndarray, policy: np.ndarray, alive: np.ndarray, surviving: List[Tuple[np.ndarray, np.ndarray]],
+                    model: TransitionModel) -> Tuple[np.ndarray, int, int]:
+        """
+        Greedy Bellman backup of every surviving (state, action) pair, then elimination of actions
+        whose upper bound falls below the lower bound of the optimal utility of their state.
+
+        With TU the backed up utilities, U* lies between TU + gamma/(1-gamma)*min(TU-U) and
+        TU + gamma/(1-gamma)*max(TU-U), so an action whose expected utility is more than
+        gamma/(1-gamma)*span(TU-U) below the best one can never be optimal.
+
+        Args:
+            utilities (np.ndarray): Current utilities
+            policy (np.ndarray): Current action index of every state, updated in place
+            alive (np.ndarray): (n_actions, n_states) mask of surviving actions, updated in place
+            surviving (List[Tuple[np.ndarray, np.ndarray]]): States and move-major successors of every action's surviving pairs, updated in place
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Backed up utilities, number of states that changed action and number of (state, action) backups
+        """
+        # Expected utility of the surviving pairs of every action, -inf for eliminated pairs
+        expected_utilities: np.ndarray = np.full((model.n_actions, model.n_states), -np.inf)
+        for a, (states, successors) in enumerate(surviving):
+            expected_utilities[a, states] = model.move_probabilities[a] @ utilities[successors]
+        if len(model.terminal_states):
+            expected_utilities[:, model.terminal_states] = np.where(alive[:, model.terminal_states], 0.0, -np.inf)
+
+        best: np.ndarray = expected_utilities.max(axis=0)
+        new_utilities: np.ndarray = model.rewards + self.gamma * best
+
+        # Switch to the best action, keeping the current action on ties
+        states: np.ndarray = np.arange(model.n_states)
+        changed: np.ndarray = expected_utilities[policy, states] < best - ModifiedPolicyIteration.ELIMINATION_TOLERANCE
+        policy[changed] = expected_utilities[:, changed].argmax(axis=0)
+
+        if self.elimination and model.n_states:
+            difference: np.ndarray = new_utilities - utilities
+            margin: float = self.gamma / (1 - self.gamma) * (difference.max() - difference.min())
+            suboptimal: np.ndarray = alive & (self.gamma * (best - expected_utilities) > margin + ModifiedPolicyIteration.ELIMINATION_TOLERANCE)
+
+            if suboptimal.any():
+                alive &= ~suboptimal
+                self.surviving_pairs(alive, model, surviving)
+
+        return new_utilities, int(changed.sum()), sum(len(states) for states, _ in surviving)
+
+    def surviving_pairs(self, alive: np.ndarray, model: TransitionModel, surviving: List[Tuple[np.ndarray, np.ndarray]]) -> None:
+        """
+        Rebuilds the states and move-major successors of every action's surviving pairs
+        """
+        successors: np.ndarray = model.successors.T
+        surviving[:] = [(states, np.ascontiguousarray(successors[:, states])) for states in map(np.flatnonzero, alive)]
+
+    def evaluation(self, utilities: np.ndarray, transitions, sweeps: int, model: TransitionModel) -> np.ndarray:
+        """
+        Sweeps of simplified value iteration for a fixed policy
+
+        Args:
+            utilities (np.ndarray): Current utilities
+            transitions (scipy.sparse.csr_matrix): Discounted transition matrix gamma*P_pi of the policy
+            sweeps (int): Number of sweeps
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Updated utilities
+        """
+        for _ in range(sweeps):
+            utilities = transitions @ utilities
+            utilities += model.rewards
+        return utilities
+
+    def solve_utilities(self, model: TransitionModel) -> Tuple[np.ndarray, np.ndarray, int, List[dict]]:
+        """
+        Alternates improvement and adaptive evaluation until the Bellman residual meets epsilon
+
+        Returns:
+            Utilities, policy, number of iterations and per-iteration statistics
+        """
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+        policy: np.ndarray = np.zeros(model.n_states, dtype=np.int64)
+        alive: np.ndarray = np.ones((model.n_actions, model.n_states), dtype=bool)
+        surviving: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.surviving_pairs(alive, model, surviving)
+
+        threshold: float = self.epsilon * (1 - self.gamma) / self.gamma
+        sweeps: int = self.min_sweeps
+        transitions = None
+        history: List[dict] = []
+        self.backups = 0
+
+        while True:
+            with self.profiler.phase("improvement"):
+                new_utilities, changes, pair_backups = self.improvement(utilities, policy, alive, surviving, model)
+            delta: float = np.abs(new_utilities - utilities).max(initial=0.0)
+            utilities = new_utilities
+            self.backups += pair_backups
+
+            # Record improvement step for analysis
+            self.recorder.record(utilities, delta)
+
+            if delta <= threshold:
+                history.append({"iteration": len(history) + 1, "sweeps": 0, "policy_changes": changes,
+                                "pruned_actions": int(alive.size - alive.sum()), "backups": pair_backups})
+                break
+
+            # More evaluation sweeps while the policy is stable, fewer while it changes a lot
+            if changes <= ModifiedPolicyIteration.LOW_CHANGE_RATE * model.n_states:
+                sweeps = min(2 * sweeps, self.max_sweeps)
+            elif changes > ModifiedPolicyIteration.HIGH_CHANGE_RATE * model.n_states:
+                sweeps = max(sweeps // 2, self.min_sweeps)
+
+            with self.profiler.phase("evaluation"):
+                if changes or transitions is None:
+                    transitions = self.gamma * model.policy_matrix(policy)
+                utilities = self.evaluation(utilities, transitions, sweeps, model)
+            self.backups += sweeps * model.n_states
+
+            history.append({"iteration": len(history) + 1, "sweeps": sweeps, "policy_changes": changes,
+                            "pruned_actions": int(alive.size - alive.sum()), "backups": pair_backups + sweeps * model.n_states})
+
+        return utilities, policy, len(history), history
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that calculates final utilities and policies of all states
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results including final utilities, optimal policies, no. of iterations and per-iteration statistics
+        """
+        model: TransitionModel = self.get_transition_model(env)
+
+        self.recorder.start(model)
+        utilities, policy, iterations, history = self.solve_utilities(model)
+        self.recorder.close()
+        self.profiler.count("backups", self.backups)
+        self.profiler.count("sweeps", sum(entry["sweeps"] for entry in history) + iterations)
+
+        with self.profiler.phase("policy_extraction"):
+            policy_grid: List[List] = self.policy_to_grid(policy, model)
+
+        return {
+            "utilities": model.to_grid(utilities),
+            "policy": policy_grid,
+            "iterations": iterations,
+            "backups": self.backups,
+            "algorithm": "modified_policy_iteration",
+            "history": history
+        }
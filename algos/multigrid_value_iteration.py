@@ -0,0 +1,184 @@
+import time
+from enum import Enum
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
+
+
+def coarsen(env: Environment, gamma: float) -> Tuple[Environment, float]:
+    """
+    Aggregates every 2x2 block of cells into one cell. One coarse step covers two fine steps,
+    so the coarse problem discounts by gamma^2 and collects (1 + gamma) times the reward of a cell,
+    which keeps utilities on the scale of the fine problem.
+    A block is a wall only if all its cells are walls, so no path is cut, and takes the mean reward of
+    its open cells, so a block is not valued as if the agent always stood on its best cell. Blocks are
+    terminal only if all their open cells are.
+
+    Args:
+        env (Environment): Environment to coarsen
+        gamma (float): Discount factor of the environment's problem
+
+    Returns:
+        Coarse environment and its discount factor
+    """
+    walls, rewards, terminal = env.get_arrays()
+    height, width = -(-env.grid_height // 2), -(-env.grid_width // 2)
+
+    # Pad to even dimensions with walls, then view the grid as (height, 2, width, 2) blocks
+    def blocks(array: np.ndarray, fill) -> np.ndarray:
+        padded: np.ndarray = np.full((2 * height, 2 * width), fill, dtype=array.dtype)
+        padded[:env.grid_height, :env.grid_width] = array
+        return padded.reshape(height, 2, width, 2)
+
+    open_cells: np.ndarray = ~blocks(walls, True)
+    n_open: np.ndarray = open_cells.sum(axis=(1, 3))
+    mean_rewards: np.ndarray = np.where(open_cells, blocks(rewards, 0.0), 0.0).sum(axis=(1, 3)) / np.maximum(n_open, 1)
+    coarse_terminal: np.ndarray = (n_open > 0) & ((blocks(terminal, False) | ~open_cells).all(axis=(1, 3)))
+
+    # Terminal utilities are their reward, other cells collect the reward of two fine steps
+    coarse_rewards: np.ndarray = np.where(coarse_terminal, mean_rewards, (1 + gamma) * mean_rewards)
+    cells: np.ndarray = np.where(n_open > 0, Environment.CELL_TYPES.index('Wh'), Environment.WALL_CODE).astype(np.uint8)
+
+    coarse: Environment = Environment(grid_world=cells, rewards=coarse_rewards, initial_state=(env.agent_pos[0] // 2, env.agent_pos[1] // 2),
+                                      slip=env.slip, terminals=np.argwhere(coarse_terminal).tolist())
+    return coarse, gamma ** 2
+
+
+def prolong(coarse_utilities: np.ndarray, model: TransitionModel) -> np.ndarray:
+    """
+    Copies the utility of every coarse cell to the 2x2 block of fine states below it
+
+    Args:
+        coarse_utilities (np.ndarray): Utility grid of the coarse level, walls are never read since a block with a fine state is open
+        model (TransitionModel): Compiled model of the fine level
+
+    Returns:
+        Utilities of the fine states, indexed by dense state index
+    """
+    coarse: np.ndarray = np.asarray(coarse_utilities, dtype=np.float64)
+    return coarse[model.states[:, 0] // 2, model.states[:, 1] // 2]
+
+
+class MultigridValueIteration(VectorizedValueIteration):
+    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99, levels: Optional[int] = None,
+                 min_size: Optional[int] = 16, coarse_epsilon: Optional[float] = None, recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that solves the MDP problem using coarse-to-fine Value Iteration.
+        The grid is coarsened by 2x2 aggregation, the coarsest level is solved from zero utilities and
+        every finer level is warm-started from the prolonged utilities of the level above it.
+        The full resolution level stops with the usual max-norm rule, so the epsilon guarantee is unchanged.
+
+        Args:
+            epsilon (float): Maximum error allowed in the utility of any state
+            gamma (float): Discount factor (optional, default = 0.99)
+            levels (int): Number of coarse levels (optional, default = coarsen while both sides exceed min_size)
+            min_size (int): Smallest side of a coarse level when levels is not set (optional, default = 16)
+            coarse_epsilon (float): Maximum error of the coarse solutions, which are only warm starts (optional, default = 10 * epsilon)
+            recorder (Recorder): Convergence telemetry recorder, records sweeps of the full resolution level (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, epsilon, gamma, recorder=recorder)
+        self.levels = levels
+        self.min_size = min_size
+        self.coarse_epsilon = coarse_epsilon if coarse_epsilon is not None else 10 * epsilon
+        self.level_sweeps: List[dict] = []
+        self.coarse_backups: int = 0
+        self.warm_start: Optional[np.ndarray] = None
+
+    def coarse_levels(self, env: Environment) -> List[Tuple[Environment, float]]:
+        """
+        Coarse environments with their discount factors, from the finest to the coarsest
+        """
+        levels: List[Tuple[Environment, float]] = []
+        current, gamma = env, self.gamma
+        while (len(levels) < self.levels if self.levels is not None else min(current.grid_height, current.grid_width) > 2 * self.min_size):
+            current, gamma = coarsen(current, gamma)
+            levels.append((current, gamma))
+        return levels
+
+    def solve_coarse(self, env: Environment) -> Optional[np.ndarray]:
+        """
+        Solves the coarse levels from the coarsest up, each warm-started from the one above it
+
+        Returns:
+            Utility grid of the finest coarse level, None without coarse levels
+        """
+        coarse_utilities: Optional[np.ndarray] = None
+        for depth, (level, gamma) in reversed(list(enumerate(self.coarse_levels(env), start=1))):
+            solver: VectorizedValueIteration = VectorizedValueIteration({action.name: action.value for action in self.ACTIONS},
+                                                                        self.coarse_epsilon, gamma, recorder=Recorder())
+            model: TransitionModel = solver.get_transition_model(level)
+            initial: Optional[np.ndarray] = prolong(coarse_utilities, model) if coarse_utilities is not None else None
+
+            start: float = time.perf_counter()
+            solver.start_stopping()
+            utilities, sweeps = solver.solve_utilities(model, initial)
+            self.level_sweeps.append({"level": depth, "height": level.grid_height, "width": level.grid_width, "states": model.n_states,
+                                      "sweeps": sweeps, "wall_time": time.perf_counter() - start})
+            self.coarse_backups += solver.backups
+            coarse_utilities = model.to_grid(utilities)
+
+        return coarse_utilities
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that calculates final utilities and policies of all states
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results including final utilities, optimal policies, no. of iterations at full resolution and the sweeps of every level
+        """
+        self.level_sweeps = []
+        self.coarse_backups = 0
+        with self.profiler.phase("coarse"):
+            self.warm_start = self.solve_coarse(env)
+
+        result: dict = super().solve(env)
+        result["backups"] = self.backups
+        result["levels"] = self.level_sweeps
+        result["algorithm"] = "multigrid_value_iteration"
+
+        return result
+
+    def solve_utilities(self, model: TransitionModel, utilities: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+        if utilities is None and self.warm_start is not None:
+            utilities = prolong(self.warm_start, model)
+
+        start: float = time.perf_counter()
+        utilities, iterations = super().solve_utilities(model, utilities)
+        self.level_sweeps.append({"level": 0, "height": model.height, "width": model.width, "states": model.n_states,
+                                  "sweeps": iterations, "wall_time": time.perf_counter() - start})
+        self.backups += self.coarse_backups
+
+        return utilities, iterations
+
+
+def multigrid_benchmark(actions: dict, envs: Dict[str, Environment], epsilon: float = 0.1, gamma: float = 0.99) -> pd.DataFrame:
+    """
+    Solves every environment with flat and multigrid value iteration
+
+    Returns:
+        Sweeps at full resolution, backups, wall time and max-norm difference of the two solvers for every environment
+    """
+    rows: List[dict] = []
+    for name, env in envs.items():
+        results: dict = {}
+        for solver, agent in (("flat", VectorizedValueIteration(actions, epsilon, gamma, recorder=Recorder())),
+                              ("multigrid", MultigridValueIteration(actions, epsilon, gamma, recorder=Recorder()))):
+            start: float = time.perf_counter()
+            results[solver] = agent.solve(env)
+            rows.append({"grid": name, "solver": solver, "height": env.grid_height, "width": env.grid_width,
+                         "sweeps": results[solver]["iterations"], "backups": results[solver]["backups"],
+                         "wall_time": time.perf_counter() - start})
+
+        rows[-1]["max_difference"] = float(np.nanmax(np.abs(np.asarray(results["flat"]["utilities"], dtype=np.float64) -
+                                                             np.asarray(results["multigrid"]["utilities"], dtype=np.float64)), initial=0.0))
+
+    return pd.DataFrame(rows)
@@ -1,5 +1,5 @@
 import random
-from collections import defaultdict
+import time
 from enum import Enum
 from typing import *
 
@@ -7,31 +7,78 @@ import numpy as np
 
 from models.agent import Agent
 from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
 
 
 class PolicyIteration(Agent):
-    def __init__(self, actions: Enum,  k: Optional[int] = 100, gamma: Optional[float] = 0.99):
+    EVALUATION_STRATEGIES = ("sweep", "direct", "iterative", "auto")
+
+    # Largest number of states for which "auto" evaluation uses a direct sparse solve
+    DIRECT_MAX_STATES = 250000
+
+    # Gain in expected utility below which the current action is kept, so ties cannot make the policy cycle
+    IMPROVEMENT_TOLERANCE = 1e-10
+
+    def __init__(self, actions: Enum,  k: Optional[int] = 100, gamma: Optional[float] = 0.99,
+                 evaluation: Optional[str] = "sweep", tolerance: Optional[float] = None, recorder: Optional[Recorder] = None):
         """
         Initializes an agent that solves the MDP problem using Policy Iteration 
 
         Args:
             k (int): Maximum number of iterations (optional, default = 100)
             gamma (float): Discount factor (optional, default = 0.99)
+            evaluation (str): Policy evaluation strategy (optional, default = "sweep")
+                sweep: simplified value iteration for up to k sweeps
+                direct: exact sparse solve of (I - gamma*P_pi)U = R
+                iterative: BiCGSTAB solve warm-started from the previous utilities
+                auto: direct for up to DIRECT_MAX_STATES states, iterative otherwise
+            tolerance (float): Residual at which evaluation stops early, sweeps always run k times if None (optional, default = None)
+            recorder (Recorder): Convergence telemetry recorder (optional, default = summary of every sweep)
         """
-        super().__init__(actions)
+        super().__init__(actions, recorder)
+        assert evaluation in PolicyIteration.EVALUATION_STRATEGIES
         self.gamma = gamma
         self.k = k
+        self.evaluation = evaluation
+        self.tolerance = tolerance
+
+    def policy_evaluation(self, policy: np.ndarray, utilities: np.ndarray, model: TransitionModel) -> Tuple[np.ndarray, int, str]:
+        """
+        Updates utilities using the current policy with the configured evaluation strategy
 
-        self.data_analysis = defaultdict(list)
+        Args:
+            policy (np.ndarray): Current action index of every state
+            utilities (np.ndarray): Current utilities
+            model (TransitionModel): Compiled states and transformer model of the environment
 
-    def policy_evaluation(self, policy: List[List], utilities: np.ndarray, env: Environment) -> Tuple[np.ndarray, int]:
+        Returns:
+            Updated utilities, number of inner iterations and the strategy used, "auto" resolved to "direct" or "iterative"
+        """
+        evaluation: str = self.evaluation
+        if evaluation == "auto":
+            evaluation = "direct" if model.n_states <= PolicyIteration.DIRECT_MAX_STATES else "iterative"
+
+        if evaluation == "direct":
+            new_utilities, iterations = self.direct_evaluation(policy, model)
+        elif evaluation == "iterative":
+            new_utilities, iterations = self.iterative_evaluation(policy, utilities, model)
+        else:
+            return (*self.sweep_evaluation(policy, utilities, model), evaluation)
+
+        # Record evaluation for analysis
+        self.recorder.record(new_utilities, np.abs(new_utilities - utilities).max(initial=0.0))
+
+        return new_utilities, iterations, evaluation
+
+    def sweep_evaluation(self, policy: np.ndarray, utilities: np.ndarray, model: TransitionModel) -> Tuple[np.ndarray, int]:
         """
         Updates utilities using the current policy
 
         Args:
-            policy (List[List]): Current policies
+            policy (np.ndarray): Current action index of every state
             utilities (np.ndarray): Current utilities
-            env (Environment): Environment object defining the states and transformer model
+            model (TransitionModel): Compiled states and transformer model of the environment
 
         Returns:
             Updated utilities and number of iterations
@@ -44,75 +91,100 @@ class PolicyIteration(Agent):
         good approximation of the utilities.
         """
         iterations: int = 0
-        
-        while iterations < self.k:
-            new_utilities: np.ndarray = utilities.copy()
+        delta: float = float('inf')
+
+        # Outcomes of the policy's action in every state, a sweep with a fixed policy has no dependency between states
+        states: np.ndarray = np.arange(model.n_states)
+        next_states: np.ndarray = model.next_states[states, policy]
+        probabilities: np.ndarray = model.probabilities[states, policy]
+
+        while iterations < self.k and (self.tolerance is None or delta > self.tolerance):
             iterations += 1
-            
-            # Iterate through every state in environment
-            for i in range(env.grid_height):
-                for j in range(env.grid_width):
-                    curr_state: Tuple = (i, j)
 
-                    # If wall or invalid state, skip
-                    if not env.is_valid_state(curr_state): continue
+            # Expected utility of the action given by the current policy, for every valid state at once
+            action_expected_utility: np.ndarray = (utilities[next_states] * probabilities).sum(axis=-1)
 
-                    # Reward for current state
-                    reward: float = env.get_reward(curr_state)
+            # Bellman Update
+            new_utilities: np.ndarray = model.rewards + self.gamma * action_expected_utility
 
-                    # Finding expected utility for the action given by current policy
-                    action = policy[i][j]
-                    state_transformer: dict = env.state_transformer(curr_state, action=action.value)            # Get state transformer model for current state and action
-                    action_expected_utility: float = sum([ utilities[next_state[0]][next_state[1]]*prob \
-                            for next_state, prob in state_transformer.items() ])                                # Calculate expected utility over all possible next states
+            # Update delta
+            delta = float(np.abs(new_utilities - utilities).max(initial=0.0))
 
-                    # Bellman Update
-                    new_utilities[i][j] = reward + self.gamma * action_expected_utility
-                    
-                    # Append state utility for analysis
-                    self.data_analysis[str((j,i))].append(new_utilities[i][j])
+            # Record sweep for analysis
+            self.recorder.record(new_utilities, delta)
 
-            utilities = new_utilities.copy()
+            utilities = new_utilities
 
         return utilities, iterations
 
-    def policy_improvement(self, policy: List[List], utilities: np.ndarray, env: Environment) -> Tuple[List[List], bool]:
+    def direct_evaluation(self, policy: np.ndarray, model: TransitionModel) -> Tuple[np.ndarray, int]:
         """
-        Update policy for state by maximizing expected utility
+        Exact policy evaluation by solving the sparse linear system (I - gamma*P_pi)U = R
+
+        Args:
+            policy (np.ndarray): Current action index of every state
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Utilities of the policy and number of inner iterations (always 1)
+        """
+        from scipy.sparse import identity
+        from scipy.sparse.linalg import spsolve
+
+        system = identity(model.n_states, format="csc") - self.gamma * model.policy_matrix(policy)
+        return spsolve(system.tocsc(), model.rewards), 1
+
+    def iterative_evaluation(self, policy: np.ndarray, utilities: np.ndarray, model: TransitionModel) -> Tuple[np.ndarray, int]:
+        """
+        Approximate policy evaluation by solving (I - gamma*P_pi)U = R with BiCGSTAB,
+        warm-started from the previous utilities
 
         Args:
-            policy (List[List]): Current policies
+            policy (np.ndarray): Current action index of every state
             utilities (np.ndarray): Current utilities
-            env (Environment): Environment object defining the states and transformer model 
+            model (TransitionModel): Compiled states and transformer model of the environment
 
         Returns:
-            Updated policies + boolean for whether policy has changed
+            Utilities of the policy and number of inner iterations
         """
-        is_policy_unchanged = True
-        
-        # Iterate through every state in environment
-        for i in range(env.grid_height):
-            for j in range(env.grid_width):
-                curr_state: Tuple = (i, j)
+        from scipy.sparse import identity
+        from scipy.sparse.linalg import bicgstab
 
-                # If wall or invalid state, skip
-                if not env.is_valid_state(curr_state): continue
+        system = identity(model.n_states, format="csr") - self.gamma * model.policy_matrix(policy)
+        tolerance: float = self.tolerance if self.tolerance is not None else 1e-10
 
-                # Finding action that maximizes expected utility
-                action_expected_utility: dict = {}
-                for action in self.ACTIONS:
-                    state_transformer: dict = env.state_transformer(curr_state, action=action.value)        # Get state transformer model for current state and action
-                    expected_utility: float = sum([ utilities[next_state[0]][next_state[1]]*prob \
-                        for next_state, prob in state_transformer.items() ])                                # Calculate expected utility over all possible next states
-                    action_expected_utility[action] = expected_utility
+        iterations: List[int] = [0]
+        def count(_): iterations[0] += 1
 
-                # Update Policy
-                best_action = max(action_expected_utility, key=action_expected_utility.get)
-                if policy[i][j] != best_action:
-                    policy[i][j] = best_action
-                    is_policy_unchanged = False
+        utilities, info = bicgstab(system, model.rewards, x0=utilities, rtol=0.0, atol=tolerance,
+                                   maxiter=self.k, callback=count)
+        assert info >= 0, "BiCGSTAB breakdown during policy evaluation"
 
-        return policy, is_policy_unchanged
+        return utilities, iterations[0]
+
+    def policy_improvement(self, policy: np.ndarray, utilities: np.ndarray, model: TransitionModel) -> Tuple[np.ndarray, bool]:
+        """
+        Update policy for state by maximizing expected utility
+
+        Args:
+            policy (np.ndarray): Current action index of every state
+            utilities (np.ndarray): Current utilities
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Updated policies + boolean for whether policy has changed
+        """
+        # Finding action that maximizes expected utility
+        action_expected_utility: np.ndarray = model.expected_utilities(utilities)
+        best_policy: np.ndarray = action_expected_utility.argmax(axis=1)
+
+        # Only switch actions that are strictly better than the current one
+        states: np.ndarray = np.arange(model.n_states)
+        gain: np.ndarray = action_expected_utility[states, best_policy] - action_expected_utility[states, policy]
+        best_policy = np.where(gain > PolicyIteration.IMPROVEMENT_TOLERANCE, best_policy, policy)
+        is_policy_unchanged: bool = bool(np.array_equal(best_policy, policy))
+
+        return best_policy, is_policy_unchanged
 
     def solve(self, env: Environment) -> dict:
         """
@@ -125,27 +197,125 @@ class PolicyIteration(Agent):
         Returns:
             Results including final utilities, optimal policies, no. of iterations
         """
+        model: TransitionModel = self.get_transition_model(env)
+
         # Initialize random policy 
-        policy: List[List] = [[random.choice(list(self.ACTIONS)) for _ in range(env.grid_width)] for _ in range(env.grid_height)]
+        policy: np.ndarray = np.array([random.randrange(model.n_actions) for _ in range(model.n_states)], dtype=np.int64)
 
         # Initialize utilities
-        utilities: np.ndarray = np.zeros((env.grid_height, env.grid_width), dtype=np.float64)
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+
+        return self.iterate(policy, utilities, model)
+
+    def resolve(self, env: Environment, previous: dict, changed: Iterable[Tuple]) -> dict:
+        """
+        Re-solves an environment after a few cells changed, seeding policy iteration with the
+        previous policy and utilities instead of a random policy and zeros. States that were
+        walls before start from the greedy action of the seeded utilities. The changed cells and
+        the states that can move into them get one Bellman backup and are re-improved before the
+        first full evaluation, so the seeded policy already reacts to the change.
+
+        Args:
+            env (Environment): Environment object, already updated with the changes
+            previous (dict): Result of the previous solve of the environment
+            changed (Iterable[Tuple]): Cells whose type or reward changed
+
+        Returns:
+            Results including final utilities, optimal policies, no. of iterations and backups saved against the first cold solve (None if unknown)
+        """
+        model: TransitionModel = self.get_transition_model(env)
+        utilities: np.ndarray = model.from_grid(previous["utilities"]).astype(np.float64)
+
+        # Seed policy, falling back to the greedy action where there is no previous action
+        actions: List = list(self.ACTIONS)
+        policy: np.ndarray = model.expected_utilities(utilities).argmax(axis=1)
+        for s, (i, j) in enumerate(model.states.tolist()):
+            action = previous["policy"][i][j]
+            if action is not None:
+                policy[s] = actions.index(self.ACTIONS[action.name])
+
+        # Back up the affected states with their new rewards, then switch the ones with a strictly better action
+        states: np.ndarray = self.affected_states(model, changed)
+        utilities[states] = model.rewards[states] + self.gamma * model.expected_utilities(utilities, states).max(axis=1)
+        action_expected_utility: np.ndarray = model.expected_utilities(utilities, states)
+        best_policy: np.ndarray = action_expected_utility.argmax(axis=1)
+        rows: np.ndarray = np.arange(len(states))
+        gain: np.ndarray = action_expected_utility[rows, best_policy] - action_expected_utility[rows, policy[states]]
+        policy[states] = np.where(gain > PolicyIteration.IMPROVEMENT_TOLERANCE, best_policy, policy[states])
+
+        result: dict = self.iterate(policy, utilities, model)
+        result["backups"] += len(states)
+
+        cold_backups: Optional[int] = self.cold_backups(previous, model)
+        result["cold_backups"] = cold_backups
+        result["backups_saved"] = cold_backups - result["backups"] if cold_backups is not None else None
+
+        return result
+
+    def iterate(self, policy: np.ndarray, utilities: np.ndarray, model: TransitionModel) -> dict:
+        """
+        Alternates between policy evaluation and improvement steps until policy is unchanged
+
+        Args:
+            policy (np.ndarray): Initial action index of every state
+            utilities (np.ndarray): Initial utilities
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Results including final utilities, optimal policies, no. of policy iterations, backups of the sweep and
+            iterative evaluations and number of sparse solves of the direct evaluation
+        """
+        self.recorder.start(model)
 
         total_iterations: int = 0
+        outer_iterations: int = 0
+        backups: int = 0
+        solves: int = 0
+        strategy: str = self.evaluation
+        evaluation_time: float = 0.0
+        improvement_time: float = 0.0
 
         is_policy_unchanged = False
         while not is_policy_unchanged:
-            utilities, iterations = self.policy_evaluation(policy, utilities, env)
+            outer_iterations += 1
+
+            start: float = time.perf_counter()
+            with self.profiler.phase("evaluation"):
+                utilities, iterations, strategy = self.policy_evaluation(policy, utilities, model)
+            evaluation_time += time.perf_counter() - start
             total_iterations += iterations
 
-            policy, is_policy_unchanged = self.policy_improvement(policy, utilities, env)
+            # A direct evaluation is one sparse solve rather than a number of Bellman backups
+            if strategy == "direct":
+                solves += iterations
+            else:
+                backups += iterations * model.n_states
+
+            start = time.perf_counter()
+            with self.profiler.phase("improvement"):
+                policy, is_policy_unchanged = self.policy_improvement(policy, utilities, model)
+            improvement_time += time.perf_counter() - start
+
+        self.recorder.close()
+        self.profiler.count("backups", backups)
+        self.profiler.count("sweeps", total_iterations - solves)
+        self.profiler.count("solves", solves)
+
+        with self.profiler.phase("policy_extraction"):
+            policy_grid: List[List] = self.policy_to_grid(policy, model)
 
         return {
-            "utilities": utilities,
-            "policy": policy,
-            "iterations": iterations,
-            "algorithm": "policy_iteration"
-        }
-
-    def get_data(self) -> dict:
-        return dict(self.data_analysis)
\ No newline at end of file
+            "utilities": model.to_grid(utilities),
+            "policy": policy_grid,
+            "iterations": outer_iterations,
+            "backups": backups,
+            "solves": solves,
+            "algorithm": "policy_iteration",
+            "evaluation": {
+                "strategy": strategy,
+                "outer_iterations": outer_iterations,
+                "inner_iterations": total_iterations,
+                "evaluation_time": evaluation_time,
+                "improvement_time": improvement_time
+            }
+        }
\ No newline at end of file
@@ -0,0 +1,164 @@
+import time
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from models.agent import Agent
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import StateLayout
+
+
+class QLearning(Agent):
+    def __init__(self, actions: Enum, alpha: Optional[float] = 0.1, gamma: Optional[float] = 0.99, exploration: Optional[float] = 0.1,
+                 episodes: Optional[int] = 1000, horizon: Optional[int] = 100, n_envs: Optional[int] = 1,
+                 exploring_starts: Optional[bool] = True, seed: Optional[int] = None, recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that learns utilities and policies from sampled transitions using Q-learning.
+        The agent only interacts with the environment through its reset and step functions, running n_envs
+        episodes in lockstep with one vectorized step and one vectorized Q update per time step.
+
+        Args:
+            alpha (float): Learning rate (optional, default = 0.1)
+            gamma (float): Discount factor (optional, default = 0.99)
+            exploration (float): Probability of taking a random action (optional, default = 0.1)
+            episodes (int): Total number of episodes (optional, default = 1000)
+            horizon (int): Steps of every episode (optional, default = 100)
+            n_envs (int): Episodes run in lockstep (optional, default = 1)
+            exploring_starts (bool): Start episodes in random states instead of the initial state (optional, default = True)
+            seed (int): Seed of the exploration and start states (optional, default = None)
+            recorder (Recorder): Learning curve recorder, one row per round of episodes (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, recorder)
+        self.alpha = alpha
+        self.gamma = gamma
+        self.exploration = exploration
+        self.episodes = episodes
+        self.horizon = horizon
+        self.n_envs = n_envs
+        self.exploring_starts = exploring_starts
+        self.seed = seed
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.moves: np.ndarray = np.array([action.value for action in self.ACTIONS], dtype=np.int64)
+        self.q_values: np.ndarray = np.zeros((0, 0, len(self.moves)), dtype=np.float64)
+        self.samples: int = 0
+
+    def select_actions(self, states: np.ndarray) -> np.ndarray:
+        """
+        Epsilon-greedy action indices of the agents in states
+        """
+        actions: np.ndarray = self.q_values[states[:, 0], states[:, 1]].argmax(axis=1)
+        explore: np.ndarray = self.rng.random(len(states)) < self.exploration
+        actions[explore] = self.rng.integers(len(self.moves), size=int(explore.sum()))
+        return actions
+
+    def target(self, next_states: np.ndarray, next_actions: np.ndarray) -> np.ndarray:
+        """
+        Utility of the next states that is bootstrapped from, the greedy value for Q-learning
+        """
+        return self.q_values[next_states[:, 0], next_states[:, 1]].max(axis=1)
+
+    def update(self, states: np.ndarray, actions: np.ndarray, targets: np.ndarray) -> None:
+        """
+        Moves Q(s, a) towards the targets. Agents updating the same (s, a) in one step are averaged,
+        so running many environments in lockstep does not inflate the learning rate.
+        """
+        q_flat: np.ndarray = self.q_values.reshape(-1)
+        index: np.ndarray = (states[:, 0] * self.q_values.shape[1] + states[:, 1]) * len(self.moves) + actions
+        errors: np.ndarray = targets - q_flat[index]
+
+        unique, inverse, counts = np.unique(index, return_inverse=True, return_counts=True)
+        q_flat[unique] += self.alpha * np.bincount(inverse.ravel(), weights=errors, minlength=len(unique)) / counts
+
+    def start_states(self, env: Environment, valid: np.ndarray, n: int) -> np.ndarray:
+        if not self.exploring_starts:
+            return np.tile(np.array(env.agent_pos, dtype=np.int64), (n, 1))
+        return valid[self.rng.integers(len(valid), size=n)]
+
+    def learn(self, env: Environment, model: StateLayout) -> int:
+        """
+        Runs all episodes, updating q_values after every step
+
+        Returns:
+            Number of rounds of n_envs episodes
+        """
+        rounds: int = -(-self.episodes // self.n_envs)
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+
+        for _ in range(rounds):
+            states: np.ndarray = self.start_states(env, model.states, self.n_envs)
+            state_rewards, done = env.reset_batch(states)
+            actions: np.ndarray = self.select_actions(states)
+            returns: np.ndarray = state_rewards.copy()
+            running: np.ndarray = np.ones(self.n_envs, dtype=bool)
+            discount: float = 1.0
+
+            for _ in range(self.horizon):
+                next_states, next_rewards, next_done = env.step_batch(states, self.moves[actions])
+                next_actions: np.ndarray = self.select_actions(next_states)
+
+                # Temporal difference update of Q(s, a) = R(s) + gamma * E[target(s')], without a future in terminal states
+                future: np.ndarray = np.where(done, 0.0, self.target(next_states, next_actions))
+                self.update(states, actions, state_rewards + self.gamma * future)
+
+                discount *= self.gamma
+                running &= ~done
+                returns[running] += discount * next_rewards[running]
+
+                # Agents leaving a terminal state restart the episode
+                if done.any():
+                    next_states[done] = self.start_states(env, model.states, int(done.sum()))
+                    next_rewards[done], next_done[done] = env.reset_batch(next_states[done])
+                    next_actions[done] = self.select_actions(next_states[done])
+
+                states, state_rewards, done, actions = next_states, next_rewards, next_done, next_actions
+
+            self.samples += self.n_envs * self.horizon
+
+            # Record round for analysis
+            new_utilities: np.ndarray = self.q_values[model.states[:, 0], model.states[:, 1]].max(axis=1)
+            self.recorder.progress(self.samples, float(returns.mean()))
+            self.recorder.record(new_utilities, np.abs(new_utilities - utilities).max(initial=0.0))
+            utilities = new_utilities
+
+        return rounds
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that learns utilities and policies of all states from sampled episodes
+
+        Args:
+            env (Environment): Environment object defining the states and step function
+
+        Returns:
+            Results including learned utilities, greedy policies, no. of rounds and samples
+        """
+        # Only the valid states are enumerated, the transition tables are never compiled
+        with self.profiler.phase("compile"):
+            model: StateLayout = StateLayout(env)
+        self.q_values = np.zeros((env.grid_height, env.grid_width, len(self.moves)), dtype=np.float64)
+        self.samples = 0
+
+        start: float = time.perf_counter()
+        self.recorder.start(model)
+        with self.profiler.phase("evaluation"):
+            iterations: int = self.learn(env, model)
+        self.recorder.close()
+        elapsed: float = time.perf_counter() - start
+        self.profiler.count("backups", self.samples)
+        self.profiler.count("sweeps", iterations)
+
+        with self.profiler.phase("policy_extraction"):
+            q_values: np.ndarray = self.q_values[model.states[:, 0], model.states[:, 1]]
+            policy_grid: List[List] = self.policy_to_grid(q_values.argmax(axis=1), model)
+
+        return {
+            "utilities": model.to_grid(q_values.max(axis=1)),
+            "policy": policy_grid,
+            "iterations": iterations,
+            "backups": self.samples,
+            "samples": self.samples,
+            "samples_per_sec": self.samples / elapsed if elapsed > 0 else float("inf"),
+            "algorithm": "q_learning"
+        }
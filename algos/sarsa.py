@@ -0,0 +1,48 @@
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from algos.q_learning import QLearning
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+class Sarsa(QLearning):
+    def __init__(self, actions: Enum, alpha: Optional[float] = 0.1, gamma: Optional[float] = 0.99, exploration: Optional[float] = 0.1,
+                 episodes: Optional[int] = 1000, horizon: Optional[int] = 100, n_envs: Optional[int] = 1,
+                 exploring_starts: Optional[bool] = True, seed: Optional[int] = None, recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that learns utilities and policies from sampled transitions using SARSA,
+        bootstrapping from the action the epsilon-greedy policy actually takes next
+
+        Args:
+            alpha (float): Learning rate (optional, default = 0.1)
+            gamma (float): Discount factor (optional, default = 0.99)
+            exploration (float): Probability of taking a random action (optional, default = 0.1)
+            episodes (int): Total number of episodes (optional, default = 1000)
+            horizon (int): Steps of every episode (optional, default = 100)
+            n_envs (int): Episodes run in lockstep (optional, default = 1)
+            exploring_starts (bool): Start episodes in random states instead of the initial state (optional, default = True)
+            seed (int): Seed of the exploration and start states (optional, default = None)
+            recorder (Recorder): Learning curve recorder, one row per round of episodes (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, alpha, gamma, exploration, episodes, horizon, n_envs, exploring_starts, seed, recorder)
+
+    def target(self, next_states: np.ndarray, next_actions: np.ndarray) -> np.ndarray:
+        return self.q_values[next_states[:, 0], next_states[:, 1], next_actions]
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that learns utilities and policies of all states from sampled episodes
+
+        Args:
+            env (Environment): Environment object defining the states and step function
+
+        Returns:
+            Results including learned utilities, greedy policies, no. of rounds and samples
+        """
+        result: dict = super().solve(env)
+        result["algorithm"] = "sarsa"
+
+        return result
@@ -0,0 +1,224 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
+
+
+def strongly_connected_components(model: TransitionModel) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Strongly connected components of the state transition graph, with a topological level per component:
+    components only move into components of lower levels. Levels are assigned as late as possible, so a component
+    shares the level below the first component that depends on it, and components nothing depends on share the top level.
+
+    Args:
+        model (TransitionModel): Compiled states and transformer model of the environment
+
+    Returns:
+        Component of every state, level of every component and the (component, successor component) edges between them
+    """
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    # Edges of every move some action can take, terminal states have none
+    moves: np.ndarray = np.flatnonzero(model.move_probabilities.max(axis=0) > 0)
+    moving: np.ndarray = np.flatnonzero(~model.terminal)
+    sources: np.ndarray = np.repeat(moving, len(moves))
+    targets: np.ndarray = model.successors[moving][:, moves].ravel()
+    graph = csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(model.n_states, model.n_states))
+    n_components, labels = connected_components(graph, directed=True, connection="strong")
+
+    # Condensed graph, then peel off components whose successors all have a level (Kahn's algorithm from the sinks)
+    crossing: np.ndarray = labels[sources] != labels[targets]
+    keys: np.ndarray = np.unique(labels[sources[crossing]].astype(np.int64) * n_components + labels[targets[crossing]])
+    edges: np.ndarray = np.stack([keys // n_components, keys % n_components], axis=1)
+    remaining: np.ndarray = np.bincount(edges[:, 0], minlength=n_components)
+    order: np.ndarray = np.argsort(edges[:, 1], kind="stable")
+    indptr: np.ndarray = np.searchsorted(edges[order, 1], np.arange(n_components + 1))
+
+    # Levels counted up from the sinks first
+    levels: np.ndarray = np.full(n_components, -1, dtype=np.int64)
+    frontier: np.ndarray = np.flatnonzero(remaining == 0)
+    level: int = 0
+    while len(frontier):
+        levels[frontier] = level
+        incoming: np.ndarray = np.concatenate([order[indptr[c]:indptr[c + 1]] for c in frontier.tolist()]) if len(edges) else np.empty(0, dtype=np.int64)
+        remaining -= np.bincount(edges[incoming, 0], minlength=n_components)
+        frontier = np.flatnonzero((remaining == 0) & (levels < 0))
+        level += 1
+
+    # Move every component up to one level below its lowest predecessor, predecessors have higher levels and are placed first
+    latest: np.ndarray = np.full(n_components, level - 1, dtype=np.int64)
+    for current in range(level - 1, -1, -1):
+        incoming = edges[levels[edges[:, 1]] == current]
+        np.minimum.at(latest, incoming[:, 1], latest[incoming[:, 0]] - 1)
+
+    return labels, latest, edges
+
+
+class SCCValueIteration(VectorizedValueIteration):
+    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99, workers: Optional[int] = None,
+                 recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that solves the MDP problem using Value Iteration on the strongly connected
+        components of the state transition graph. Components are solved once each, in reverse topological
+        order with the utilities of the components they move into already final. Components of the same
+        level are independent: they are split into batches swept in parallel by a thread pool, and each
+        component stops sweeping as soon as it has converged.
+
+        Args:
+            epsilon (float): Maximum error allowed in the utility of any state
+            gamma (float): Discount factor (optional, default = 0.99)
+            workers (int): Number of threads (optional, default = cpu count)
+            recorder (Recorder): Convergence telemetry recorder, records once per level (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, epsilon, gamma, recorder=recorder)
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.components: List[dict] = []
+
+    def solve_batch(self, model: TransitionModel, utilities: np.ndarray, components: List[np.ndarray],
+                    threshold: float) -> Tuple[np.ndarray, np.ndarray, int, float]:
+        """
+        Synchronous sweeps of a batch of independent components, updating utilities in place.
+        A component is converged once its own max-norm change is below the threshold. Converged components
+        are dropped from the sweeps once they hold half of the swept states, until then their extra sweeps
+        are cheaper than gathering the remaining states again.
+
+        Returns:
+            Sweeps and wall time until convergence of every component, backups done and the largest change of the last sweep
+        """
+        start: float = time.perf_counter()
+        sizes: np.ndarray = np.array([len(states) for states in components], dtype=np.int64)
+        states: np.ndarray = np.concatenate(components)
+        owner: np.ndarray = np.repeat(np.arange(len(components)), sizes)
+        successors: np.ndarray = np.ascontiguousarray(model.successors[states].T)
+
+        sweeps: np.ndarray = np.zeros(len(components), dtype=np.int64)
+        times: np.ndarray = np.zeros(len(components), dtype=np.float64)
+        active: np.ndarray = np.ones(len(components), dtype=bool)
+        backups: int = 0
+        delta: float = 0.0
+
+        # Components in the swept arrays, with the states of each starting at starts
+        swept: np.ndarray = np.arange(len(components))
+        swept_states, swept_successors, swept_rewards = states, successors, model.rewards[states]
+        starts: np.ndarray = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        active_size: int = len(states)
+
+        while active_size:
+            # Bellman Update of the swept states
+            new_utilities: np.ndarray = (model.move_probabilities @ utilities[swept_successors]).max(axis=0)
+            new_utilities *= self.gamma
+            new_utilities += swept_rewards
+            change: np.ndarray = np.abs(new_utilities - utilities[swept_states])
+            utilities[swept_states] = new_utilities
+            backups += len(swept_states)
+
+            # Per-component max-norm change, states stay grouped by component
+            component_delta: np.ndarray = np.maximum.reduceat(change, starts)
+            running: np.ndarray = active[swept]
+            delta = float(component_delta[running].max())
+            sweeps[swept[running]] += 1
+
+            converged: np.ndarray = swept[running & (component_delta <= threshold)]
+            if len(converged):
+                times[converged] = time.perf_counter() - start
+                active[converged] = False
+                active_size -= int(sizes[converged].sum())
+
+                if active_size and 2 * active_size <= len(swept_states):
+                    swept = swept[active[swept]]
+                    positions: np.ndarray = np.flatnonzero(active[owner])
+                    swept_states, swept_successors, swept_rewards = states[positions], successors[:, positions], model.rewards[states[positions]]
+                    starts = np.concatenate([[0], np.cumsum(sizes[swept])[:-1]]).astype(np.int64)
+
+        return sweeps, times, backups, delta
+
+    def batches(self, components: List[np.ndarray]) -> List[List[int]]:
+        """
+        Splits the components of a level into up to workers batches of similar numbers of states
+        """
+        batches: List[List[int]] = [[] for _ in range(min(self.workers, len(components)))]
+        loads: np.ndarray = np.zeros(len(batches), dtype=np.int64)
+        for c in sorted(range(len(components)), key=lambda c: -len(components[c])):
+            b: int = int(loads.argmin())
+            batches[b].append(c)
+            loads[b] += len(components[c])
+        return batches
+
+    def solve_utilities(self, model: TransitionModel, utilities: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+        utilities = utilities.copy() if utilities is not None else np.zeros(model.n_states, dtype=np.float64)
+        labels, levels, edges = strongly_connected_components(model)
+
+        # Terminal states are components of their own with their reward as utility
+        utilities[model.terminal_states] = model.rewards[model.terminal_states]
+        solved: np.ndarray = np.zeros(len(levels), dtype=bool)
+        solved[labels[model.terminal_states]] = True
+
+        order: np.ndarray = np.argsort(labels, kind="stable")
+        members: List[np.ndarray] = np.split(order, np.cumsum(np.bincount(labels, minlength=len(levels)))[:-1])
+
+        # The errors of components add up along a path, so the threshold is split over the most swept components on any path
+        depth: np.ndarray = (~solved).astype(np.int64)
+        for level in range(1, int(levels.max(initial=-1)) + 1):
+            outgoing: np.ndarray = edges[levels[edges[:, 0]] == level]
+            downstream: np.ndarray = np.zeros(len(levels), dtype=np.int64)
+            np.maximum.at(downstream, outgoing[:, 0], depth[outgoing[:, 1]])
+            depth[levels == level] += downstream[levels == level]
+        threshold: float = self.epsilon / max(int(depth.max(initial=0)), 1) * (1 - self.gamma) / self.gamma
+
+        self.components = [{"component": c, "level": int(levels[c]), "states": len(members[c]), "sweeps": 0, "wall_time": 0.0}
+                           for c in range(len(levels))]
+        self.backups = 0
+        iterations: int = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for level in range(int(levels.max(initial=-1)) + 1):
+                pending: np.ndarray = np.flatnonzero((levels == level) & ~solved)
+                if not len(pending):
+                    continue
+
+                components: List[np.ndarray] = [members[c] for c in pending.tolist()]
+                batches: List[List[int]] = self.batches(components)
+                results = list(executor.map(lambda batch: self.solve_batch(model, utilities, [components[i] for i in batch], threshold), batches))
+
+                delta: float = 0.0
+                for batch, (sweeps, times, backups, batch_delta) in zip(batches, results):
+                    for i, component_sweeps, component_time in zip(batch, sweeps.tolist(), times.tolist()):
+                        self.components[pending[i]].update(sweeps=component_sweeps, wall_time=component_time)
+                    self.backups += backups
+                    delta = max(delta, batch_delta)
+
+                # Levels run one after the other, so their slowest components add up to the sweeps on the critical path
+                iterations += max(int(sweeps.max(initial=0)) for sweeps, _, _, _ in results)
+
+                # Record level for analysis
+                self.recorder.record(utilities, delta)
+
+        self.stop_reason = "max_norm"
+        self.error_bound = self.epsilon
+
+        return utilities, iterations
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that calculates final utilities and policies of all states
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results including final utilities, optimal policies, sweeps on the critical path and per-component sizes, sweeps and timing
+        """
+        result: dict = super().solve(env)
+        result["components"] = self.components
+        result["algorithm"] = "scc_value_iteration"
+
+        return result
@@ -0,0 +1,177 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from algos.value_iteration import ValueIteration
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
+
+
+class Tile:
+    """
+    Block of the grid solved by one worker.
+    Holds the utilities of its own states followed by a halo of the neighbouring states they can move into.
+    """
+
+    def __init__(self, model: TransitionModel, states: np.ndarray):
+        """
+        Args:
+            model (TransitionModel): Compiled states and transformer model of the environment
+            states (np.ndarray): Sorted dense indices of the states inside the tile
+        """
+        self.states: np.ndarray = states
+        self.rewards: np.ndarray = model.rewards[states]
+        self.terminals: np.ndarray = np.flatnonzero(model.terminal[states])
+
+        # Halo: successors of the tile's states that lie outside the tile
+        successors: np.ndarray = model.successors[states].T
+        self.halo: np.ndarray = np.setdiff1d(successors, states, assume_unique=False)
+
+        # Successors re-indexed into the local [states, halo] utility array
+        local: np.ndarray = np.concatenate([states, self.halo])
+        order: np.ndarray = np.argsort(local, kind="stable")
+        self.successors: np.ndarray = order[np.searchsorted(local[order], successors)]
+        self.utilities: np.ndarray = np.zeros(len(local), dtype=np.float64)
+
+    def exchange(self, utilities: np.ndarray) -> None:
+        """
+        Copies the tile's states and its halo from the global utilities
+        """
+        self.utilities[:len(self.states)] = utilities[self.states]
+        self.utilities[len(self.states):] = utilities[self.halo]
+
+    def sweep(self, move_probabilities: np.ndarray, gamma: float, local_sweeps: int) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Bellman backups of the tile's states with the halo held fixed
+
+        Returns:
+            Utilities of the tile's states after the first and after the last sweep, and the delta of the first sweep
+        """
+        first: np.ndarray = (move_probabilities @ self.utilities[self.successors]).max(axis=0)
+        first *= gamma
+        first += self.rewards
+        first[self.terminals] = self.rewards[self.terminals]
+        delta: float = np.abs(first - self.utilities[:len(self.states)]).max(initial=0.0)
+
+        self.utilities[:len(self.states)] = first
+        for _ in range(local_sweeps - 1):
+            self.utilities[:len(self.states)] = gamma * (move_probabilities @ self.utilities[self.successors]).max(axis=0) + self.rewards
+            self.utilities[self.terminals] = self.rewards[self.terminals]
+
+        return first, self.utilities[:len(self.states)], delta
+
+
+class TiledValueIteration(ValueIteration):
+    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99, tile_size: Optional[int] = 256,
+                 workers: Optional[int] = None, local_sweeps: Optional[int] = 1, stopping: Optional[str] = "max_norm",
+                 stable_sweeps: Optional[int] = 5, max_time: Optional[float] = None, max_backups: Optional[int] = None,
+                 recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that solves the MDP problem using Value Iteration on a grid split into
+        tiles. Tiles are swept in parallel by a thread pool (NumPy releases the GIL) and exchange
+        halo utilities between sweeps.
+
+        Args:
+            epsilon (float): Maximum error allowed in the utility of any state
+            gamma (float): Discount factor (optional, default = 0.99)
+            tile_size (int): Rows and columns of a tile (optional, default = 256)
+            workers (int): Number of threads (optional, default = cpu count)
+            local_sweeps (int): Sweeps of each tile between halo exchanges, 1 matches synchronous value iteration (optional, default = 1)
+            stopping (str): Stopping rule applied to the first sweep of every exchange, see ValueIteration, span needs local_sweeps = 1 (optional, default = "max_norm")
+            stable_sweeps (int): Sweeps the greedy policy has to stay unchanged for the policy rule (optional, default = 5)
+            max_time (float): Wall-clock budget in seconds (optional, default = None)
+            max_backups (int): Budget of Bellman backups (optional, default = None)
+            recorder (Recorder): Convergence telemetry recorder (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, epsilon, gamma, stopping=stopping, stable_sweeps=stable_sweeps, max_time=max_time,
+                         max_backups=max_backups, recorder=recorder)
+        assert stopping != "span" or local_sweeps == 1, "span bounds need one sweep per exchange of tile borders"
+        self.tile_size = tile_size
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.local_sweeps = local_sweeps
+
+    def get_tiles(self, model: TransitionModel) -> List[Tile]:
+        """
+        Splits the valid states into tile_size x tile_size blocks of the grid
+        """
+        tile_ids: np.ndarray = (model.states[:, 0] // self.tile_size) * (-(-model.width // self.tile_size)) + model.states[:, 1] // self.tile_size
+        order: np.ndarray = np.argsort(tile_ids, kind="stable")
+        bounds: np.ndarray = np.flatnonzero(np.diff(tile_ids[order])) + 1
+
+        return [Tile(model, np.sort(states)) for states in np.split(order, bounds) if len(states)]
+
+    def solve_utilities(self, model: TransitionModel) -> Tuple[np.ndarray, int]:
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+        tiles: List[Tile] = self.get_tiles(model)
+
+        first_utilities: np.ndarray = np.empty_like(utilities)
+        iterations: int = 0
+        converged: bool = False
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not converged:
+                iterations += 1
+
+                # Halo exchange, then block-local Bellman sweeps in parallel
+                for tile in tiles:
+                    tile.exchange(utilities)
+                results = list(executor.map(lambda tile: tile.sweep(model.move_probabilities, self.gamma, self.local_sweeps), tiles))
+
+                # Global convergence over the first sweep of every tile, which is a synchronous sweep of the whole grid
+                delta = max((tile_delta for _, _, tile_delta in results), default=0.0)
+                for tile, (first, _, _) in zip(tiles, results):
+                    first_utilities[tile.states] = first
+                converged = self.converged(first_utilities, utilities, iterations, model,
+                                           backups=iterations * model.n_states * self.local_sweeps)
+                for tile, (first, last, _) in zip(tiles, results):
+                    utilities[tile.states] = first if converged else last
+
+                # Record sweep for analysis
+                self.recorder.record(utilities, delta)
+
+        self.backups = iterations * model.n_states * self.local_sweeps
+
+        return utilities, iterations
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that calculates final utilities and policies of all states
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results including final utilities, optimal policies, no. of iterations
+        """
+        result: dict = super().solve(env)
+        result["algorithm"] = "tiled_value_iteration"
+
+        return result
+
+
+def scaling_benchmark(actions: dict, env: Environment, max_workers: Optional[int] = None, epsilon: float = 0.1,
+                      gamma: float = 0.99, tile_size: int = 256) -> pd.DataFrame:
+    """
+    Solves the environment with 1 up to max_workers threads
+
+    Returns:
+        Wall time, iterations and speedup over one worker for every worker count
+    """
+    rows: List[dict] = []
+    for workers in range(1, (max_workers or os.cpu_count()) + 1):
+        agent = TiledValueIteration(actions, epsilon, gamma, tile_size=tile_size, workers=workers, recorder=Recorder())
+
+        start: float = time.perf_counter()
+        result: dict = agent.solve(env)
+        rows.append({"workers": workers, "wall_time": time.perf_counter() - start, "iterations": result["iterations"]})
+
+    summary: pd.DataFrame = pd.DataFrame(rows)
+    summary["speedup"] = summary["wall_time"].iloc[0] / summary["wall_time"]
+
+    return summary
@@ -1,4 +1,5 @@
-from collections import defaultdict
+import heapq
+import time
 from enum import Enum
 from typing import *
 
@@ -6,101 +7,283 @@ import numpy as np
 
 from models.agent import Agent
 from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
 
 
 class ValueIteration(Agent):
-    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99):
+    MODES = ("synchronous", "gauss_seidel", "prioritized")
+    STOPPING = ("max_norm", "span", "policy")
+
+    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99, mode: Optional[str] = "synchronous",
+                 stopping: Optional[str] = "max_norm", stable_sweeps: Optional[int] = 5, max_time: Optional[float] = None,
+                 max_backups: Optional[int] = None, recorder: Optional[Recorder] = None):
         """
-        Initializes an agent that solves the MDP problem using Value Iteration 
+        Initializes an agent that solves the MDP problem using Value Iteration
 
         Args:
             epsilon (float): Maximum error allowed in the utility of any state
             gamma (float): Discount factor (optional, default = 0.99)
+            mode (str): Order of Bellman updates (optional, default = "synchronous")
+                synchronous: every state is updated from the utilities of the previous sweep
+                gauss_seidel: states are updated in place, using utilities updated earlier in the sweep
+                prioritized: states are updated in order of Bellman error from a priority queue
+            stopping (str): Stopping rule (optional, default = "max_norm")
+                max_norm: max-norm change of a sweep below epsilon*(1-gamma)/gamma
+                span: span seminorm (max - min) of the change of a synchronous sweep below epsilon*(1-gamma)/gamma,
+                      the utilities are then shifted to the midpoint of the resulting bounds on the optimal utilities
+                policy: greedy policy unchanged for stable_sweeps sweeps, or the max_norm rule, whichever comes first
+            stable_sweeps (int): Sweeps the greedy policy has to stay unchanged for the policy rule (optional, default = 5)
+            max_time (float): Wall-clock budget in seconds, checked after every sweep (optional, default = None)
+            max_backups (int): Budget of Bellman backups, checked after every sweep (optional, default = None)
+            recorder (Recorder): Convergence telemetry recorder (optional, default = summary of every sweep)
         """
-        super().__init__(actions)
+        super().__init__(actions, recorder)
+        assert mode in ValueIteration.MODES
+        assert stopping in ValueIteration.STOPPING
+        assert stopping != "span" or mode == "synchronous", "span bounds need synchronous sweeps"
+        assert stopping != "policy" or mode != "prioritized", "prioritized sweeping has no sweeps to compare policies of"
         self.gamma = gamma
         self.epsilon = epsilon
+        self.mode = mode
+        self.stopping = stopping
+        self.stable_sweeps = stable_sweeps
+        self.max_time = max_time
+        self.max_backups = max_backups
+        self.backups: int = 0
+
+    def start_stopping(self) -> None:
+        """
+        Resets the state of the stopping rule before a solve
+        """
+        self.start_time: float = time.perf_counter()
+        self.stop_reason: Optional[str] = None
+        self.error_bound: float = float('inf')
+        self.offset: float = 0.0
+        self.greedy: Optional[np.ndarray] = None
+        self.stable: int = 0
 
-        self.data_analysis = defaultdict(list)
+    def converged(self, new_utilities: np.ndarray, utilities: np.ndarray, iterations: int, model: TransitionModel,
+                  greedy: Optional[np.ndarray] = None, backups: Optional[int] = None) -> bool:
+        """
+        Applies the stopping rule and the budgets after a sweep, setting stop_reason and error_bound,
+        the bound on the max-norm error of the (shifted) utilities
 
-    def solve_utilities(self, env: Environment) -> Tuple[np.ndarray, int]:
-        utilities: np.ndarray = np.zeros((env.grid_height, env.grid_width), dtype=np.float64)
+        Args:
+            new_utilities (np.ndarray): Utilities after the sweep
+            utilities (np.ndarray): Utilities before the sweep
+            iterations (int): Sweeps so far
+            model (TransitionModel): Compiled states and transformer model of the environment
+            greedy (np.ndarray): Greedy action of every state from the sweep, policy rule only (optional, default = recomputed)
+            backups (int): Backups so far, checked against max_backups (optional, default = one per state per sweep)
 
+        Returns:
+            Whether to stop
+        """
         threshold: float = self.epsilon * (1 - self.gamma) / self.gamma
+        scale: float = self.gamma / (1 - self.gamma)
+        change: np.ndarray = new_utilities - utilities
+        high, low = (change.max(), change.min()) if len(change) else (0.0, 0.0)
+        delta: float = max(high, -low)
+
+        # Span bounds: new + scale * low <= optimal utilities <= new + scale * high, synchronous sweeps only
+        if self.stopping == "span":
+            self.error_bound = scale * (high - low) / 2
+            self.offset = scale * (high + low) / 2
+            if high - low <= threshold:
+                self.stop_reason = "span"
+        else:
+            self.error_bound = scale * delta
+            if delta <= threshold:
+                self.stop_reason = "max_norm"
+
+        if self.stopping == "policy" and self.stop_reason is None:
+            greedy = greedy if greedy is not None else self.solve_optimal_policy(new_utilities, model)
+            self.stable = self.stable + 1 if self.greedy is not None and np.array_equal(greedy, self.greedy) else 0
+            self.greedy = greedy.copy()
+            if self.stable >= self.stable_sweeps:
+                self.stop_reason = "policy"
+
+        return self.stop_reason is not None or self.over_budget(backups if backups is not None else iterations * model.n_states)
+
+    def over_budget(self, backups: int) -> bool:
+        """
+        Checks the backup and wall-clock budgets, setting stop_reason once one is spent
+        """
+        if self.max_backups is not None and backups >= self.max_backups:
+            self.stop_reason = "max_backups"
+        elif self.max_time is not None and time.perf_counter() - self.start_time >= self.max_time:
+            self.stop_reason = "max_time"
+
+        return self.stop_reason is not None
+
+    def solve_utilities(self, model: TransitionModel) -> Tuple[np.ndarray, int]:
+        """
+        Calculates utilities of all states with the configured update order
+
+        Args:
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Utilities of all states and number of iterations (sweeps)
+        """
+        if self.mode == "gauss_seidel":
+            return self.solve_utilities_gauss_seidel(model)
+        if self.mode == "prioritized":
+            return self.solve_utilities_prioritized(model)
+        return self.solve_utilities_synchronous(model)
+
+    def solve_utilities_synchronous(self, model: TransitionModel) -> Tuple[np.ndarray, int]:
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+
         iterations: int = 0
-        delta: float = float('inf')
+        converged: bool = False
 
-        while delta > threshold:
-            new_utilities: np.ndarray = utilities.copy()
-            delta = 0
+        while not converged:
             iterations += 1
-            
-            # Iterate through every state in environment
-            for i in range(env.grid_height):
-                for j in range(env.grid_width):
-                    curr_state: Tuple = (i, j)
 
-                    # If wall or invalid state, skip
-                    if not env.is_valid_state(curr_state): continue
+            # Bellman update of every valid state at once, a synchronous sweep only reads the previous utilities
+            action_expected_utility: np.ndarray = model.expected_utilities(utilities)
+            greedy: np.ndarray = action_expected_utility.argmax(axis=1)
+            new_utilities: np.ndarray = model.rewards + self.gamma * action_expected_utility[np.arange(model.n_states), greedy]
 
-                    # Reward for current state
-                    reward: float = env.get_reward(curr_state)
+            # Update delta
+            delta: float = float(np.abs(new_utilities - utilities).max(initial=0.0))
 
-                    # Finding action that maximizes expected utility
-                    action_expected_utility: List = []
-                    for action in self.ACTIONS:
-                        state_transformer: dict = env.state_transformer(curr_state, action=action.value)        # Get state transformer model for current state and action
-                        expected_utility: float = sum([ utilities[next_state[0]][next_state[1]]*prob \
-                            for next_state, prob in state_transformer.items() ])                                # Calculate expected utility over all possible next states
-                        action_expected_utility.append(expected_utility)
+            # Record sweep for analysis
+            self.recorder.record(new_utilities, delta)
 
-                    # Bellman Update
-                    new_utilities[i][j] = reward + self.gamma * max(action_expected_utility)
+            converged = self.converged(new_utilities, utilities, iterations, model, greedy)
+            utilities = new_utilities
+
+        self.backups = iterations * model.n_states
+
+        return utilities, iterations
 
-                    # Update delta
-                    delta = max(delta, abs(new_utilities[i][j] - utilities[i][j]))
+    def solve_utilities_gauss_seidel(self, model: TransitionModel) -> Tuple[np.ndarray, int]:
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+        greedy: np.ndarray = np.zeros(model.n_states, dtype=np.int64)
+
+        iterations: int = 0
+        converged: bool = False
+
+        while not converged:
+            previous: np.ndarray = utilities.copy()
+            delta = 0
+            iterations += 1
 
-                    # Append state utility for analysis
-                    self.data_analysis[str((j,i))].append(new_utilities[i][j])
+            # Iterate through every valid state in environment, updating utilities in place
+            for s in range(model.n_states):
+                # Bellman Update
+                action_expected_utility: np.ndarray = model.expected_utilities(utilities, s)
+                greedy[s] = action_expected_utility.argmax()
+                new_utility: float = model.rewards[s] + self.gamma * action_expected_utility[greedy[s]]
 
-            utilities = new_utilities.copy()
+                # Update delta
+                delta = max(delta, abs(new_utility - utilities[s]))
+                utilities[s] = new_utility
+
+            # Record sweep for analysis
+            self.recorder.record(utilities, delta)
+
+            converged = self.converged(utilities, previous, iterations, model, greedy)
+
+        self.backups = iterations * model.n_states
 
         return utilities, iterations
 
-    def solve_optimal_policy(self, utilities: np.ndarray, env: Environment) -> np.ndarray:
+    def solve_utilities_prioritized(self, model: TransitionModel, utilities: Optional[np.ndarray] = None,
+                                    states: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
         """
-        Function that calculates best policy by maximizing expected utility
-        based on the utilities provided
+        Prioritized sweeping: repeatedly backs up the state with the largest Bellman error and
+        re-prioritizes its predecessors, until no state has a Bellman error above the threshold.
+
+        The threshold is epsilon*(1-gamma), since a Bellman error below it bounds the error in
+        the utility of any state by epsilon.
 
         Args:
-            utilities (np.ndarray): Current utilities
-            env (Environment): Environment object defining the states and transformer model
+            model (TransitionModel): Compiled states and transformer model of the environment
+            utilities (np.ndarray): Initial utilities, updated in place (optional, default = zeros)
+            states (np.ndarray): States whose Bellman error may exceed the threshold (optional, default = all states)
 
         Returns:
-            Optimal policies of all states
+            Utilities of all states and number of sweep-equivalents of backups
         """
-        policy = [[None for _ in range(env.grid_width)] for _ in range(env.grid_height)]
+        if utilities is None:
+            utilities = np.zeros(model.n_states, dtype=np.float64)
+        if states is None:
+            states = np.arange(model.n_states)
+        indptr, predecessors = model.predecessors()
+
+        threshold: float = self.epsilon * (1 - self.gamma)
+
+        # Priority queue of states keyed by (negated) Bellman error
+        bellman_error: np.ndarray = np.abs(model.rewards[states] + self.gamma * model.expected_utilities(utilities, states).max(axis=1) - utilities[states])
+        priority: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+        priority[states] = np.where(bellman_error > threshold, bellman_error, 0.0)
+        queue: List[Tuple[float, int]] = [(-error, s) for s, error in zip(states.tolist(), priority[states].tolist()) if error > 0]
+        heapq.heapify(queue)
 
-        # Iterate through every state in environment
-        for i in range(env.grid_height):
-            for j in range(env.grid_width):
-                curr_state: Tuple = (i, j)
+        backups: int = 0
+        delta: float = 0.0
+        while queue:
+            # Budgets are checked once per sweep-equivalent of backups
+            if backups % model.n_states == 0 and backups and self.over_budget(backups):
+                break
 
-                # If wall or invalid state, skip
-                if not env.is_valid_state(curr_state): continue
+            error, s = heapq.heappop(queue)
 
-                # Finding action that maximizes expected utility
-                action_expected_utility: dict = {}
-                for action in self.ACTIONS:
-                    state_transformer: dict = env.state_transformer(curr_state, action=action.value)        # Get state transformer model for current state and action
-                    expected_utility: float = sum([ utilities[next_state[0]][next_state[1]]*prob \
-                        for next_state, prob in state_transformer.items() ])                                # Calculate expected utility over all possible next states
-                    action_expected_utility[action] = expected_utility
+            # Skip stale entries, the state has been re-queued with a different priority
+            if -error != priority[s]: continue
 
-                # Update Policy
-                policy[i][j] = max(action_expected_utility, key=action_expected_utility.get)
+            # Bellman Update
+            new_utility: float = model.rewards[s] + self.gamma * model.expected_utilities(utilities, s).max()
+            delta = max(delta, abs(new_utility - utilities[s]))
+            utilities[s] = new_utility
+            priority[s] = 0.0
+            backups += 1
 
-        return policy
+            # Re-prioritize states that can transition into the updated state
+            for p in predecessors[indptr[s]:indptr[s+1]].tolist():
+                error = abs(model.rewards[p] + self.gamma * model.expected_utilities(utilities, p).max() - utilities[p])
+                if error > threshold and error > priority[p]:
+                    priority[p] = error
+                    heapq.heappush(queue, (-error, p))
+
+            # Record utilities for analysis once per sweep-equivalent of backups
+            if backups % model.n_states == 0:
+                self.recorder.record(utilities, delta)
+                delta = 0.0
+
+        if backups % max(model.n_states, 1):
+            self.recorder.record(utilities, delta)
+
+        # Every Bellman error is below the threshold once the queue is empty, otherwise bound the error from the Bellman residual
+        if self.stop_reason is None:
+            self.stop_reason = "max_norm"
+            self.error_bound = self.epsilon
+        else:
+            residual: np.ndarray = model.rewards + self.gamma * model.expected_utilities(utilities).max(axis=1) - utilities
+            residual[model.terminal_states] = 0.0
+            self.error_bound = np.abs(residual).max(initial=0.0) / (1 - self.gamma)
+
+        self.backups = backups
+
+        return utilities, -(-backups // max(model.n_states, 1))
+
+    def solve_optimal_policy(self, utilities: np.ndarray, model: TransitionModel) -> np.ndarray:
+        """
+        Function that calculates best policy by maximizing expected utility
+        based on the utilities provided
+
+        Args:
+            utilities (np.ndarray): Current utilities
+            model (TransitionModel): Compiled states and transformer model of the environment
+
+        Returns:
+            Optimal action index of all states
+        """
+        return model.expected_utilities(utilities).argmax(axis=1)
 
     def solve(self, env: Environment) -> dict:
         """
@@ -112,15 +295,125 @@ class ValueIteration(Agent):
         Returns:
             Results including final utilities, optimal policies, no. of iterations
         """
-        utilities, iterations = self.solve_utilities(env)
-        policy = self.solve_optimal_policy(utilities, env)
+        model: TransitionModel = self.get_transition_model(env)
+
+        self.recorder.start(model)
+        self.start_stopping()
+        with self.profiler.phase("evaluation"):
+            utilities, iterations = self.solve_utilities(model)
+            utilities[~model.terminal] += self.offset
+        self.recorder.close()
+        self.profiler.count("backups", self.backups)
+        self.profiler.count("sweeps", iterations)
+
+        with self.profiler.phase("policy_extraction"):
+            policy = self.solve_optimal_policy(utilities, model)
+            policy_grid: List[List] = self.policy_to_grid(policy, model)
 
         return {
-            "utilities": utilities,
-            "policy": policy,
+            "utilities": model.to_grid(utilities),
+            "policy": policy_grid,
             "iterations": iterations,
-            "algorithm": "value_iteration"
+            "backups": self.backups,
+            "stop_reason": self.stop_reason,
+            "error_bound": self.error_bound,
+            "algorithm": "value_iteration" if self.mode == "synchronous" else f"value_iteration_{self.mode}"
         }
 
-    def get_data(self) -> dict:
-        return dict(self.data_analysis)
+    def anytime(self, env: Environment) -> Iterator[dict]:
+        """
+        Anytime value iteration: runs synchronous sweeps and yields the greedy policy and its error bounds
+        after every sweep, so the caller can stop as soon as the policy is good enough.
+        Ends once the configured stopping rule or budget is met.
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Yields:
+            Sweep, utilities shifted to the midpoint of the span bounds, greedy policy (action indices, see
+            policy_to_grid), its number of changed actions, value_bound on the max-norm error of the utilities,
+            policy_bound on the loss of the greedy policy, delta, backups, elapsed time and the compiled model
+        """
+        model: TransitionModel = self.get_transition_model(env)
+        scale: float = self.gamma / (1 - self.gamma)
+        self.start_stopping()
+
+        # Expected utilities of every action are computed once per sweep: the backup of this sweep and the greedy policy of the last
+        utilities: np.ndarray = np.zeros(model.n_states, dtype=np.float64)
+        action_expected_utility: np.ndarray = model.expected_utilities(utilities)
+        policy: Optional[np.ndarray] = None
+        iterations: int = 0
+        converged: bool = False
+
+        while not converged:
+            iterations += 1
+            new_utilities: np.ndarray = model.rewards + self.gamma * action_expected_utility.max(axis=1)
+            new_utilities[model.terminal_states] = model.rewards[model.terminal_states]
+            action_expected_utility = model.expected_utilities(new_utilities)
+            greedy: np.ndarray = action_expected_utility.argmax(axis=1)
+
+            # Span bounds of the sweep (Puterman, Theorem 6.6.6): the greedy policy of the new utilities loses at most scale * span
+            change: np.ndarray = new_utilities - utilities
+            high, low = (change.max(), change.min()) if len(change) else (0.0, 0.0)
+            estimate: np.ndarray = new_utilities.copy()
+            estimate[~model.terminal] += scale * (high + low) / 2
+
+            converged = self.converged(new_utilities, utilities, iterations, model, greedy)
+            self.backups = iterations * model.n_states
+            yield {
+                "iteration": iterations,
+                "utilities": estimate,
+                "policy": greedy,
+                "policy_changes": int((greedy != policy).sum()) if policy is not None else len(greedy),
+                "value_bound": scale * (high - low) / 2,
+                "policy_bound": scale * (high - low),
+                "delta": max(high, -low),
+                "backups": self.backups,
+                "elapsed": time.perf_counter() - self.start_time,
+                "stop_reason": self.stop_reason,
+                "model": model,
+            }
+            utilities, policy = new_utilities, greedy
+
+    def resolve(self, env: Environment, previous: dict, changed: Iterable[Tuple]) -> dict:
+        """
+        Re-solves an environment after a few cells changed, starting from the previous solution.
+        Only the changed cells and the states that can move into them are queued, and updates
+        propagate outward through the reverse transition index with prioritized sweeping.
+
+        Args:
+            env (Environment): Environment object, already updated with the changes
+            previous (dict): Result of the previous solve of the environment
+            changed (Iterable[Tuple]): Cells whose type or reward changed
+
+        Returns:
+            Results including final utilities, optimal policies, no. of iterations and backups saved against the first cold solve (None if unknown)
+        """
+        model: TransitionModel = self.get_transition_model(env)
+        utilities: np.ndarray = model.from_grid(previous["utilities"]).astype(np.float64)
+        states: np.ndarray = self.affected_states(model, changed)
+
+        self.recorder.start(model)
+        self.start_stopping()
+        with self.profiler.phase("evaluation"):
+            utilities, iterations = self.solve_utilities_prioritized(model, utilities, states)
+        self.recorder.close()
+        self.profiler.count("backups", self.backups)
+        self.profiler.count("sweeps", iterations)
+
+        with self.profiler.phase("policy_extraction"):
+            policy = self.solve_optimal_policy(utilities, model)
+            policy_grid: List[List] = self.policy_to_grid(policy, model)
+        cold_backups: Optional[int] = self.cold_backups(previous, model)
+
+        return {
+            "utilities": model.to_grid(utilities),
+            "policy": policy_grid,
+            "iterations": iterations,
+            "backups": self.backups,
+            "cold_backups": cold_backups,
+            "backups_saved": cold_backups - self.backups if cold_backups is not None else None,
+            "stop_reason": self.stop_reason,
+            "error_bound": self.error_bound,
+            "algorithm": previous["algorithm"]
+        }
@@ -0,0 +1,88 @@
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from algos.value_iteration import ValueIteration
+from models.environment import Environment
+from models.recorder import Recorder
+from models.transition_model import TransitionModel
+
+
+class VectorizedValueIteration(ValueIteration):
+    def __init__(self, actions: Enum, epsilon: float, gamma: Optional[float] = 0.99, stopping: Optional[str] = "max_norm",
+                 stable_sweeps: Optional[int] = 5, max_time: Optional[float] = None, max_backups: Optional[int] = None,
+                 recorder: Optional[Recorder] = None):
+        """
+        Initializes an agent that solves the MDP problem using Value Iteration, performing the Bellman
+        backup of all states and all actions as batched array operations
+
+        Args:
+            epsilon (float): Maximum error allowed in the utility of any state
+            gamma (float): Discount factor (optional, default = 0.99)
+            stopping (str): Stopping rule, see ValueIteration (optional, default = "max_norm")
+            stable_sweeps (int): Sweeps the greedy policy has to stay unchanged for the policy rule (optional, default = 5)
+            max_time (float): Wall-clock budget in seconds (optional, default = None)
+            max_backups (int): Budget of Bellman backups (optional, default = None)
+            recorder (Recorder): Convergence telemetry recorder (optional, default = summary of every sweep)
+        """
+        super().__init__(actions, epsilon, gamma, stopping=stopping, stable_sweeps=stable_sweeps, max_time=max_time,
+                         max_backups=max_backups, recorder=recorder)
+
+    def solve_utilities(self, model: TransitionModel, utilities: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+        """
+        Calculates utilities of all states with batched synchronous sweeps
+
+        Args:
+            model (TransitionModel): Compiled states and transformer model of the environment
+            utilities (np.ndarray): Initial utilities, e.g. a warm start (optional, default = zeros)
+
+        Returns:
+            Utilities of all states and number of iterations (sweeps)
+        """
+        utilities = utilities if utilities is not None else np.zeros(model.n_states, dtype=np.float64)
+
+        # Successors laid out move-major so every move gathers one contiguous row
+        successors: np.ndarray = np.ascontiguousarray(model.successors.T)
+
+        iterations: int = 0
+        converged: bool = False
+
+        while not converged:
+            iterations += 1
+
+            # Bellman Update of every state, maximizing over the action axis
+            action_expected_utility: np.ndarray = model.move_probabilities @ utilities[successors]
+            new_utilities: np.ndarray = action_expected_utility.max(axis=0)
+            new_utilities *= self.gamma
+            new_utilities += model.rewards
+            new_utilities[model.terminal_states] = model.rewards[model.terminal_states]
+
+            # Update delta
+            delta = np.abs(new_utilities - utilities).max(initial=0.0)
+
+            # Record sweep for analysis
+            self.recorder.record(new_utilities, delta)
+
+            greedy: Optional[np.ndarray] = action_expected_utility.argmax(axis=0) if self.stopping == "policy" else None
+            converged = self.converged(new_utilities, utilities, iterations, model, greedy)
+            utilities = new_utilities
+
+        self.backups = iterations * model.n_states
+
+        return utilities, iterations
+
+    def solve(self, env: Environment) -> dict:
+        """
+        Main function that calculates final utilities and policies of all states
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results including final utilities, optimal policies, no. of iterations
+        """
+        result: dict = super().solve(env)
+        result["algorithm"] = "vectorized_value_iteration"
+
+        return result
@@ -37,6 +37,21 @@ actions = {
     "LEFT": (0, -1)
 }
 
+# Alternative action sets: 8-connected moves and staying in place
+actions_8 = {
+    **actions,
+    "UP_RIGHT": (-1, 1),
+    "DOWN_RIGHT": (1, 1),
+    "DOWN_LEFT": (1, -1),
+    "UP_LEFT": (-1, -1)
+}
+action_sets = {
+    "4": actions,
+    "8": actions_8,
+    "4_stay": {**actions, "STAY": (0, 0)},
+    "8_stay": {**actions_8, "STAY": (0, 0)}
+}
+
 
 # Pygame Display Settings
 RATIO = 1
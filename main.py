@@ -1,12 +1,56 @@
 import argparse
+import asyncio
+import cProfile
+import json
+import os
+import sys
 
+import numpy as np
+
+from algos.backward_induction import BackwardInduction
+from algos.batch_value_iteration import BatchValueIteration
+from algos.modified_policy_iteration import ModifiedPolicyIteration
+from algos.multigrid_value_iteration import MultigridValueIteration
 from algos.policy_iteration import PolicyIteration
+from algos.q_learning import QLearning
+from algos.sarsa import Sarsa
+from algos.scc_value_iteration import SCCValueIteration
+from algos.tiled_value_iteration import TiledValueIteration
 from algos.value_iteration import ValueIteration
-from config import SEED, actions, grid, rewards
-from manager.custom_grid import generate_grid
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import SEED, action_sets, actions, grid, rewards
+from manager.benchmark_manager import SOLVERS, BenchmarkManager, compare
+from manager.cache_manager import CacheManager
+from manager.custom_grid import LAYOUTS, generate_grid, generate_grid_arrays
 from manager.dataanalysis_manager import DataAnalysisManager
-from manager.display_manager import DisplayManager
+from manager.display_manager import DisplayManager, TileRenderer
+from manager.grid_store import allocate_arrays, load_environment, save_environment, save_result
+from manager.job_manager import serve
 from models.environment import Environment
+from models.profiler import Profiler, TimingProfiler
+
+ALGORITHMS = {
+    "value_iteration": lambda args, recorder: ValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, stopping=args.stopping, max_time=args.max_time, recorder=recorder),
+    "value_iteration_gauss_seidel": lambda args, recorder: ValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, mode="gauss_seidel", stopping=args.stopping, max_time=args.max_time, recorder=recorder),
+    "value_iteration_prioritized": lambda args, recorder: ValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, mode="prioritized", max_time=args.max_time, recorder=recorder),
+    "vectorized_value_iteration": lambda args, recorder: VectorizedValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, stopping=args.stopping, max_time=args.max_time, recorder=recorder),
+    "tiled_value_iteration": lambda args, recorder: TiledValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, workers=args.workers, stopping=args.stopping, max_time=args.max_time, recorder=recorder),
+    "multigrid_value_iteration": lambda args, recorder: MultigridValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, recorder=recorder),
+    "scc_value_iteration": lambda args, recorder: SCCValueIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, workers=args.workers, recorder=recorder),
+    "policy_iteration": lambda args, recorder: PolicyIteration(actions=action_sets[args.actions], k=300, gamma=0.99, evaluation=args.evaluation, recorder=recorder),
+    "backward_induction": lambda args, recorder: BackwardInduction(actions=action_sets[args.actions], horizon=args.horizon, gamma=0.99, checkpoint=args.checkpoint, recorder=recorder),
+    "modified_policy_iteration": lambda args, recorder: ModifiedPolicyIteration(actions=action_sets[args.actions], epsilon=0.1, gamma=0.99, recorder=recorder),
+    "q_learning": lambda args, recorder: QLearning(actions=action_sets[args.actions], gamma=0.99, episodes=20000, horizon=100, n_envs=256, seed=SEED, recorder=recorder),
+    "sarsa": lambda args, recorder: Sarsa(actions=action_sets[args.actions], gamma=0.99, episodes=20000, horizon=100, n_envs=256, seed=SEED, recorder=recorder),
+}
+
+# Stopping rules each value iteration algorithm supports, the other algorithms have their own convergence tests
+STOPPING_RULES = {
+    "value_iteration": ("max_norm", "span", "policy"),
+    "value_iteration_gauss_seidel": ("max_norm", "policy"),
+    "vectorized_value_iteration": ("max_norm", "span", "policy"),
+    "tiled_value_iteration": ("max_norm", "span", "policy"),
+}
 
 
 def parse_args():
@@ -20,13 +64,269 @@ def parse_args():
     parser.add_argument(
         "--random_grid", help="Use grid in Assignment 1 (False) OR generate random grid (True)",
         default="False", required=False)
+    parser.add_argument(
+        "--grid_file", help="Load the grid, slip model and terminal states from a grid store file instead of config.py or a random grid",
+        default=None, required=False)
+    parser.add_argument(
+        "--save_grid", help="Save the grid to a grid store file",
+        default=None, required=False)
+    parser.add_argument(
+        "--result_file", help="Save utilities and policy to a grid store file",
+        default=None, required=False)
+    parser.add_argument(
+        "--cache", help="Directory of the solution cache, solutions are not cached if not set",
+        default=None, required=False)
+    parser.add_argument(
+        "--actions", help="Action set: " + " | ".join(action_sets),
+        default="4", required=False)
+    parser.add_argument(
+        "--slip", help="Comma separated outcome:probability slip model, outcomes are forward | left | right | back | stay",
+        default="forward:0.8,left:0.1,right:0.1", required=False)
+    parser.add_argument(
+        "--terminals", help="Comma separated cell types that end an episode, e.g. G,R (none by default)",
+        default="", required=False)
+    parser.add_argument(
+        "--evaluation", help="Policy evaluation strategy for policy iteration: sweep | direct | iterative | auto",
+        default="sweep", required=False)
+    parser.add_argument(
+        "--stopping", help="Stopping rule for value iteration: max_norm | span | policy",
+        default="max_norm", required=False)
+    parser.add_argument(
+        "--max_time", help="Wall-clock budget in seconds for value iteration",
+        type=float, default=None, required=False)
+    parser.add_argument(
+        "--horizon", help="Number of time steps planned by backward induction",
+        type=int, default=100, required=False)
+    parser.add_argument(
+        "--checkpoint", help="Keep the utilities of every k-th stage of backward induction and recompute the others on demand",
+        type=int, default=None, required=False)
+    parser.add_argument(
+        "--workers", help="Number of worker threads for tiled and SCC value iteration",
+        type=int, default=None, required=False)
+    parser.add_argument(
+        "--record", help="Convergence telemetry streamed to docs/analysis: off | summary | sampled | history",
+        default="history", required=False)
+    parser.add_argument(
+        "--headless", help="Save result images without opening a window (True) OR display them (False)",
+        default="False", required=False)
+    parser.add_argument(
+        "--tiles", help="Write the result as a tile pyramid to this directory instead of full images, for grids too large to draw whole",
+        default=None, required=False)
+    parser.add_argument(
+        "--profile", help="Write a JSON report of time per solver phase and backup/sweep counts to this file",
+        default=None, required=False)
+    parser.add_argument(
+        "--profile_dump", help="Write a cProfile dump of the run to this file (readable by pstats, snakeviz or flameprof)",
+        default=None, required=False)
     parser.add_argument(
         "--debug", help="Print grid and results in command line",
         default="False", required=False)
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    # Refuse stopping rules an algorithm would otherwise replace or ignore
+    if args.stopping != "max_norm" and args.algorithm in ALGORITHMS \
+            and args.stopping not in STOPPING_RULES.get(args.algorithm, ()):
+        parser.error(f"--stopping={args.stopping} is not supported by {args.algorithm}, options: "
+                     + " | ".join(STOPPING_RULES.get(args.algorithm, ("max_norm",))))
+
+    # A grid store file brings its own slip model and terminal states
+    if args.grid_file:
+        for name in ("slip", "terminals"):
+            if getattr(args, name) != parser.get_default(name):
+                parser.error(f"--{name} cannot be combined with --grid_file, the file stores its own {name}")
+    return args
+
+
+def parse_batch_args(argv):
+    """
+    Parse command line arguments of the batch subcommand.
+    """
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Solve many random grids with value iteration")
+    parser.add_argument(
+        "--grids", help="Number of random grids to generate", type=int, default=100)
+    parser.add_argument(
+        "--sizes", help="Comma separated grid sizes, e.g. 20x20,40x30", default="20x20")
+    parser.add_argument(
+        "--gammas", help="Comma separated discount factors", default="0.99")
+    parser.add_argument(
+        "--epsilons", help="Comma separated maximum errors", default="0.1")
+    parser.add_argument(
+        "--workers", help="Processes used for grids of different sizes", type=int, default=None)
+    parser.add_argument(
+        "--output", help="Directory for utilities and summary.csv", default="docs/batch")
+    return parser.parse_args(argv)
+
+
+def run_batch(args):
+    """
+    Generate random grids and solve them all for every gamma and epsilon.
+    """
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes.split(",")]
+    envs = []
+    for index in range(args.grids):
+        height, width = sizes[index % len(sizes)]
+        grid, rewards = generate_grid(grid_height=height, grid_width=width)
+        envs.append(Environment(grid_world=grid, rewards=rewards, initial_state=(height-1, 0)))
+
+    agent = BatchValueIteration(actions=actions, gammas=[float(g) for g in args.gammas.split(",")],
+                                epsilons=[float(e) for e in args.epsilons.split(",")],
+                                workers=args.workers, output_dir=args.output)
+    summary = agent.solve(envs)
+    summary.to_csv(os.path.join(args.output, "summary.csv"), index=None)
+    print(summary.to_string(index=False))
+
+
+def parse_benchmark_args(argv):
+    """
+    Parse command line arguments of the benchmark subcommand.
+    """
+    parser = argparse.ArgumentParser(prog="main.py benchmark", description="Benchmark solvers on random grids")
+    parser.add_argument(
+        "--sizes", help="Comma separated grid sizes", default="6x6,50x50,200x200,1000x1000")
+    parser.add_argument(
+        "--densities", help="Comma separated wall:reward densities", default="0.168:0.332,0.3:0.05")
+    parser.add_argument(
+        "--solvers", help="Comma separated solvers: " + " | ".join(SOLVERS), default=",".join(SOLVERS))
+    parser.add_argument(
+        "--repeat", help="Runs of every case, the fastest is reported", type=int, default=1)
+    parser.add_argument(
+        "--output", help="JSON file for the results", default="docs/benchmark/benchmark.json")
+    parser.add_argument(
+        "--compare", help="JSON file of an earlier run to compare the results against", default=None)
+    return parser.parse_args(argv)
+
+
+def run_benchmark(args):
+    """
+    Benchmark solvers and save the results, optionally comparing them with an earlier run.
+    """
+    benchmark = BenchmarkManager(sizes=[tuple(int(n) for n in size.split("x")) for size in args.sizes.split(",")],
+                                 densities=[tuple(float(d) for d in density.split(":")) for density in args.densities.split(",")],
+                                 solvers=args.solvers.split(","), repeat=args.repeat)
+    results = benchmark.run()
+    benchmark.save(results, args.output)
+    print(results.to_string(index=False))
+
+    if args.compare:
+        print(compare(args.compare, args.output).to_string(index=False))
+
+
+def parse_generate_args(argv):
+    """
+    Parse command line arguments of the generate subcommand.
+    """
+    parser = argparse.ArgumentParser(prog="main.py generate", description="Generate a large grid into a grid store file")
+    parser.add_argument(
+        "--size", help="Grid size, e.g. 10000x10000", default="1000x1000")
+    parser.add_argument(
+        "--layout", help="Grid layout: " + " | ".join(LAYOUTS), default="random")
+    parser.add_argument(
+        "--seed", help="Seed of the grid", type=int, default=SEED)
+    parser.add_argument(
+        "--no_prune", help="Keep cells that cannot be reached from the initial state", action="store_true")
+    parser.add_argument(
+        "--actions", help="Action set that decides which cells can be reached: " + " | ".join(action_sets), default="4")
+    parser.add_argument(
+        "--float32", help="Store rewards as float32", action="store_true")
+    parser.add_argument(
+        "--output", help="Grid store file to write", default="docs/grids/grid.grid")
+    return parser.parse_args(argv)
+
+
+def run_generate(args):
+    """
+    Generate a grid chunk by chunk straight into a memory mapped grid store file.
+    """
+    height, width = (int(n) for n in args.size.split("x"))
+    arrays = allocate_arrays(args.output, "environment",
+                             {"cells": ((height, width), "uint8"), "rewards": ((height, width), "float32" if args.float32 else "float64")},
+                             {"initial_state": [height-1, 0], "slip": Environment.DEFAULT_SLIP})
+    cells, _ = generate_grid_arrays(grid_height=height, grid_width=width, layout=args.layout, seed=args.seed,
+                                    prune=not args.no_prune, moves=action_sets[args.actions].values(), out=arrays)
+    for array in arrays.values():
+        array.flush()
+    print(f"{args.output}: {height}x{width} {args.layout} grid, {int((cells != Environment.WALL_CODE).sum())} open cells")
+
+
+def parse_serve_args(argv):
+    """
+    Parse command line arguments of the serve subcommand.
+    """
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Serve solver jobs over HTTP")
+    parser.add_argument(
+        "--host", help="Address to listen on", default="127.0.0.1")
+    parser.add_argument(
+        "--port", help="Port to listen on", type=int, default=8080)
+    parser.add_argument(
+        "--workers", help="Solver processes", type=int, default=None)
+    parser.add_argument(
+        "--max_pending", help="Queued jobs before new submissions are rejected", type=int, default=64)
+    return parser.parse_args(argv)
+
+
+def run_serve(args):
+    """
+    Run the job server until interrupted.
+    """
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_tiles_args(argv):
+    """
+    Parse command line arguments of the tiles subcommand.
+    """
+    parser = argparse.ArgumentParser(prog="main.py tiles", description="Render tiles of a saved result as an image pyramid")
+    parser.add_argument(
+        "--grid_file", help="Grid store file of the environment", required=True)
+    parser.add_argument(
+        "--result_file", help="Grid store file of the result", required=True)
+    parser.add_argument(
+        "--levels", help="Comma separated zoom levels to render every tile of, 0 fits the whole grid in one tile", default=None)
+    parser.add_argument(
+        "--tiles", help="Comma separated level/row/col tiles to render, e.g. 5/3/4,6/7/8", default=None)
+    parser.add_argument(
+        "--tile_size", help="Side of a tile in pixels", type=int, default=256)
+    parser.add_argument(
+        "--cell_size", help="Side of a cell in pixels at the last level, a power of 2", type=int, default=64)
+    parser.add_argument(
+        "--output", help="Directory for the tiles", default="docs/tiles")
+    return parser.parse_args(argv)
+
+
+def run_tiles(args):
+    """
+    Render the requested tiles of a saved result, by default every level of at most 64 tiles.
+    """
+    renderer = TileRenderer.from_files(args.grid_file, args.result_file, args.output, tile_size=args.tile_size, cell_size=args.cell_size)
+    if args.tiles:
+        paths = renderer.save(tuple(int(n) for n in tile.split("/")) for tile in args.tiles.split(","))
+    else:
+        paths = renderer.save_levels([int(level) for level in args.levels.split(",")] if args.levels else None)
+    print(f"{len(paths)} tiles written to {args.output}, levels 0..{renderer.levels - 1}:",
+          ", ".join(f"{rows}x{cols}" for rows, cols in map(renderer.tile_counts, range(renderer.levels))))
+
+
+SUBCOMMANDS = {
+    "batch": (parse_batch_args, run_batch),
+    "benchmark": (parse_benchmark_args, run_benchmark),
+    "generate": (parse_generate_args, run_generate),
+    "serve": (parse_serve_args, run_serve),
+    "tiles": (parse_tiles_args, run_tiles),
+}
 
 
 if __name__ == "__main__":
+    # Set seed for reproducability of generate_grid, which draws from NumPy's global generator
+    np.random.seed(SEED)
+
+if __name__ == "__main__" and sys.argv[1:2] and sys.argv[1] in SUBCOMMANDS:
+    parse, run = SUBCOMMANDS[sys.argv[1]]
+    run(parse(sys.argv[2:]))
+
+elif __name__ == "__main__":
     args = parse_args()
     file_name = "assgn1"
     if args.random_grid == "True":
@@ -36,30 +336,56 @@ if __name__ == "__main__":
         file_name = "random" + str(SEED)
     
     algorithm = args.algorithm
-    env = Environment(grid_world=grid, rewards=rewards, initial_state=(len(grid)-1, 0))
+    slip = {outcome: float(prob) for outcome, prob in (pair.split(":") for pair in args.slip.split(","))}
+    terminals = [(i, j) for i, row in enumerate(grid) for j, cell in enumerate(row) if cell in args.terminals.split(",")]
+    env = Environment(grid_world=grid, rewards=rewards, initial_state=(len(grid)-1, 0), seed=SEED, slip=slip, terminals=terminals)
+    if args.grid_file:
+        env = load_environment(args.grid_file, seed=SEED)
+        grid = env.grid_world
+        file_name = os.path.splitext(os.path.basename(args.grid_file))[0]
+    if args.save_grid:
+        save_environment(args.save_grid, env)
 
-    if algorithm == "value_iteration":
-        agent = ValueIteration(actions=actions, epsilon=0.1, gamma=0.99)
-        result = agent.solve(env)
-        result["grid"] = grid
-
-        if args.debug:
-            print(grid, result)
+    if algorithm in ALGORITHMS:
+        profiler = TimingProfiler() if args.profile else Profiler()
+        cprofile = cProfile.Profile() if args.profile_dump else None
+        if cprofile:
+            cprofile.enable()
 
-        DisplayManager(height=len(grid), width=len(grid[0]), output=file_name).display(result)
-        DataAnalysisManager(algorithm=result['algorithm'], output=file_name).save(agent.get_data())
+        analysis = DataAnalysisManager(algorithm=algorithm, output=file_name)
+        agent = ALGORITHMS[algorithm](args, analysis.recorder(args.record))
+        if args.profile:
+            agent.set_profiler(profiler)
 
-    elif algorithm == "policy_iteration":
-        agent = PolicyIteration(actions=actions, k=300, gamma=0.99)
-        result = agent.solve(env)
+        with profiler.phase("solve"):
+            if args.cache:
+                cache = CacheManager(directory=args.cache)
+                result = cache.solve(agent, env)
+                print(result["cache"], cache.stats())
+            else:
+                result = agent.solve(env)
         result["grid"] = grid
 
+        if args.result_file:
+            save_result(args.result_file, result, agent.ACTIONS)
+
         if args.debug:
             print(grid, result)
 
-        DisplayManager(height=len(grid), width=len(grid[0]), output=file_name).display(result)
-        DataAnalysisManager(algorithm=result['algorithm'], output=file_name).save(agent.get_data())
+        with profiler.phase("rendering"):
+            if args.tiles:
+                TileRenderer.from_result(result, agent.ACTIONS, args.tiles).save_levels()
+            else:
+                DisplayManager(height=len(grid), width=len(grid[0]), output=file_name,
+                               headless=args.headless == "True").display(result)
+
+        if cprofile:
+            cprofile.disable()
+            cprofile.dump_stats(args.profile_dump)
+        if args.profile:
+            with open(args.profile, "w") as file:
+                json.dump({"algorithm": algorithm, **profiler.report()}, file, indent=2)
 
     else:
         print("INVALID ALGORITHM")
-        print("Options: value_iteration | policy_iteration")
\ No newline at end of file
+        print("Options: " + " | ".join(ALGORITHMS))
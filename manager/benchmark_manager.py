@@ -0,0 +1,193 @@
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+import numpy as np
+import pandas as pd
+
+from algos.modified_policy_iteration import ModifiedPolicyIteration
+from algos.multigrid_value_iteration import MultigridValueIteration
+from algos.policy_iteration import PolicyIteration
+from algos.scc_value_iteration import SCCValueIteration
+from algos.tiled_value_iteration import TiledValueIteration
+from algos.value_iteration import ValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.custom_grid import generate_grid
+from manager.grid_store import encode_cells
+from models.environment import Environment
+from models.recorder import Recorder
+
+# Solver factories taking (epsilon, gamma) and the largest number of states each is benchmarked on.
+# The per-state Python solvers are capped so a full run finishes in minutes.
+SOLVERS: Dict[str, Tuple[Callable, int]] = {
+    "value_iteration": (lambda epsilon, gamma: ValueIteration(actions, epsilon, gamma, recorder=Recorder()), 2500),
+    "value_iteration_gauss_seidel": (lambda epsilon, gamma: ValueIteration(actions, epsilon, gamma, mode="gauss_seidel", recorder=Recorder()), 2500),
+    "value_iteration_prioritized": (lambda epsilon, gamma: ValueIteration(actions, epsilon, gamma, mode="prioritized", recorder=Recorder()), 2500),
+    "vectorized_value_iteration": (lambda epsilon, gamma: VectorizedValueIteration(actions, epsilon, gamma, recorder=Recorder()), 10**6),
+    "tiled_value_iteration": (lambda epsilon, gamma: TiledValueIteration(actions, epsilon, gamma, recorder=Recorder()), 10**6),
+    "multigrid_value_iteration": (lambda epsilon, gamma: MultigridValueIteration(actions, epsilon, gamma, recorder=Recorder()), 10**6),
+    "scc_value_iteration": (lambda epsilon, gamma: SCCValueIteration(actions, epsilon, gamma, recorder=Recorder()), 10**6),
+    "policy_iteration": (lambda epsilon, gamma: PolicyIteration(actions, k=300, gamma=gamma, tolerance=epsilon * (1 - gamma) / gamma, recorder=Recorder()), 2500),
+    "policy_iteration_direct": (lambda epsilon, gamma: PolicyIteration(actions, gamma=gamma, evaluation="direct", recorder=Recorder()), 250000),
+    "modified_policy_iteration": (lambda epsilon, gamma: ModifiedPolicyIteration(actions, epsilon, gamma, recorder=Recorder()), 10**6),
+    "policy_iteration_iterative": (lambda epsilon, gamma: PolicyIteration(actions, k=1000, gamma=gamma, evaluation="iterative", recorder=Recorder()), 10**6),
+}
+
+# Reference solution every solver is compared against
+REFERENCE_SOLVER = "vectorized_value_iteration"
+REFERENCE_EPSILON = 1e-4
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident memory of this process in MB. VmHWM belongs to the process's own address space, while
+    ru_maxrss on Linux keeps the peak of the process it was forked from, even across exec.
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(solver: str, cells: np.ndarray, rewards: np.ndarray, initial_state: Tuple[int, int], epsilon: float, gamma: float,
+             reference: np.ndarray) -> dict:
+    """
+    Solves one grid with one solver, meant to run in a spawned process so peak RSS is its own.
+    The environment is built from the grid arrays here, so no compiled model of the parent is carried over.
+
+    Returns:
+        Wall time, iterations, backups, backups/sec, peak RSS and max-norm difference to the reference
+    """
+    env: Environment = Environment(grid_world=cells, rewards=rewards, initial_state=initial_state)
+    agent = SOLVERS[solver][0](epsilon, gamma)
+
+    start: float = time.perf_counter()
+    result: dict = agent.solve(env)
+    wall_time: float = time.perf_counter() - start
+
+    backups: int = int(result.get("backups", 0))
+    return {
+        "wall_time": wall_time,
+        "iterations": int(result["iterations"]),
+        "backups": backups,
+        "backups_per_sec": backups / wall_time if wall_time > 0 else float("inf"),
+        "peak_rss_mb": peak_rss_mb(),
+        "max_error": float(np.abs(result["utilities"] - reference).max(initial=0.0)),
+    }
+
+
+class BenchmarkManager:
+    def __init__(self, sizes: List[Tuple[int, int]], densities: List[Tuple[float, float]], solvers: Optional[List[str]] = None,
+                 epsilon: float = 0.1, gamma: float = 0.99, repeat: int = 1, seed: int = 1):
+        """
+        Benchmarks solvers on random grids of every size and density
+
+        Args:
+            sizes (List[Tuple[int, int]]): (height, width) of the generated grids
+            densities (List[Tuple[float, float]]): (wall, reward) densities, rewards are split evenly into green and red cells
+            solvers (List[str]): Names of the solvers in SOLVERS to run (optional, default = all)
+            epsilon (float): Maximum error allowed in the utility of any state (optional, default = 0.1)
+            gamma (float): Discount factor (optional, default = 0.99)
+            repeat (int): Runs of every case, the fastest is reported (optional, default = 1)
+            seed (int): Seed of the generated grids (optional, default = 1)
+        """
+        self.sizes = sizes
+        self.densities = densities
+        self.solvers = solvers if solvers is not None else list(SOLVERS)
+        self.epsilon = epsilon
+        self.gamma = gamma
+        self.repeat = repeat
+        self.seed = seed
+
+    def generate(self, height: int, width: int, wall: float, reward: float) -> Environment:
+        np.random.seed(self.seed)
+        grid, rewards = generate_grid(grid_height=height, grid_width=width, prob_green=reward / 2, prob_red=reward / 2,
+                                      prob_wall=wall, prob_white=1 - wall - reward)
+        return Environment(grid_world=grid, rewards=rewards, initial_state=(height-1, 0))
+
+    def run(self) -> pd.DataFrame:
+        """
+        Runs every (size, density, solver) case, each in a freshly spawned process. Forked processes would
+        share the pages of this process and report its peak RSS instead of their own.
+
+        Returns:
+            One row per case
+        """
+        rows: List[dict] = []
+        for height, width in self.sizes:
+            for wall, reward in self.densities:
+                env: Environment = self.generate(height, width, wall, reward)
+                n_states: int = env.get_transition_model(list(actions.values())).n_states
+                reference: np.ndarray = SOLVERS[REFERENCE_SOLVER][0](REFERENCE_EPSILON, self.gamma).solve(env)["utilities"]
+                cells, rewards = encode_cells(env.grid_world), np.asarray(env.rewards, dtype=np.float64)
+
+                for solver in self.solvers:
+                    if n_states > SOLVERS[solver][1]:
+                        continue
+
+                    runs: List[dict] = []
+                    for _ in range(self.repeat):
+                        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                            runs.append(executor.submit(run_case, solver, cells, rewards, env.agent_pos, self.epsilon, self.gamma,
+                                                        reference).result())
+
+                    best: dict = min(runs, key=lambda run: run["wall_time"])
+                    rows.append({"solver": solver, "height": height, "width": width, "wall_density": wall,
+                                 "reward_density": reward, "states": n_states, **best})
+
+        return pd.DataFrame(rows)
+
+    def save(self, results: pd.DataFrame, path: str) -> None:
+        """
+        Writes results as JSON together with the commit and machine they were measured on
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({
+                "commit": current_commit(),
+                "machine": platform.platform(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "epsilon": self.epsilon,
+                "gamma": self.gamma,
+                "results": results.to_dict(orient="records"),
+            }, file, indent=2)
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline_path: str, current_path: str) -> pd.DataFrame:
+    """
+    Compares two saved benchmark runs case by case
+
+    Returns:
+        Wall time, backups/sec and peak RSS of both runs with the wall time ratio (current / baseline)
+    """
+    keys: List[str] = ["solver", "height", "width", "wall_density", "reward_density"]
+    metrics: List[str] = ["wall_time", "backups_per_sec", "peak_rss_mb"]
+
+    runs: List[pd.DataFrame] = []
+    for path in (baseline_path, current_path):
+        with open(path) as file:
+            runs.append(pd.DataFrame(json.load(file)["results"])[keys + metrics])
+
+    merged: pd.DataFrame = runs[0].merge(runs[1], on=keys, suffixes=("_baseline", "_current"))
+    merged["wall_time_ratio"] = merged["wall_time_current"] / merged["wall_time_baseline"]
+
+    return merged
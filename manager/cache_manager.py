@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import *
+
+import numpy as np
+
+from manager.grid_store import encode_cells, read_arrays, load_result, save_environment, save_result
+from models.agent import Agent
+from models.environment import Environment
+
+# Solver attributes that change the solution, missing attributes are skipped. Budgets are not among them:
+# results cut short by a budget are never cached, and converged results do not depend on the budget.
+SOLVER_PARAMETERS = ("gamma", "epsilon", "mode", "k", "evaluation", "tolerance", "tile_size", "local_sweeps", "stopping",
+                     "stable_sweeps", "levels", "min_size", "coarse_epsilon", "horizon", "checkpoint", "min_sweeps",
+                     "max_sweeps", "elimination", "alpha", "exploration", "episodes", "n_envs", "exploring_starts", "seed")
+
+# Stop reasons of solves cut short by a budget
+BUDGET_STOPS = ("max_time", "max_backups")
+
+# Result fields stored by save_result itself, every other JSON serializable field is kept in the result's metadata
+RESULT_ARRAYS = ("utilities", "policy", "iterations", "algorithm", "grid", "cache")
+
+
+def to_json(value: Any) -> Any:
+    """
+    JSON value of a result field, NumPy scalars become Python numbers
+
+    Raises:
+        TypeError: If the value is not JSON serializable, e.g. an array
+    """
+    def scalar(item: Any) -> Any:
+        if isinstance(item, np.generic):
+            return item.item()
+        raise TypeError(f"{type(item).__name__} is not JSON serializable")
+
+    return json.loads(json.dumps(value, default=scalar))
+
+
+class CacheManager:
+    def __init__(self, directory: str, max_bytes: Optional[int] = 1 << 30, warm_start_fraction: Optional[float] = 0.05):
+        """
+        Content-addressed on-disk cache of solutions, keyed by a hash of the environment and the solver parameters.
+        A miss falls back to warm-starting the solver from a cached solution of a near-identical environment.
+
+        Args:
+            directory (str): Directory of the cached results
+            max_bytes (int): Size of the cache, least recently used entries are evicted beyond it (optional, default = 1 GiB)
+            warm_start_fraction (float): Largest fraction of changed cells for a warm start, 0 disables warm starts (optional, default = 0.05)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.warm_start_fraction = warm_start_fraction
+        os.makedirs(directory, exist_ok=True)
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.warm_starts: int = 0
+        self.evictions: int = 0
+        self.lookup_time: float = 0.0
+        self.lookups: int = 0
+
+        # Entries from least to most recently used: key -> (size in bytes, solver key, shape)
+        self.entries: OrderedDict = OrderedDict()
+        files: List[str] = [name for name in os.listdir(directory) if name.endswith(".res")]
+        for name in sorted(files, key=lambda name: os.path.getmtime(os.path.join(directory, name))):
+            key: str = name[:-len(".res")]
+            info: dict = load_result(self.path(key, "res"))["info"]
+            self.entries[key] = (self.size(key), info["solver"], tuple(info["shape"]))
+
+    def path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def size(self, key: str) -> int:
+        return sum(os.path.getsize(self.path(key, extension)) for extension in ("res", "grid") if os.path.exists(self.path(key, extension)))
+
+    @staticmethod
+    def is_cacheable(agent: Agent, env: Environment) -> bool:
+        """
+        Sampling learners give the same solution twice only if both they and the environment's step function are seeded
+        """
+        return not hasattr(agent, "seed") or (agent.seed is not None and env.seed is not None)
+
+    @staticmethod
+    def solver_key(agent: Agent, env: Optional[Environment] = None) -> str:
+        """
+        Hash of the solver class, its action set and every parameter that changes the solution,
+        and for sampling learners the seed of the environment's step function
+        """
+        parameters: dict = {name: getattr(agent, name) for name in SOLVER_PARAMETERS if hasattr(agent, name)}
+        if hasattr(agent, "seed") and env is not None:
+            parameters["environment_seed"] = env.seed
+        parameters["solver"] = type(agent).__name__
+        parameters["actions"] = [[action.name, list(action.value)] for action in agent.ACTIONS]
+        return hashlib.blake2b(json.dumps(parameters, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def environment_key(env: Environment, solver_key: str) -> str:
+        """
+        Hash of the cells, rewards, terminal states and slip model of the environment, combined with the solver key
+        """
+        walls, rewards, terminal = env.get_arrays()
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(solver_key.encode())
+        digest.update(json.dumps({"shape": list(walls.shape), "slip": env.slip}, sort_keys=True).encode())
+        for array in (walls, rewards, terminal):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def solve(self, agent: Agent, env: Environment) -> dict:
+        """
+        Returns the cached solution of the environment, or solves it and caches the solution
+
+        Args:
+            agent (Agent): Solver, warm starts need a resolve method like ValueIteration and PolicyIteration
+            env (Environment): Environment object defining the states and transformer model
+
+        Returns:
+            Results of the solver, with "cache" set to "hit", "warm" or "miss". Results stopped by a budget
+            and results of unseeded learners are not cached.
+        """
+        if not self.is_cacheable(agent, env):
+            self.misses += 1
+            result: dict = agent.solve(env)
+            result["cache"] = "miss"
+            return result
+
+        # Lookup latency covers hashing and, on a hit, loading the cached solution
+        start: float = time.perf_counter()
+        solver_key: str = self.solver_key(agent, env)
+        key: str = self.environment_key(env, solver_key)
+        self.lookups += 1
+
+        if key in self.entries:
+            self.hits += 1
+            result = self.load(agent, key)
+            self.lookup_time += time.perf_counter() - start
+            return result
+
+        self.lookup_time += time.perf_counter() - start
+        self.misses += 1
+        previous: Optional[Tuple[str, np.ndarray]] = self.nearest(env, solver_key) if hasattr(agent, "resolve") else None
+        if previous is not None:
+            self.warm_starts += 1
+            result = agent.resolve(env, self.load(agent, previous[0]), previous[1])
+            result["cache"] = "warm"
+        else:
+            result = agent.solve(env)
+            result["cache"] = "miss"
+
+        self.store(agent, env, key, solver_key, result)
+        return result
+
+    def load(self, agent: Agent, key: str) -> dict:
+        cached: dict = load_result(self.path(key, "res"), agent.ACTIONS)
+        os.utime(self.path(key, "res"))
+        self.entries.move_to_end(key)
+
+        result: dict = {"utilities": np.array(cached["utilities"]), "policy": cached["policy"],
+                        "iterations": cached["iterations"], "algorithm": cached["algorithm"], "cache": "hit"}
+        result.update(cached["info"]["fields"])
+        return result
+
+    def nearest(self, env: Environment, solver_key: str) -> Optional[Tuple[str, np.ndarray]]:
+        """
+        Cached entry of the same solver and shape with the fewest changed cells, within warm_start_fraction
+
+        Returns:
+            Key of the entry and the changed cells, None if there is no such entry
+        """
+        walls, rewards, terminal = env.get_arrays()
+        cells: np.ndarray = encode_cells(env.grid_world)
+        best: Optional[Tuple[str, np.ndarray]] = None
+        limit: int = int(self.warm_start_fraction * walls.size)
+
+        for key, (_, entry_solver, shape) in self.entries.items():
+            if entry_solver != solver_key or shape != walls.shape:
+                continue
+
+            _, meta, arrays = read_arrays(self.path(key, "grid"))
+            if meta["slip"] != env.slip or not np.array_equal(arrays.get("terminals", np.zeros(shape, dtype=np.uint8)), terminal):
+                continue
+
+            changed: np.ndarray = np.argwhere((arrays["cells"] != cells) | (arrays["rewards"] != rewards))
+            if len(changed) <= limit and (best is None or len(changed) < len(best[1])):
+                best = (key, changed)
+
+        return best
+
+    def store(self, agent: Agent, env: Environment, key: str, solver_key: str, result: dict) -> None:
+        # A solve cut short by a budget is not converged, serving it as a hit would hide that
+        if result.get("stop_reason") in BUDGET_STOPS:
+            return
+
+        # Every other field is kept, so a hit has the same fields as a miss
+        fields: dict = {}
+        for name, value in result.items():
+            if name not in RESULT_ARRAYS:
+                try:
+                    fields[name] = to_json(value)
+                except TypeError:
+                    pass
+        info: dict = {"solver": solver_key, "shape": list(np.shape(result["utilities"])), "fields": fields}
+
+        save_environment(self.path(key, "grid"), env)
+        save_result(self.path(key, "res"), result, agent.ACTIONS, info)
+        self.entries[key] = (self.size(key), solver_key, tuple(info["shape"]))
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes least recently used entries until the cache fits in max_bytes, always keeping the newest entry
+        """
+        total: int = sum(size for size, _, _ in self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            key, (size, _, _) = self.entries.popitem(last=False)
+            for extension in ("res", "grid"):
+                if os.path.exists(self.path(key, extension)):
+                    os.remove(self.path(key, extension))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counters and mean lookup latency of the cache
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "warm_starts": self.warm_starts,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": sum(size for size, _, _ in self.entries.values()),
+            "mean_lookup_time": self.lookup_time / self.lookups if self.lookups else 0.0,
+        }
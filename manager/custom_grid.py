@@ -1,15 +1,13 @@
 from typing import *
 import numpy as np
-from config import SEED
+from models.environment import Environment
 
-# Set seed for reproducability
-np.random.seed(SEED)
 
 def generate_grid(grid_height: int, grid_width: int, prob_green: float = 0.166, prob_red: float = 0.166, 
                     prob_wall: float = 0.168, prob_white: float = 0.5) -> Tuple[List[List], List[List]]:
     """
     Generates a grid world environment of required dimensions based
-    on probabilities of grid world objects.
+    on probabilities of grid world objects, drawn from NumPy's global generator.
 
     Args:
         grid_height (int): Number of rows in environment
@@ -23,7 +21,7 @@ def generate_grid(grid_height: int, grid_width: int, prob_green: float = 0.166,
         Grid world 2-D array
     """
     # Error checking in case sum of probabilities < 1
-    assert (prob_green + prob_red + prob_wall + prob_white) == 1.0
+    assert np.isclose(prob_green + prob_red + prob_wall + prob_white, 1.0)
     
     grid_things_arr = ['G', 'R', 'W', 'Wh']
     prob_arr        = [prob_green, prob_red, prob_wall, prob_white] 
@@ -32,4 +30,235 @@ def generate_grid(grid_height: int, grid_width: int, prob_green: float = 0.166,
     grid = np.random.choice(grid_things_arr, (grid_height, grid_width), p=prob_arr)
     rewards = [[reward_map[cell] for cell in row] for row in grid]
 
-    return grid, rewards
\ No newline at end of file
+    return grid, rewards
+
+
+# Codes of the cell types in Environment.CELL_TYPES and the reward of each code
+WHITE, GREEN, RED, WALL = (Environment.CELL_TYPES.index(cell) for cell in ('Wh', 'G', 'R', 'W'))
+CODE_REWARDS = np.array([-0.04, +1, -1, 0], dtype=np.float64)
+
+LAYOUTS = ("random", "maze", "rooms", "clusters")
+
+
+def generate_grid_arrays(grid_height: int, grid_width: int, layout: str = "random", seed: Optional[Union[int, np.random.Generator]] = None,
+                         prob_green: float = 0.166, prob_red: float = 0.166, prob_wall: float = 0.168, prob_white: float = 0.5,
+                         room_size: int = 16, cluster_size: int = 32, cluster_density: float = 0.7,
+                         initial_state: Optional[Tuple] = None, prune: bool = True, moves: Optional[Iterable[Tuple]] = None,
+                         chunk_rows: int = 1024, reward_dtype: type = np.float64, out: Optional[Dict[str, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a grid world as a uint8 array of cell codes and a float array of rewards, row chunk by row chunk,
+    so grids far larger than a nested list of strings fit in memory or stream into memory mapped arrays.
+
+    Args:
+        grid_height (int): Number of rows in environment
+        grid_width (int): Number of columns in environment
+        layout (str): Placement of walls and rewards (optional, default = "random")
+            random: every cell is drawn independently
+            maze: binary tree maze with open cells at even rows and columns, rewards drawn on open cells
+            rooms: room_size x room_size rooms joined by one door per wall, rewards drawn on open cells
+            clusters: random walls, rewards in cluster_size x cluster_size blocks of one colour
+        seed: Seed or Generator of the grid (optional, default = None)
+        prob_green (float): Probability that cell is green - +1 reward (optional, default = 0.166)
+        prob_red (float): Probability that cell is red - -1 reward (optional, default = 0.166)
+        prob_wall (float): Probability that cell is a wall, for random and clusters layouts (optional, default = 0.168)
+        prob_white (float): Probability that cell is white - -0.04 reward (optional, default = 0.5)
+        room_size (int): Rows and columns of a room, walls included (optional, default = 16)
+        cluster_size (int): Rows and columns of a reward cluster (optional, default = 32)
+        cluster_density (float): Fraction of a cluster's open cells that take its colour (optional, default = 0.7)
+        initial_state (Tuple): Cells unreachable from it become walls if prune (optional, default = bottom left cell)
+        prune (bool): Turn cells unreachable from initial_state into walls (optional, default = True)
+        moves (Iterable[Tuple]): Moves of the action set that decides reachability, e.g. action_sets["8"].values() (optional, default = 4 directions)
+        chunk_rows (int): Rows generated at once (optional, default = 1024)
+        reward_dtype (type): np.float32 or np.float64 (optional, default = np.float64)
+        out (Dict[str, np.ndarray]): "cells" and "rewards" arrays to fill, e.g. from grid_store.allocate_arrays (optional, default = new arrays)
+
+    Returns:
+        Cell codes and rewards of the grid
+    """
+    assert np.isclose(prob_green + prob_red + prob_wall + prob_white, 1.0)
+    assert layout in LAYOUTS
+
+    rng: np.random.Generator = np.random.default_rng(seed)
+    cells: np.ndarray = out["cells"] if out is not None else np.empty((grid_height, grid_width), dtype=np.uint8)
+    rewards: np.ndarray = out["rewards"] if out is not None else np.empty((grid_height, grid_width), dtype=reward_dtype)
+    initial_state = initial_state if initial_state is not None else (grid_height - 1, 0)
+
+    # Cell types of open cells, drawn with the non-wall probabilities
+    open_probabilities: np.ndarray = np.array([prob_white, prob_green, prob_red]) / (1 - prob_wall)
+    open_cumulative: np.ndarray = np.cumsum(open_probabilities)[:-1]
+
+    # Colour of every reward cluster, drawn up front so clusters continue across chunks
+    if layout == "clusters":
+        clusters: np.ndarray = np.searchsorted(open_cumulative, rng.random((-(-grid_height // cluster_size), -(-grid_width // cluster_size))), side="right").astype(np.uint8)
+
+    # Rooms layouts start chunks at room boundaries, so every wall row and its doors belong to one chunk
+    step: int = max(chunk_rows // room_size, 1) * room_size if layout == "rooms" else max(chunk_rows - chunk_rows % 2, 2)
+    for top in range(0, grid_height, step):
+        rows: slice = slice(top, min(top + step, grid_height))
+        shape: Tuple[int, int] = (rows.stop - top, grid_width)
+        chunk: np.ndarray = np.searchsorted(open_cumulative, rng.random(shape), side="right").astype(np.uint8)
+
+        if layout == "random":
+            chunk[rng.random(shape) < prob_wall] = WALL
+
+        elif layout == "clusters":
+            colours: np.ndarray = np.repeat(np.repeat(clusters[top // cluster_size:-(-rows.stop // cluster_size)], cluster_size, axis=0),
+                                            cluster_size, axis=1)[top % cluster_size:top % cluster_size + shape[0], :grid_width]
+            chunk = np.where(rng.random(shape) < cluster_density, colours, WHITE).astype(np.uint8)
+            chunk[rng.random(shape) < prob_wall] = WALL
+
+        elif layout == "maze":
+            # Passages up from the chunk's first room row open the last row of the previous chunk
+            above: np.ndarray = maze_chunk(chunk, top, rng)
+            cells[top - 1, above] = WHITE
+            rewards[top - 1, above] = CODE_REWARDS[WHITE]
+
+        else:
+            rooms_chunk(chunk, top, room_size, rng)
+
+        cells[rows] = chunk
+        rewards[rows] = CODE_REWARDS[chunk]
+
+    # The initial state is always open
+    if cells[initial_state[0], initial_state[1]] == WALL:
+        cells[initial_state[0], initial_state[1]] = WHITE
+        rewards[initial_state[0], initial_state[1]] = CODE_REWARDS[WHITE]
+
+    if prune:
+        prune_unreachable(cells, rewards, initial_state, moves, chunk_rows)
+
+    return cells, rewards
+
+
+def maze_chunk(chunk: np.ndarray, top: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Carves a binary tree maze into a chunk starting at an even row: open cells at even (row, col)
+    connect either up or left, odd rows and columns are walls otherwise
+
+    Returns:
+        Columns of passages up into the row above the chunk
+    """
+    rows: np.ndarray = np.arange(top, top + chunk.shape[0])[:, None]
+    cols: np.ndarray = np.arange(chunk.shape[1])[None, :]
+    is_wall: np.ndarray = (rows % 2 == 1) | (cols % 2 == 1)
+
+    # Every room (even row and column) opens the wall above or to its left, along the top row and left column only one is possible
+    room_rows, room_cols = np.arange(top, top + chunk.shape[0], 2), np.arange(0, chunk.shape[1], 2)
+    up: np.ndarray = rng.random((len(room_rows), len(room_cols))) < 0.5
+    up[:, 0] = True
+    up[room_rows == 0, :] = False
+
+    r, c = np.nonzero(~up & (room_cols > 0)[None, :])
+    is_wall[room_rows[r] - top, room_cols[c] - 1] = False
+    r, c = np.nonzero(up)
+    inside: np.ndarray = r > 0
+    is_wall[room_rows[r[inside]] - 1 - top, room_cols[c[inside]]] = False
+
+    chunk[is_wall] = WALL
+    return room_cols[c[~inside]]
+
+
+def rooms_chunk(chunk: np.ndarray, top: int, room_size: int, rng: np.random.Generator) -> None:
+    """
+    Adds the walls of room_size x room_size rooms to a chunk starting at a room boundary,
+    with one door in every wall between two rooms
+    """
+    height, width = chunk.shape
+    wall_rows: np.ndarray = np.arange(room_size - 1, height, room_size)
+    wall_cols: np.ndarray = np.arange(room_size - 1, width, room_size)
+    chunk[wall_rows, :] = WALL
+    chunk[:, wall_cols] = WALL
+
+    # Doors in horizontal walls, one per room column, and in vertical walls, one per room row
+    segments: np.ndarray = np.arange(0, width, room_size)
+    doors: np.ndarray = segments + rng.integers(0, room_size - 1, size=(len(wall_rows), len(segments)))
+    valid: np.ndarray = doors < width
+    chunk[np.broadcast_to(wall_rows[:, None], doors.shape)[valid], doors[valid]] = WHITE
+
+    segments = np.arange(0, height, room_size)
+    doors = segments[:, None] + rng.integers(0, room_size - 1, size=(len(segments), len(wall_cols)))
+    valid = doors < height
+    chunk[doors[valid], np.broadcast_to(wall_cols[None, :], doors.shape)[valid]] = WHITE
+
+
+def prune_unreachable(cells: np.ndarray, rewards: np.ndarray, initial_state: Tuple, moves: Optional[Iterable[Tuple]] = None,
+                      chunk_rows: int = 1024) -> int:
+    """
+    Turns open cells that cannot be reached from the initial state into walls. Components are labelled in bands of
+    chunk_rows rows and joined across band borders with a union-find over the labels of the border rows, so memory
+    stays bounded by one band of labels however large the grid is.
+
+    Args:
+        moves (Iterable[Tuple]): Moves of the action set, diagonal moves connect diagonal neighbours (optional, default = 4 directions)
+
+    Returns:
+        Number of pruned cells
+    """
+    from scipy.ndimage import label
+
+    # Cells are connected along every move of the action set and its reverse
+    structure: np.ndarray = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]], dtype=bool)
+    if moves is not None:
+        structure = np.zeros((3, 3), dtype=bool)
+        structure[1, 1] = True
+        for row, col in moves:
+            structure[1 + row, 1 + col] = structure[1 - row, 1 - col] = True
+
+    height, width = cells.shape
+    bands: List[slice] = [slice(top, min(top + chunk_rows, height)) for top in range(0, height, chunk_rows)]
+
+    # Parent of every border label that was joined, labels are made global by the label count of the bands above
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        root: int = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    # First pass: label every band and join its first row with the last row of the band above
+    offsets: List[int] = []
+    offset: int = 0
+    last_row: Optional[np.ndarray] = None
+    for rows in bands:
+        components, n = label(cells[rows] != WALL, structure=structure)
+        first_row: np.ndarray = np.where(components[0] > 0, components[0].astype(np.int64) + offset, 0)
+
+        if last_row is not None:
+            for shift in (-1, 0, 1):
+                if structure[0, 1 + shift]:
+                    above: np.ndarray = last_row[max(shift, 0):width + min(shift, 0)]
+                    below: np.ndarray = first_row[max(-shift, 0):width + min(-shift, 0)]
+                    joined: np.ndarray = (above > 0) & (below > 0)
+                    for a, b in np.unique(np.stack([above[joined], below[joined]], axis=1), axis=0).tolist():
+                        root_a, root_b = find(a), find(b)
+                        if root_a != root_b:
+                            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        last_row = np.where(components[-1] > 0, components[-1].astype(np.int64) + offset, 0)
+        offsets.append(offset)
+        offset += n
+
+    # The initial state's band is labelled again to find its component
+    band: int = initial_state[0] // chunk_rows
+    components, _ = label(cells[bands[band]] != WALL, structure=structure)
+    reachable: int = find(int(components[initial_state[0] - bands[band].start, initial_state[1]]) + offsets[band])
+
+    # Second pass: label every band again and wall off the labels of other components
+    pruned: int = 0
+    for rows, offset in zip(bands, offsets):
+        components, n = label(cells[rows] != WALL, structure=structure)
+        keep: np.ndarray = np.zeros(n + 1, dtype=bool)
+        if offset < reachable <= offset + n:
+            keep[reachable - offset] = True
+        for x in [x for x in parent if offset < x <= offset + n]:
+            keep[x - offset] = find(x) == reachable
+
+        unreachable: np.ndarray = ~keep[components] & (cells[rows] != WALL)
+        cells[rows][unreachable] = WALL
+        rewards[rows][unreachable] = CODE_REWARDS[WALL]
+        pruned += int(unreachable.sum())
+
+    return pruned
@@ -1,11 +1,25 @@
 import pandas as pd
 
+from models.recorder import RECORDERS, Recorder
+
 
 class DataAnalysisManager:
     def __init__(self, algorithm: str, output: str):
         self.algorithm = algorithm
         self.output = output
+        self.path = f'docs/analysis/{self.algorithm}_{self.output}.csv'
+
+    def recorder(self, mode: str) -> Recorder:
+        """
+        Recorder streaming convergence telemetry of a solver to this analysis CSV
+
+        Args:
+            mode (str): off | summary | sampled | history
+        """
+        if mode == "off":
+            return Recorder()
+        return RECORDERS[mode](path=self.path)
 
     def save(self, data: dict):
         dataframe = pd.DataFrame.from_dict(data) 
-        dataframe.to_csv(f'docs/analysis/{self.algorithm}_{self.output}.csv', index=None)
\ No newline at end of file
+        dataframe.to_csv(self.path, index=None)
@@ -1,9 +1,40 @@
+import os
+from enum import Enum
 from typing import *
-import pygame
+
+import numpy as np
+
 from config import (POLICY_FONT, POLICY_FONT_SIZE, POLICY_OFFSET, UTILITY_FONT,
                     UTILITY_FONT_SIZE, UTILITY_OFFSET, block_size)
+from manager.grid_store import load_result, policy_indices, read_arrays
+from models.environment import Environment
+
+# pygame is imported on first render, so solver-only runs never pay its startup cost
+pygame = None
+
+
+def cell_types(grid) -> np.ndarray:
+    """
+    Cell types of a grid as a string array, decoding grids of uint8 cell codes
+    """
+    cells: np.ndarray = np.asarray(grid)
+    return np.array(Environment.CELL_TYPES)[cells] if cells.dtype == np.uint8 else cells
+
+
+def wall_mask(cells: np.ndarray) -> np.ndarray:
+    """
+    Walls of a block of cells, uint8 cell codes or cell type strings
+    """
+    return cells == Environment.WALL_CODE if cells.dtype == np.uint8 else cells == 'W'
+
 
-pygame.init()
+def load_pygame():
+    global pygame
+    if pygame is None:
+        import pygame as module
+        module.font.init()
+        pygame = module
+    return pygame
 
 
 class DisplayManager(object):
@@ -16,28 +47,49 @@ class DisplayManager(object):
 
     RATIO = 1
 
-    def __init__(self, height: int, width: int, output: str) -> None:
+    # Fonts by (name, size), shared by all display managers
+    FONTS: Dict[Tuple[str, int], Any] = {}
+
+    def __init__(self, height: int, width: int, output: str, headless: Optional[bool] = False) -> None:
+        """
+        Args:
+            height (int): Number of rows in grid
+            width (int): Number of columns in grid
+            output (str): Suffix of the saved image files
+            headless (bool): Only save images, without opening a window (optional, default = False)
+        """
         super().__init__()
         self.block_size = block_size
         self.width = block_size * width
         self.height = block_size * height
         self.screen_dimensions = (self.width, self.height)
         self.output = output
+        self.headless = headless
 
-    def get_colors_for_grid(self, grid):
-        colors = []
-        for row in grid:
-            color = []
-            for cell in row:
-                if cell == 'W':
-                    color.append(DisplayManager.GREY)
-                elif cell == 'G':
-                    color.append(DisplayManager.GREEN)
-                elif cell == 'R':
-                    color.append(DisplayManager.RED)
-                else:
-                    color.append(DisplayManager.WHITE)
-            colors.append(color)
+        self.colors: Optional[np.ndarray] = None
+        self.colors_grid: Any = None
+
+    @staticmethod
+    def get_font(name: str, size: int):
+        if (name, size) not in DisplayManager.FONTS:
+            DisplayManager.FONTS[(name, size)] = load_pygame().font.SysFont(name, size)
+        return DisplayManager.FONTS[(name, size)]
+
+    def get_colors_for_grid(self, grid) -> np.ndarray:
+        """
+        Cell colours of the grid as a (height, width, 3) array, cached for the last grid
+        """
+        if self.colors is not None and self.colors_grid is grid:
+            return self.colors
+
+        cells: np.ndarray = cell_types(grid)
+        colors: np.ndarray = np.empty(cells.shape + (3,), dtype=np.uint8)
+        colors[...] = DisplayManager.WHITE
+        colors[cells == 'W'] = DisplayManager.GREY
+        colors[cells == 'G'] = DisplayManager.GREEN
+        colors[cells == 'R'] = DisplayManager.RED
+
+        self.colors, self.colors_grid = colors, grid
         return colors
 
     def display(self, result: dict):
@@ -45,22 +97,73 @@ class DisplayManager(object):
 
         # Display utilities
         utilities = [["{:.3f}".format(cell) for cell in row] for row in result['utilities']]
-        self.generate(array=utilities, grid=result["grid"], offset=UTILITY_OFFSET, font=pygame.font.SysFont(UTILITY_FONT, UTILITY_FONT_SIZE),
+        self.generate(array=utilities, grid=result["grid"], offset=UTILITY_OFFSET, font=self.get_font(UTILITY_FONT, UTILITY_FONT_SIZE),
                       title=f'{algorithm} Utilities', save=True, file_name=f'docs/{algorithm}_utilities_{self.output}.png')
 
         # Display policies
-        CONVERT_POLICY_TUPLE = {(1, 0): '↓', (-1, 0): '↑', (0, 1): '→', (0, -1): '←'}
-        directions = [[CONVERT_POLICY_TUPLE[cell.value] if cell else cell 
+        CONVERT_POLICY_TUPLE = {(1, 0): '↓', (-1, 0): '↑', (0, 1): '→', (0, -1): '←',
+                                (-1, 1): '↗', (1, 1): '↘', (1, -1): '↙', (-1, -1): '↖', (0, 0): '•'}
+        directions = [[CONVERT_POLICY_TUPLE[cell.value] if cell else cell
                         for cell in row] for row in result['policy']]
-        self.generate(array=directions, grid=result["grid"], offset=POLICY_OFFSET, font=pygame.font.SysFont(POLICY_FONT, POLICY_FONT_SIZE),
+        self.generate(array=directions, grid=result["grid"], offset=POLICY_OFFSET, font=self.get_font(POLICY_FONT, POLICY_FONT_SIZE),
                       title=f'{algorithm} Policy', save=True, file_name=f'docs/{algorithm}_policy_{self.output}.png')
 
-    def generate(self, array, grid, offset: Tuple, font: pygame.font.Font, title: str = 'Plot', 
+    def render(self, array, grid, offset: Tuple, font):
+        """
+        Draws the grid and the text of every cell once to an off-screen surface
+
+        Args:
+            array: Text of every cell
+            grid: Grid world cells
+            offset (Tuple): Offset of the text within a cell
+            font (pygame.font.Font): Font of the text
+
+        Returns:
+            pygame.Surface: Rendered image
+        """
+        load_pygame()
+
+        # Cell colours scaled up to blocks, with a 1 pixel black border around every cell
+        pixels: np.ndarray = np.repeat(np.repeat(self.get_colors_for_grid(grid), self.block_size, axis=0), self.block_size, axis=1)
+        border: np.ndarray = np.isin(np.arange(self.block_size), (0, self.block_size - 1))
+        pixels[np.tile(border, len(grid)), :] = 0
+        pixels[:, np.tile(border, len(grid[0]))] = 0
+        surface = pygame.surfarray.make_surface(pixels.transpose(1, 0, 2))
+
+        # Render every distinct text once
+        glyphs: Dict[str, Any] = {}
+        cells: np.ndarray = cell_types(grid)
+        for row, col in zip(*np.nonzero(cells != 'W')):
+            text: str = array[row][col]
+            if text not in glyphs:
+                glyphs[text] = font.render(text, True, (0, 0, 0))
+            surface.blit(glyphs[text], (col * self.block_size + offset[0] * DisplayManager.RATIO,
+                                        row * self.block_size + offset[1] * DisplayManager.RATIO))
+
+        return surface
+
+    def to_array(self, surface) -> np.ndarray:
+        """
+        Pixels of a rendered surface as a (height, width, 3) uint8 array
+        """
+        return load_pygame().surfarray.array3d(surface).transpose(1, 0, 2)
+
+    def generate(self, array, grid, offset: Tuple, font, title: str = 'Plot',
                     save: bool = False, file_name: str = 'image.png'):
+        surface = self.render(array=array, grid=grid, offset=offset, font=font)
+
+        if save:
+            pygame.image.save(surface, file_name)
+
+        if self.headless:
+            return surface
+
+        pygame.display.init()
         screen = pygame.display.set_mode(self.screen_dimensions)
         pygame.display.set_caption(title)
+        screen.blit(surface, (0, 0))
+        pygame.display.update()
 
-        colors = self.get_colors_for_grid(grid=grid)
         running = True
         while running:
 
@@ -68,22 +171,278 @@ class DisplayManager(object):
                 if event.type == pygame.QUIT:
                     running = False
 
-            rect = pygame.Rect(0, 0, self.width, self.height)
-            pygame.draw.rect(screen, DisplayManager.SCREEN_COLOR, rect)
+            pygame.time.wait(50)
+
+        return surface
+
+
+class TileRenderer(object):
+
+    # Colour map of utilities, from red at the lowest over white to green at the highest
+    COLORMAP: np.ndarray = np.stack([np.interp(np.linspace(0, 1, 256), (0, 0.5, 1), channel)
+                                     for channel in zip(DisplayManager.RED, DisplayManager.WHITE, DisplayManager.GREEN)], axis=1).astype(np.uint8)
+
+    # Smallest cell sizes in pixels with borders and arrows, and with utility texts
+    ARROW_SIZE = 8
+    TEXT_SIZE = 64
+
+    # Utilities averaged per pixel along each axis once a pixel covers several cells
+    SAMPLES = 4
+
+    # Arrow glyph masks by (cell size, with text, action vectors), shared by all renderers
+    ATLASES: Dict[Tuple[int, bool, Tuple], np.ndarray] = {}
+
+    def __init__(self, grid, utilities, policy_index, actions: Dict[str, Tuple[int, int]], output: str,
+                 tile_size: Optional[int] = 256, cell_size: Optional[int] = 64, value_range: Optional[Tuple[float, float]] = None) -> None:
+        """
+        Renders a result as a pyramid of square image tiles. Level 0 fits the whole grid in one tile and every
+        further level doubles the resolution, up to cell_size pixels per cell at the last level. Every tile is
+        rendered on its own from slices of the arrays, so memory mapped results of any size only read the cells
+        of the requested tiles.
+
+        Args:
+            grid: Grid world cells, uint8 codes or cell types
+            utilities: (height, width) utilities
+            policy_index: (height, width) int8 action indices, -1 for walls
+            actions (Dict[str, Tuple[int, int]]): Action vectors in the order of the policy indices
+            output (str): Directory of the tiles
+            tile_size (int): Side of a tile in pixels (optional, default = 256)
+            cell_size (int): Side of a cell in pixels at the last level, a power of 2 (optional, default = 64)
+            value_range (Tuple[float, float]): Utilities at the ends of the colour map (optional, default = lowest and highest utility)
+        """
+        super().__init__()
+        assert cell_size & (cell_size - 1) == 0, f"cell_size must be a power of 2, not {cell_size}"
+        self.cells = np.asarray(grid)
+        self.utilities = utilities
+        self.policy_index = policy_index
+        self.actions = actions
+        self.output = output
+        self.tile_size = tile_size
+        self.cell_size = cell_size
+        self.height, self.width = self.cells.shape
+
+        self.levels: int = max(int(np.ceil(np.log2(max(self.height, self.width) * cell_size / tile_size))), 0) + 1
+        self.value_range: Tuple[float, float] = value_range if value_range is not None else self.utility_range()
+
+    @classmethod
+    def from_result(cls, result: dict, actions: Enum, output: str, **kwargs) -> "TileRenderer":
+        """
+        Renderer of a solver result with "grid", "utilities" and "policy"
+        """
+        return cls(result["grid"], np.asarray(result["utilities"], dtype=np.float64), policy_indices(result["policy"], actions),
+                   {action.name: action.value for action in actions}, output, **kwargs)
+
+    @classmethod
+    def from_files(cls, grid_path: str, result_path: str, output: str, **kwargs) -> "TileRenderer":
+        """
+        Renderer of a grid store environment and result, both stay memory mapped
+        """
+        _, _, arrays = read_arrays(grid_path)
+        result: dict = load_result(result_path)
+        return cls(arrays["cells"], result["utilities"], result["policy_index"], result["actions"], output, **kwargs)
+
+    def utility_range(self) -> Tuple[float, float]:
+        """
+        Lowest and highest utility of the open cells, read in chunks of rows
+        """
+        low, high = np.inf, -np.inf
+        rows: int = max(2 ** 20 // self.width, 1)
+        for start in range(0, self.height, rows):
+            values: np.ndarray = np.asarray(self.utilities[start:start + rows])[~wall_mask(np.asarray(self.cells[start:start + rows]))]
+            values = values[np.isfinite(values)]
+            if values.size:
+                low, high = min(low, float(values.min())), max(high, float(values.max()))
+        return (low, high) if low <= high else (0.0, 1.0)
+
+    def scale(self, level: int) -> Tuple[int, int]:
+        """
+        Pixels per cell and cells per pixel at a level, at least one of them is 1
+        """
+        shift: int = self.levels - 1 - level
+        return max(self.cell_size >> shift, 1), max((1 << shift) // self.cell_size, 1)
+
+    def tile_counts(self, level: int) -> Tuple[int, int]:
+        """
+        Rows and columns of tiles at a level
+        """
+        pixels, cells = self.scale(level)
+        height, width = -(-self.height * pixels // cells), -(-self.width * pixels // cells)
+        return -(-height // self.tile_size), -(-width // self.tile_size)
+
+    def colormap(self, values: np.ndarray) -> np.ndarray:
+        low, high = self.value_range
+        scaled: np.ndarray = np.nan_to_num((values - low) / (high - low if high > low else 1.0) * 255)
+        return TileRenderer.COLORMAP[np.clip(scaled, 0, 255).astype(np.intp)]
+
+    @staticmethod
+    def glyph(font, text: str) -> np.ndarray:
+        """
+        Pixels of a rendered text as a (height, width) mask
+        """
+        surface = font.render(text, True, (0, 0, 0), (255, 255, 255))
+        return load_pygame().surfarray.array3d(surface)[..., 0].T < 128
+
+    @staticmethod
+    def arrow(vector: Tuple[int, int], size: int) -> np.ndarray:
+        """
+        Arrow along an action vector as a (size, size) mask, a dot for (0, 0). Drawn from the distance of every
+        pixel to the shaft and head segments, so it does not depend on the fonts installed.
+        """
+        y, x = np.mgrid[:size, :size] + 0.5
+        centre: np.ndarray = np.array([size / 2, size / 2])
+        width: float = max(size / 16, 0.75)
+        direction: np.ndarray = np.asarray(vector, dtype=np.float64)
+        if not direction.any():
+            return (y - centre[0]) ** 2 + (x - centre[1]) ** 2 <= (2 * width) ** 2
+
+        def segment(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+            along: np.ndarray = end - start
+            t: np.ndarray = np.clip(((y - start[0]) * along[0] + (x - start[1]) * along[1]) / (along @ along), 0, 1)
+            return (y - start[0] - t * along[0]) ** 2 + (x - start[1] - t * along[1]) ** 2 <= width ** 2
+
+        direction /= np.linalg.norm(direction)
+        tip: np.ndarray = centre + direction * size * 0.35
+        mask: np.ndarray = segment(centre - direction * size * 0.35, tip)
+        for sign in (1, -1):
+            barb: np.ndarray = np.array([-direction[0] - sign * direction[1], -direction[1] + sign * direction[0]]) / np.sqrt(2)
+            mask |= segment(tip, tip + barb * size * 0.2)
+        return mask
+
+    def atlas(self, pixels: int, text: bool) -> np.ndarray:
+        """
+        Arrow masks of every action for a cell size, followed by a blank mask for index -1.
+        With text the arrows are half size and centred in the lower half of the cell, below the utility.
+        """
+        key: Tuple = (pixels, text, tuple(tuple(vector) for vector in self.actions.values()))
+        if key not in TileRenderer.ATLASES:
+            atlas: np.ndarray = np.zeros((len(self.actions) + 1, pixels, pixels), dtype=bool)
+            for index, vector in enumerate(self.actions.values()):
+                if text:
+                    atlas[index, pixels // 2:pixels // 2 + pixels // 2, pixels // 4:pixels // 4 + pixels // 2] = self.arrow(vector, pixels // 2)
+                else:
+                    atlas[index] = self.arrow(vector, pixels)
+            TileRenderer.ATLASES[key] = atlas
+        return TileRenderer.ATLASES[key]
+
+    def draw_cells(self, tile: np.ndarray, top: int, left: int, pixels: int) -> None:
+        """
+        Draws the cells under a tile at pixels per cell: utility colours, borders and arrows, and utility texts at the largest sizes
+        """
+        rows: slice = slice(top // pixels, min(-(-(top + self.tile_size) // pixels), self.height))
+        cols: slice = slice(left // pixels, min(-(-(left + self.tile_size) // pixels), self.width))
+        if rows.start >= rows.stop or cols.start >= cols.stop:
+            return
+
+        walls: np.ndarray = wall_mask(np.asarray(self.cells[rows, cols]))
+        values: np.ndarray = np.asarray(self.utilities[rows, cols], dtype=np.float64)
+        colors: np.ndarray = self.colormap(values)
+        colors[walls] = DisplayManager.GREY
+        block: np.ndarray = np.repeat(np.repeat(colors, pixels, axis=0), pixels, axis=1)
+
+        if pixels >= TileRenderer.ARROW_SIZE:
+            # 1 pixel black border around every cell
+            border: np.ndarray = np.isin(np.arange(pixels), (0, pixels - 1))
+            block[np.tile(border, walls.shape[0]), :] = 0
+            block[:, np.tile(border, walls.shape[1])] = 0
+
+            # Arrow masks of all cells gathered from the atlas at once, index -1 selects the blank mask at its end
+            policy: np.ndarray = np.where(walls, -1, np.asarray(self.policy_index[rows, cols], dtype=np.intp))
+            masks: np.ndarray = self.atlas(pixels, pixels >= TileRenderer.TEXT_SIZE)[policy]
+            block[masks.transpose(0, 2, 1, 3).reshape(block.shape[:2])] = 0
+
+        if pixels >= TileRenderer.TEXT_SIZE:
+            font = DisplayManager.get_font(UTILITY_FONT, UTILITY_FONT_SIZE * pixels // block_size)
+            offset: Tuple[int, int] = (UTILITY_OFFSET[0] * pixels // block_size, UTILITY_OFFSET[1] * pixels // block_size)
+            for row, col in zip(*np.nonzero(~walls)):
+                mask: np.ndarray = self.glyph(font, "{:.3f}".format(values[row, col]))
+                height, width = min(mask.shape[0], pixels - offset[1]), min(mask.shape[1], pixels - offset[0])
+                y, x = row * pixels + offset[1], col * pixels + offset[0]
+                block[y:y + height, x:x + width][mask[:height, :width]] = 0
+
+        # Crop the cells to the tile
+        y, x = top - rows.start * pixels, left - cols.start * pixels
+        part: np.ndarray = block[y:y + self.tile_size, x:x + self.tile_size]
+        tile[:part.shape[0], :part.shape[1]] = part
+
+    def draw_heatmap(self, tile: np.ndarray, top: int, left: int, cells: int) -> None:
+        """
+        Draws a tile where every pixel covers cells x cells cells, coloured by the mean utility of up to SAMPLES x SAMPLES
+        open cells spread over it. Only the sampled cells are read, so the work is bounded by the tile size.
+        """
+        samples: int = min(cells, TileRenderer.SAMPLES)
+        offsets: np.ndarray = np.arange(samples) * cells // samples + cells // (2 * samples)
+        n_rows: int = int(np.clip(-(-self.height // cells) - top, 0, self.tile_size))
+        n_cols: int = int(np.clip(-(-self.width // cells) - left, 0, self.tile_size))
+        if not n_rows or not n_cols:
+            return
+
+        rows: np.ndarray = np.minimum(((top + np.arange(n_rows))[:, None] * cells + offsets).ravel(), self.height - 1)
+        cols: np.ndarray = np.minimum(((left + np.arange(n_cols))[:, None] * cells + offsets).ravel(), self.width - 1)
+        open_cells: np.ndarray = ~wall_mask(np.asarray(self.cells[np.ix_(rows, cols)]))
+        values: np.ndarray = np.where(open_cells, np.asarray(self.utilities[np.ix_(rows, cols)], dtype=np.float64), 0.0)
+
+        n_open: np.ndarray = open_cells.reshape(n_rows, samples, n_cols, samples).sum(axis=(1, 3))
+        means: np.ndarray = values.reshape(n_rows, samples, n_cols, samples).sum(axis=(1, 3)) / np.maximum(n_open, 1)
+        colors: np.ndarray = self.colormap(means)
+        colors[n_open == 0] = DisplayManager.GREY
+        tile[:n_rows, :n_cols] = colors
+
+    def render_tile(self, level: int, row: int, col: int) -> np.ndarray:
+        """
+        Renders one tile of the pyramid
+
+        Args:
+            level (int): Zoom level, 0 fits the whole grid in one tile
+            row (int): Row of the tile in the level
+            col (int): Column of the tile in the level
+
+        Returns:
+            (tile_size, tile_size, 3) uint8 pixels, black outside the grid
+        """
+        assert 0 <= level < self.levels, f"level {level} is not in 0..{self.levels - 1}"
+        tiles: Tuple[int, int] = self.tile_counts(level)
+        assert 0 <= row < tiles[0] and 0 <= col < tiles[1], f"tile ({row}, {col}) is not in level {level} of {tiles[0]}x{tiles[1]} tiles"
+
+        tile: np.ndarray = np.empty((self.tile_size, self.tile_size, 3), dtype=np.uint8)
+        tile[...] = DisplayManager.SCREEN_COLOR
+        pixels, cells = self.scale(level)
+        if cells > 1:
+            self.draw_heatmap(tile, row * self.tile_size, col * self.tile_size, cells)
+        else:
+            self.draw_cells(tile, row * self.tile_size, col * self.tile_size, pixels)
+        return tile
+
+    def save(self, tiles: Iterable[Tuple[int, int, int]]) -> List[str]:
+        """
+        Renders the requested tiles to {output}/{level}/{row}_{col}.png
+
+        Args:
+            tiles (Iterable[Tuple[int, int, int]]): (level, row, col) of every tile
 
-            for row in range(len(grid)):
-                for col in range(len(grid[0])):
-                    rect = pygame.Rect(col * self.block_size, row * self.block_size, self.block_size, self.block_size)
-                    pygame.draw.rect(screen, colors[row][col], rect)
-                    pygame.draw.rect(screen, (0, 0, 0), rect, 1)
+        Returns:
+            Paths of the saved tiles
+        """
+        load_pygame()
+        paths: List[str] = []
+        for level, row, col in tiles:
+            path: str = os.path.join(self.output, str(level), f"{row}_{col}.png")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pygame.image.save(pygame.surfarray.make_surface(self.render_tile(level, row, col).transpose(1, 0, 2)), path)
+            paths.append(path)
+        return paths
 
-                    if grid[row][col] == 'W':
-                        continue
-                    message = font.render(array[row][col], True, (0, 0, 0))
-                    screen.blit(message, (col * self.block_size + offset[0] * DisplayManager.RATIO, 
-                                    row * self.block_size + offset[1] * DisplayManager.RATIO))
+    def save_levels(self, levels: Optional[Iterable[int]] = None, max_tiles: Optional[int] = 64) -> List[str]:
+        """
+        Renders every tile of the given levels
 
-            pygame.display.update()
+        Args:
+            levels (Iterable[int]): Levels to render (optional, default = every level of at most max_tiles tiles)
+            max_tiles (int): Most tiles of a default level (optional, default = 64)
 
-            if save:
-                pygame.image.save(screen, file_name)
+        Returns:
+            Paths of the saved tiles
+        """
+        if levels is None:
+            levels = [level for level in range(self.levels) if np.prod(self.tile_counts(level)) <= max_tiles]
+        return self.save((level, row, col) for level in levels
+                         for row in range(self.tile_counts(level)[0]) for col in range(self.tile_counts(level)[1]))
@@ -0,0 +1,211 @@
+import json
+import os
+import struct
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from models.environment import Environment
+
+# File layout: MAGIC, version (uint16), header length (uint32), JSON header, then every array
+# as raw C-order bytes at the offset recorded in the header, aligned for memory mapping
+MAGIC = b"GRIDMDP\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct("<8sHI")
+
+# Cell types stored as uint8 codes
+CELL_TYPES: List[str] = Environment.CELL_TYPES
+CELL_CODES: Dict[str, int] = {cell: code for code, cell in enumerate(CELL_TYPES)}
+
+
+def allocate_arrays(path: str, kind: str, specs: Dict[str, Tuple[Tuple, Any]], meta: Optional[dict] = None) -> Dict[str, np.ndarray]:
+    """
+    Creates a file for write_arrays' layout and maps its arrays for writing, so arrays
+    larger than memory can be filled in chunks
+
+    Args:
+        path (str): File to create
+        kind (str): Content of the file, "environment" or "result"
+        specs (Dict[str, Tuple[Tuple, Any]]): Shape and dtype of every array
+        meta (dict): JSON serializable metadata (optional, default = None)
+
+    Returns:
+        Writable memory mapped arrays, zero-filled
+    """
+    specs = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in specs.items()}
+
+    # Offsets depend on the header length, so lay the arrays out until the header fits
+    header_size: int = 0
+    while True:
+        offset: int = -(-(PREAMBLE.size + header_size) // ALIGNMENT) * ALIGNMENT
+        layout: Dict[str, dict] = {}
+        for name, (shape, dtype) in specs.items():
+            layout[name] = {"dtype": dtype.str, "shape": list(shape), "offset": offset}
+            offset += -(-int(np.prod(shape, dtype=np.int64)) * dtype.itemsize // ALIGNMENT) * ALIGNMENT
+
+        header: bytes = json.dumps({"kind": kind, "meta": meta or {}, "arrays": layout}).encode()
+        if len(header) <= header_size:
+            break
+        header_size = len(header) + 16
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_size))
+        file.write(header.ljust(header_size))
+        file.truncate(max(offset, PREAMBLE.size + header_size))
+
+    return {name: np.memmap(path, dtype=dtype, mode="r+", offset=layout[name]["offset"], shape=shape)
+            if np.prod(shape, dtype=np.int64) else np.empty(shape, dtype=dtype) for name, (shape, dtype) in specs.items()}
+
+
+def write_arrays(path: str, kind: str, arrays: Dict[str, np.ndarray], meta: Optional[dict] = None) -> None:
+    """
+    Writes named arrays and JSON metadata to one file that can be memory mapped
+
+    Args:
+        path (str): File to write
+        kind (str): Content of the file, "environment" or "result"
+        arrays (Dict[str, np.ndarray]): Arrays to store
+        meta (dict): JSON serializable metadata (optional, default = None)
+    """
+    arrays = {name: np.asarray(array) for name, array in arrays.items()}
+    mapped: Dict[str, np.ndarray] = allocate_arrays(path, kind, {name: (array.shape, array.dtype) for name, array in arrays.items()}, meta)
+    for name, array in arrays.items():
+        mapped[name][...] = array
+        if isinstance(mapped[name], np.memmap):
+            mapped[name].flush()
+
+
+def read_arrays(path: str, mode: Optional[str] = "r") -> Tuple[str, dict, Dict[str, np.ndarray]]:
+    """
+    Opens a file written by write_arrays, memory mapping every array without reading it
+
+    Args:
+        path (str): File to open
+        mode (str): np.memmap mode, "r" read-only or "c" copy-on-write (optional, default = "r")
+
+    Returns:
+        Kind of file, metadata and the memory mapped arrays
+    """
+    with open(path, "rb") as file:
+        magic, version, header_size = PREAMBLE.unpack(file.read(PREAMBLE.size))
+        assert magic == MAGIC, f"{path} is not a grid store file"
+        assert version <= FORMAT_VERSION, f"{path} has format version {version}, newest supported is {FORMAT_VERSION}"
+        header: dict = json.loads(file.read(header_size))
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, entry in header["arrays"].items():
+        shape: Tuple = tuple(entry["shape"])
+        if np.prod(shape, dtype=np.int64) == 0:
+            arrays[name] = np.empty(shape, dtype=np.dtype(entry["dtype"]))
+        else:
+            arrays[name] = np.memmap(path, dtype=np.dtype(entry["dtype"]), mode=mode, offset=entry["offset"], shape=shape)
+
+    return header["kind"], header["meta"], arrays
+
+
+def encode_cells(grid: List[List]) -> np.ndarray:
+    cells: np.ndarray = np.asarray(grid)
+    if cells.dtype == np.uint8:
+        return cells
+    codes: np.ndarray = np.zeros(cells.shape, dtype=np.uint8)
+    for cell, code in CELL_CODES.items():
+        codes[cells == cell] = code
+    return codes
+
+
+def decode_cells(codes: np.ndarray) -> np.ndarray:
+    return np.array(CELL_TYPES)[codes]
+
+
+def save_environment(path: str, env: Environment, reward_dtype: Optional[type] = np.float64) -> None:
+    """
+    Saves the cells, rewards, initial state, slip model and terminal states of an environment
+
+    Args:
+        path (str): File to write
+        env (Environment): Environment to save
+        reward_dtype (type): np.float32 or np.float64 (optional, default = np.float64)
+    """
+    arrays: Dict[str, np.ndarray] = {"cells": encode_cells(env.grid_world),
+                                     "rewards": np.asarray(env.rewards, dtype=reward_dtype)}
+    if env.terminals:
+        arrays["terminals"] = env.terminal_mask().astype(np.uint8)
+
+    write_arrays(path, "environment", arrays, {"initial_state": list(env.agent_pos), "slip": env.slip})
+
+
+def load_environment(path: str, seed: Optional[int] = None) -> Environment:
+    """
+    Loads an environment saved with save_environment. Cell codes and rewards stay memory mapped
+    copy-on-write, so nothing is read up front and changing them never modifies the file.
+
+    Args:
+        path (str): File to open
+        seed (int): Seed of the environment's step function (optional, default = None)
+
+    Returns:
+        Environment: Loaded environment
+    """
+    kind, meta, arrays = read_arrays(path, mode="c")
+    assert kind == "environment", f"{path} holds a {kind}, not an environment"
+
+    terminals: Optional[List] = np.argwhere(arrays["terminals"]).tolist() if "terminals" in arrays else None
+    return Environment(grid_world=arrays["cells"], rewards=arrays["rewards"],
+                       initial_state=tuple(meta["initial_state"]), seed=seed, slip=meta["slip"], terminals=terminals)
+
+
+def policy_indices(policy: List[List], actions: Enum, terminal: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Policy grid of ACTIONS members as int8 indices into the actions, -1 for walls.
+    Solvers give terminal states an action too, pass the terminal mask to set them to -1 as well.
+    """
+    names: List[str] = [action.name for action in actions]
+    indices: np.ndarray = np.array([[names.index(action.name) if action is not None else -1 for action in row] for row in policy], dtype=np.int8)
+    if terminal is not None:
+        indices.reshape(np.shape(terminal))[np.asarray(terminal, dtype=bool)] = -1
+    return indices
+
+
+def save_result(path: str, result: dict, actions: Enum, info: Optional[dict] = None) -> None:
+    """
+    Saves the utilities and policy of a solver result, the policy as int8 action indices (-1 for walls)
+
+    Args:
+        path (str): File to write
+        result (dict): Solver result with "utilities" and "policy" grids
+        actions (Enum): ACTIONS of the agent that produced the result
+        info (dict): JSON serializable data stored with the result (optional, default = None)
+    """
+    members: List = list(actions)
+    policy: np.ndarray = policy_indices(result["policy"], actions).reshape(np.shape(result["utilities"]))
+
+    meta: dict = {"algorithm": result.get("algorithm"), "iterations": int(result.get("iterations", 0)),
+                  "actions": {action.name: list(action.value) for action in members}, "info": info or {}}
+    write_arrays(path, "result", {"utilities": np.asarray(result["utilities"], dtype=np.float64), "policy": policy}, meta)
+
+
+def load_result(path: str, actions: Optional[Enum] = None) -> dict:
+    """
+    Loads a result saved with save_result, with memory mapped utilities and int8 policy
+
+    Args:
+        path (str): File to open
+        actions (Enum): ACTIONS to decode the policy into a grid with (optional, default = None skips decoding)
+
+    Returns:
+        Result with "utilities", "policy_index", "actions", "info" and, if actions is given, a "policy" grid
+    """
+    kind, meta, arrays = read_arrays(path)
+    assert kind == "result", f"{path} holds a {kind}, not a result"
+
+    result: dict = {"utilities": arrays["utilities"], "policy_index": arrays["policy"], "algorithm": meta["algorithm"],
+                    "iterations": meta["iterations"], "actions": {name: tuple(value) for name, value in meta["actions"].items()},
+                    "info": meta.get("info", {})}
+    if actions is not None:
+        members: List = [actions[name] for name in meta["actions"]]
+        result["policy"] = [[members[a] if a >= 0 else None for a in row] for row in arrays["policy"].tolist()]
+
+    return result
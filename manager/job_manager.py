@@ -0,0 +1,483 @@
+import asyncio
+import itertools
+import json
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+import numpy as np
+
+from algos.modified_policy_iteration import ModifiedPolicyIteration
+from algos.policy_iteration import PolicyIteration
+from algos.q_learning import QLearning
+from algos.sarsa import Sarsa
+from algos.tiled_value_iteration import TiledValueIteration
+from algos.value_iteration import ValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import SEED, action_sets
+from manager.cache_manager import CacheManager
+from models.agent import Agent
+from models.environment import Environment
+from models.recorder import Recorder
+
+# Solver factories taking (actions, epsilon, gamma, recorder)
+JOB_SOLVERS: Dict[str, Callable] = {
+    "value_iteration": lambda actions, epsilon, gamma, recorder: ValueIteration(actions, epsilon, gamma, recorder=recorder),
+    "vectorized_value_iteration": lambda actions, epsilon, gamma, recorder: VectorizedValueIteration(actions, epsilon, gamma, recorder=recorder),
+    "tiled_value_iteration": lambda actions, epsilon, gamma, recorder: TiledValueIteration(actions, epsilon, gamma, workers=1, recorder=recorder),
+    "policy_iteration": lambda actions, epsilon, gamma, recorder: PolicyIteration(actions, gamma=gamma, evaluation="auto", recorder=recorder),
+    "modified_policy_iteration": lambda actions, epsilon, gamma, recorder: ModifiedPolicyIteration(actions, epsilon, gamma, recorder=recorder),
+    "q_learning": lambda actions, epsilon, gamma, recorder: QLearning(actions, gamma=gamma, episodes=20000, horizon=100, n_envs=256, seed=SEED, recorder=recorder),
+    "sarsa": lambda actions, epsilon, gamma, recorder: Sarsa(actions, gamma=gamma, episodes=20000, horizon=100, n_envs=256, seed=SEED, recorder=recorder),
+}
+
+# Job states, the last three are final
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a worker process to stop a solver whose job was cancelled
+    """
+
+
+class ProgressRecorder(Recorder):
+    """
+    Sends per-sweep progress of a solver running in a worker process back to the job manager,
+    and stops the solver once its job is cancelled
+    """
+
+    def __init__(self, job_id: str, events: Any, cancelled: Any, interval: float = 0.05):
+        """
+        Args:
+            job_id (str): Job of the solver
+            events (Queue): Queue of (job id, event) shared with the job manager
+            cancelled (dict): Shared dict of cancelled job ids
+            interval (float): Smallest time in seconds between two progress events (optional, default = 0.05)
+        """
+        self.job_id = job_id
+        self.events = events
+        self.cancelled = cancelled
+        self.interval = interval
+        self.iteration: int = 0
+        self.last: float = 0.0
+        self.samples: Optional[int] = None
+
+    def start(self, model) -> None:
+        self.iteration = 0
+        self.last = 0.0
+
+    def progress(self, samples: int, mean_return: float) -> None:
+        self.samples = samples
+
+    def record(self, utilities: np.ndarray, delta: float) -> None:
+        self.iteration += 1
+
+        # Progress events and cancellation checks are throttled, both cost a round trip to the manager process
+        now: float = time.perf_counter()
+        if now - self.last < self.interval:
+            return
+        self.last = now
+
+        if self.job_id in self.cancelled:
+            raise JobCancelled(self.job_id)
+        event: dict = {"event": "progress", "iteration": self.iteration, "delta": float(delta)}
+        if self.samples is not None:
+            event["samples"] = self.samples
+        self.events.put((self.job_id, event))
+
+
+def build_agent(spec: dict, recorder: Optional[Recorder] = None) -> Agent:
+    """
+    Creates the solver of a job spec: {"algorithm", "actions", "epsilon", "gamma"}
+    """
+    return JOB_SOLVERS[spec.get("algorithm", "vectorized_value_iteration")](
+        action_sets[spec.get("actions", "4")], spec.get("epsilon", 0.1), spec.get("gamma", 0.99), recorder if recorder is not None else Recorder())
+
+
+def run_job(job_id: str, spec: dict, env: Environment, events: Any, cancelled: Any) -> dict:
+    """
+    Solves one job in a worker process
+
+    Returns:
+        Result of the solver with the policy as a grid of action names, None for walls
+    """
+    agent: Agent = build_agent(spec, ProgressRecorder(job_id, events, cancelled))
+    result: dict = agent.solve(env)
+    result["policy"] = [[action.name if action is not None else None for action in row] for row in result["policy"]]
+    return result
+
+
+class Job:
+    """
+    Solver run submitted to the job manager, with every event it has produced so far
+    """
+
+    def __init__(self, job_id: str, key: str, spec: dict, env: Environment):
+        self.id = job_id
+        self.key = key
+        self.spec = spec
+        self.env = env
+        self.state: str = QUEUED
+        self.submitters: int = 1
+        self.events: List[dict] = [{"event": QUEUED}]
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.future: Optional[asyncio.Future] = None
+        self.changed: asyncio.Condition = asyncio.Condition()
+
+    async def publish(self, event: dict) -> None:
+        # Progress forwarded from a worker can arrive after the job ended
+        if self.events[-1]["event"] in FINAL_STATES:
+            return
+        self.events.append(event)
+        async with self.changed:
+            self.changed.notify_all()
+
+    def status(self) -> dict:
+        status: dict = {"job": self.id, "state": self.state, "algorithm": self.spec.get("algorithm"),
+                        "progress": next((event for event in reversed(self.events) if event["event"] == "progress"), None)}
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+
+class JobManager:
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = 64, max_finished: Optional[int] = 1024,
+                 finished_ttl: Optional[float] = 3600.0):
+        """
+        Runs solver jobs on a process pool behind an asyncio front end. Identical jobs in flight
+        are solved once, and submissions wait for room once max_pending jobs are queued.
+        Finished, failed and cancelled jobs are kept for their status and result until they
+        are older than finished_ttl or more than max_finished of them are kept.
+
+        Args:
+            workers (int): Worker processes (optional, default = cpu count)
+            max_pending (int): Queued jobs before submissions wait or are rejected (optional, default = 64)
+            max_finished (int): Jobs in a final state that are kept (optional, default = 1024)
+            finished_ttl (float): Seconds a job in a final state is kept, None keeps it until max_finished is reached (optional, default = 3600)
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.finished_ttl = finished_ttl
+        self.jobs: Dict[str, Job] = {}
+        self.in_flight: Dict[str, Job] = {}
+
+        # Jobs in a final state, oldest first: job id -> time the job ended
+        self.finished: OrderedDict = OrderedDict()
+        self.ids: Iterator[int] = itertools.count(1)
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+
+        # Spawned, not forked, processes: the event loop process runs threads
+        context = multiprocessing.get_context("spawn")
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+        # Worker processes reach the event queue and the cancelled set through a manager process
+        self.sync_manager = context.Manager()
+        self.events = self.sync_manager.Queue()
+        self.cancelled = self.sync_manager.dict()
+
+        self.tasks = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        self.reader = threading.Thread(target=self.read_events, args=(loop,), daemon=True)
+        self.reader.start()
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for job in list(self.in_flight.values()):
+            self.cancelled[job.id] = True
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.pool.shutdown(wait=True, cancel_futures=True))
+        self.events.put(None)
+        self.reader.join()
+        self.sync_manager.shutdown()
+
+    async def __aenter__(self) -> "JobManager":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def submit(self, env: Environment, spec: dict, wait: Optional[bool] = True) -> Tuple[str, bool]:
+        """
+        Submits a solver run, joining an identical job that is still queued or running
+
+        Args:
+            env (Environment): Environment to solve
+            spec (dict): Solver of the job: {"algorithm", "actions", "epsilon", "gamma"}, missing keys take defaults
+            wait (bool): Wait for room in a full queue, otherwise raise asyncio.QueueFull (optional, default = True)
+
+        Returns:
+            Job id and whether the job was already in flight
+        """
+        assert spec.get("algorithm", "vectorized_value_iteration") in JOB_SOLVERS, f"unknown algorithm {spec.get('algorithm')}"
+        key: str = CacheManager.environment_key(env, CacheManager.solver_key(build_agent(spec), env))
+
+        joined: Optional[Job] = self.in_flight.get(key)
+        if joined is not None and joined.id in self.jobs and joined.state not in FINAL_STATES:
+            joined.submitters += 1
+            return joined.id, True
+
+        job: Job = Job(f"job-{next(self.ids)}", key, spec, env)
+        if wait:
+            # Known before it is joinable, a duplicate submitted while this one waits for room gets a valid id
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            try:
+                await self.queue.put(job)
+            except BaseException:
+                # Submissions that joined meanwhile see the job end as cancelled, otherwise it is forgotten
+                self.in_flight.pop(key, None)
+                job.state, job.env = CANCELLED, None
+                await job.publish({"event": CANCELLED})
+                if job.submitters <= 1:
+                    del self.jobs[job.id]
+                else:
+                    self.finish(job)
+                raise
+        else:
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+
+        return job.id, False
+
+    async def dispatch(self) -> None:
+        """
+        Moves queued jobs to the process pool, one at a time per dispatcher
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            job: Job = await self.queue.get()
+            if job.state != QUEUED:
+                continue
+
+            job.state = RUNNING
+            await job.publish({"event": RUNNING})
+            job.future = loop.run_in_executor(self.pool, run_job, job.id, job.spec, job.env, self.events, self.cancelled)
+            try:
+                job.result = await job.future
+                job.state = DONE
+            except JobCancelled:
+                job.state = CANCELLED
+            except Exception as error:
+                job.state, job.error = FAILED, f"{type(error).__name__}: {error}"
+
+            self.cancelled.pop(job.id, None)
+            self.in_flight.pop(job.key, None)
+            job.env = None
+            await job.publish({"event": job.state, **({"error": job.error} if job.error else {})})
+            self.finish(job)
+
+    def finish(self, job: Job) -> None:
+        """
+        Keeps a job that reached a final state, evicting the oldest finished jobs beyond max_finished or finished_ttl
+        """
+        now: float = time.monotonic()
+        self.finished[job.id] = now
+        while self.finished:
+            job_id, ended = next(iter(self.finished.items()))
+            if len(self.finished) <= self.max_finished and (self.finished_ttl is None or now - ended < self.finished_ttl):
+                break
+            del self.finished[job_id]
+            self.jobs.pop(job_id, None)
+
+    def read_events(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Forwards progress events of the worker processes to the event loop, until a None sentinel
+        """
+        while True:
+            item: Optional[Tuple[str, dict]] = self.events.get()
+            if item is None:
+                return
+            job: Optional[Job] = self.jobs.get(item[0])
+            if job is not None and job.state == RUNNING:
+                asyncio.run_coroutine_threadsafe(job.publish(item[1]), loop)
+
+    async def cancel(self, job_id: str) -> str:
+        """
+        Withdraws one submission of a job, the job itself is cancelled once no submitter is left.
+        Queued jobs never start, running jobs stop at their next throttled progress check.
+
+        Returns:
+            State of the job after the call
+        """
+        job: Job = self.jobs[job_id]
+        if job.state in FINAL_STATES:
+            return job.state
+
+        job.submitters -= 1
+        if job.submitters > 0:
+            return job.state
+
+        if job.state == QUEUED:
+            job.state = CANCELLED
+            self.in_flight.pop(job.key, None)
+            job.env = None
+            await job.publish({"event": CANCELLED})
+            self.finish(job)
+        else:
+            self.cancelled[job.id] = True
+        return job.state
+
+    def status(self, job_id: str) -> dict:
+        return self.jobs[job_id].status()
+
+    async def stream(self, job_id: str) -> AsyncIterator[dict]:
+        """
+        Yields every event of a job from the start, waiting for new ones until the job ends
+        """
+        job: Job = self.jobs[job_id]
+        position: int = 0
+        while True:
+            async with job.changed:
+                await job.changed.wait_for(lambda: len(job.events) > position)
+            for event in job.events[position:]:
+                yield event
+            position = len(job.events)
+            if job.events[-1]["event"] in FINAL_STATES:
+                return
+
+    async def result(self, job_id: str) -> dict:
+        """
+        Waits for a job to end
+
+        Returns:
+            Result of the solver, policy as action names
+        """
+        job: Job = self.jobs[job_id]
+        async for _ in self.stream(job_id):
+            pass
+        assert job.state == DONE, f"{job_id} {job.state}" + (f": {job.error}" if job.error else "")
+        return job.result
+
+    def stats(self) -> dict:
+        states: List[str] = [job.state for job in self.jobs.values()]
+        return {"pending": self.queue.qsize(), "in_flight": len(self.in_flight), "workers": self.workers,
+                **{state: states.count(state) for state in (QUEUED, RUNNING) + FINAL_STATES}}
+
+
+class JobServer:
+    """
+    Minimal HTTP/1.1 front end of a job manager, built on asyncio streams:
+        POST /jobs               submit {"grid", "rewards", "initial_state", "slip", "terminals", "algorithm", "actions", "epsilon", "gamma"}
+        GET /jobs                manager stats
+        GET /jobs/<id>           job status, with the result once done
+        GET /jobs/<id>/events    stream of events as newline delimited JSON until the job ends
+        DELETE /jobs/<id>        cancel
+    """
+
+    REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+    def __init__(self, manager: JobManager, host: str = "127.0.0.1", port: int = 8080):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, _ = (await reader.readline()).decode().split(" ", 2)
+            headers: Dict[str, str] = {}
+            while (line := (await reader.readline()).decode().strip()):
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+            body: bytes = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            parts: List[str] = [part for part in path.split("?")[0].split("/") if part]
+            if parts[:1] != ["jobs"] or len(parts) > 3:
+                await self.respond(writer, 404, {"error": f"no route {path}"})
+            elif len(parts) == 1:
+                await self.jobs(writer, method, body)
+            elif parts[1] not in self.manager.jobs:
+                await self.respond(writer, 404, {"error": f"no job {parts[1]}"})
+            elif len(parts) == 3 and parts[2] == "events" and method == "GET":
+                await self.events(writer, parts[1])
+            elif len(parts) == 2 and method == "GET":
+                job: Job = self.manager.jobs[parts[1]]
+                await self.respond(writer, 200, {**job.status(), **({"result": job.result} if job.result is not None else {})})
+            elif len(parts) == 2 and method == "DELETE":
+                await self.respond(writer, 200, {"job": parts[1], "state": await self.manager.cancel(parts[1])})
+            else:
+                await self.respond(writer, 405, {"error": f"{method} {path} not allowed"})
+        except (ValueError, KeyError, AssertionError) as error:
+            await self.respond(writer, 400, {"error": f"{type(error).__name__}: {error}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def jobs(self, writer: asyncio.StreamWriter, method: str, body: bytes) -> None:
+        if method == "GET":
+            await self.respond(writer, 200, self.manager.stats())
+            return
+        if method != "POST":
+            await self.respond(writer, 405, {"error": f"{method} /jobs not allowed"})
+            return
+
+        request: dict = json.loads(body)
+        env: Environment = Environment(grid_world=request["grid"], rewards=request["rewards"],
+                                       initial_state=tuple(request.get("initial_state", (len(request["grid"]) - 1, 0))), seed=SEED,
+                                       slip=request.get("slip"), terminals=request.get("terminals"))
+        spec: dict = {name: request[name] for name in ("algorithm", "actions", "epsilon", "gamma") if name in request}
+        try:
+            job_id, deduplicated = await self.manager.submit(env, spec, wait=False)
+        except asyncio.QueueFull:
+            await self.respond(writer, 503, {"error": "job queue is full"})
+            return
+        await self.respond(writer, 202, {"job": job_id, "deduplicated": deduplicated})
+
+    async def events(self, writer: asyncio.StreamWriter, job_id: str) -> None:
+        # The job may be evicted once it ends, while its last events are still being written
+        job: Job = self.manager.jobs[job_id]
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+        async for event in self.manager.stream(job_id):
+            if event["event"] == DONE:
+                event = {**event, "result": job.result}
+            writer.write(to_json(event) + b"\n")
+            await writer.drain()
+
+    async def respond(self, writer: asyncio.StreamWriter, code: int, payload: dict) -> None:
+        body: bytes = to_json(payload)
+        writer.write(f"HTTP/1.1 {code} {self.REASONS[code]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+
+def to_json(payload: dict) -> bytes:
+    return json.dumps(payload, default=lambda value: value.tolist() if isinstance(value, (np.ndarray, np.generic)) else str(value)).encode()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080, workers: Optional[int] = None, max_pending: int = 64) -> None:
+    """
+    Runs a job server until cancelled
+    """
+    async with JobManager(workers, max_pending) as manager:
+        server: JobServer = JobServer(manager, host, port)
+        await server.start()
+        print(f"Serving solver jobs on http://{host}:{server.port}/jobs")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
@@ -0,0 +1,167 @@
+import threading
+from enum import Enum
+from typing import *
+
+import numpy as np
+
+from manager.grid_store import load_result, policy_indices
+from models.environment import Environment
+
+
+class PolicyTable:
+    """
+    Compiled policy of a solved grid for fast lookups: int8 action indices (-1 for walls and terminal states)
+    and utilities as flat arrays indexed by row * width + col. The arrays are read-only once built,
+    so a table can be queried from any number of threads without locking.
+    """
+
+    def __init__(self, policy: np.ndarray, utilities: np.ndarray, actions: Dict[str, Tuple[int, int]],
+                 terminal: Optional[np.ndarray] = None):
+        """
+        Args:
+            policy (np.ndarray): (height, width) action indices, -1 for walls
+            utilities (np.ndarray): (height, width) utilities
+            actions (Dict[str, Tuple[int, int]]): Action vectors in the order of the policy indices
+            terminal (np.ndarray): (height, width) terminal mask, whose actions are set to -1 (optional, default = None)
+        """
+        assert np.shape(policy) == np.shape(utilities), "policy and utilities must have the same shape"
+        self.height, self.width = np.shape(policy)
+        self.names: List[str] = list(actions)
+        self.policy: np.ndarray = np.ascontiguousarray(policy, dtype=np.int8).reshape(-1)
+        if terminal is not None:
+            # Copied, so a memory mapped policy is never written
+            assert np.shape(terminal) == np.shape(utilities), "terminal mask and utilities must have the same shape"
+            self.policy = np.where(np.asarray(terminal, dtype=bool).reshape(-1), np.int8(-1), self.policy)
+        self.utilities: np.ndarray = np.ascontiguousarray(utilities).reshape(-1)
+
+        # Action vectors followed by (0, 0), so index -1 looks up no move
+        self.vectors: np.ndarray = np.array([tuple(vector) for vector in actions.values()] + [(0, 0)], dtype=np.int64)
+
+        for array in (self.policy, self.utilities, self.vectors):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_result(cls, result: dict, actions: Enum, env: Environment, utility_dtype: Optional[type] = np.float64) -> "PolicyTable":
+        """
+        Compiles a solver result's "policy" grid of ACTIONS and "utilities"
+
+        Args:
+            result (dict): Solver result
+            actions (Enum): ACTIONS of the agent that produced the result
+            env (Environment): Solved environment, its terminal states get no action
+            utility_dtype (type): np.float32 or np.float64 (optional, default = np.float64)
+        """
+        utilities: np.ndarray = np.asarray(result["utilities"], dtype=utility_dtype)
+        terminal: np.ndarray = env.terminal_mask()
+        return cls(policy_indices(result["policy"], actions, terminal).reshape(utilities.shape), utilities,
+                   {action.name: action.value for action in actions})
+
+    @classmethod
+    def from_file(cls, path: str, env: Optional[Environment] = None) -> "PolicyTable":
+        """
+        Opens a result saved with save_result, the utilities stay memory mapped.
+        Saved policies give terminal states an action, pass the solved environment to clear them.
+        """
+        result: dict = load_result(path)
+        return cls(result["policy_index"], result["utilities"], result["actions"], env.terminal_mask() if env is not None else None)
+
+    @property
+    def nbytes(self) -> int:
+        return self.policy.nbytes + self.utilities.nbytes
+
+    def flat_index(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Flat indices of (row, col) positions
+
+        Raises:
+            IndexError: If a position is outside the grid
+        """
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        rows, cols = positions[:, 0], positions[:, 1]
+        if ((rows < 0) | (rows >= self.height) | (cols < 0) | (cols >= self.width)).any():
+            raise IndexError(f"positions outside the {self.height}x{self.width} grid")
+        return rows * self.width + cols
+
+    def query(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Actions and utilities of many positions in one vectorized lookup
+
+        Args:
+            positions (np.ndarray): (n, 2) array of (row, col) positions
+
+        Returns:
+            (n,) int8 action indices, -1 for walls and terminal states, and (n,) utilities
+        """
+        index: np.ndarray = self.flat_index(positions)
+        return self.policy[index], self.utilities[index]
+
+    def query_vectors(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Action vectors of many positions, (0, 0) for walls and terminal states
+
+        Args:
+            positions (np.ndarray): (n, 2) array of (row, col) positions
+
+        Returns:
+            (n, 2) array of (row, col) moves
+        """
+        return self.vectors[self.policy[self.flat_index(positions)]]
+
+
+class PolicyStore:
+    """
+    Current policy table of a running system. A swap replaces the table reference in one assignment, and
+    queries read the reference once and answer from that table only, so queries running in other threads
+    never see a mix of two policies and never wait for a swap. Swaps are serialized to number versions.
+    """
+
+    def __init__(self, table: Optional[PolicyTable] = None):
+        """
+        Args:
+            table (PolicyTable): Initial policy (optional, default = None until the first swap)
+        """
+        self.lock = threading.Lock()
+        self.current: Tuple[Optional[PolicyTable], int] = (table, 0 if table is None else 1)
+
+    def swap(self, table: PolicyTable) -> int:
+        """
+        Atomically replaces the policy, queries already running finish on the previous table
+
+        Returns:
+            Version of the new table
+        """
+        with self.lock:
+            version: int = self.current[1] + 1
+            self.current = (table, version)
+        return version
+
+    def publish(self, result: dict, actions: Enum, env: Environment) -> int:
+        """
+        Compiles a solver result of the environment and swaps it in
+
+        Returns:
+            Version of the new table
+        """
+        return self.swap(PolicyTable.from_result(result, actions, env))
+
+    def snapshot(self) -> Tuple[PolicyTable, int]:
+        """
+        Current table and its version, for several lookups that must use the same policy
+        """
+        table, version = self.current
+        assert table is not None, "no policy has been published yet"
+        return table, version
+
+    def query(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Actions and utilities of many positions from the current table
+
+        Args:
+            positions (np.ndarray): (n, 2) array of (row, col) positions
+
+        Returns:
+            (n,) int8 action indices, (n,) utilities and the version of the table that answered
+        """
+        table, version = self.snapshot()
+        actions, utilities = table.query(positions)
+        return actions, utilities, version
@@ -1,15 +1,99 @@
 from enum import Enum
+from typing import *
+
+import numpy as np
+
+from models.environment import Environment
+from models.profiler import ProfiledRecorder, Profiler
+from models.recorder import Recorder, SummaryRecorder
+from models.transition_model import StateLayout, TransitionModel
 
 
 class Agent:
     """
     Abstract class representing Agent object.
     """
-    def __init__(self, actions: dict):
+    def __init__(self, actions: dict, recorder: Optional[Recorder] = None):
         self.ACTIONS = Enum('ACTIONS', actions)
+        # The full utility history is O(states x sweeps), so it is only kept when a HistoryRecorder is passed
+        self.recorder: Recorder = recorder if recorder is not None else SummaryRecorder()
+        self.profiler: Profiler = Profiler()
+
+    def set_profiler(self, profiler: Profiler) -> None:
+        """
+        Enables instrumentation: solver phases, recorder calls and backup/sweep counts are reported to the profiler
+        """
+        recorder: Recorder = self.recorder.recorder if isinstance(self.recorder, ProfiledRecorder) else self.recorder
+        self.profiler = profiler
+        self.recorder = ProfiledRecorder(recorder, profiler)
+
+    def get_transition_model(self, env: Environment) -> TransitionModel:
+        """
+        Compiled transition model of the environment for this agent's action set
+        """
+        with self.profiler.phase("compile"):
+            return env.get_transition_model([action.value for action in self.ACTIONS])
+
+    def policy_to_grid(self, policy: np.ndarray, model: StateLayout) -> List[List]:
+        """
+        Converts per-state action indices into a grid of ACTIONS (None for walls)
+        """
+        actions: List = list(self.ACTIONS)
+        grid: List[List] = [[None for _ in range(model.width)] for _ in range(model.height)]
+        for (i, j), action in zip(model.states.tolist(), policy.tolist()):
+            grid[i][j] = actions[action]
+        return grid
+
+    def policy_from_grid(self, policy: List[List], model: TransitionModel) -> np.ndarray:
+        """
+        Converts a grid of ACTIONS into per-state action indices
+        """
+        actions: List = list(self.ACTIONS)
+        return np.array([actions.index(policy[i][j]) for i, j in model.states.tolist()], dtype=np.int64)
+
+    def affected_states(self, model: TransitionModel, changed: Iterable[Tuple]) -> np.ndarray:
+        """
+        States whose Bellman backup depends on any of the changed cells:
+        the changed cells themselves and every state that can move into them
+
+        Args:
+            model (TransitionModel): Compiled transition model of the changed environment
+            changed (Iterable[Tuple]): Cells whose type or reward changed
+
+        Returns:
+            Sorted dense indices of the affected states
+        """
+        cells: np.ndarray = np.array(list(changed), dtype=np.int64).reshape(-1, 2)
+        candidates: np.ndarray = np.concatenate([cells] + [cells - np.array(move) for move in model.moves])
+
+        in_bounds: np.ndarray = ((0 <= candidates[:, 0]) & (candidates[:, 0] < model.height) &
+                                 (0 <= candidates[:, 1]) & (candidates[:, 1] < model.width))
+        indices: np.ndarray = model.state_index[candidates[in_bounds, 0], candidates[in_bounds, 1]]
+
+        return np.unique(indices[indices >= 0])
+
+    def cold_backups(self, previous: dict, model: TransitionModel) -> Optional[int]:
+        """
+        Backups of the cold solve that a warm start from previous is measured against,
+        carried forward when previous is itself a warm start
+
+        Args:
+            previous (dict): Result the warm start is seeded with
+            model (TransitionModel): Compiled transition model of the changed environment
+
+        Returns:
+            Backups of the cold solve, None if they are unknown, e.g. for direct policy evaluation, whose work is sparse solves
+        """
+        if "cold_backups" in previous:
+            return previous["cold_backups"]
+        if previous.get("solves"):
+            return None
+        if "backups" in previous:
+            return previous["backups"]
+        return model.n_states * previous.get("evaluation", {}).get("inner_iterations", previous["iterations"])
 
     def solve(self):
         raise NotImplementedError
 
-    def get_data(self):
-        raise NotImplementedError
+    def get_data(self) -> dict:
+        return self.recorder.get_data()
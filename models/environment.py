@@ -1,7 +1,10 @@
-import random
 from collections import defaultdict
 from typing import *
 
+import numpy as np
+
+from models.transition_model import TransitionModel
+
 
 class Environment:
     """
@@ -10,7 +13,38 @@ class Environment:
     Contains State Transformer function and Step function.
     """
 
-    def __init__(self, grid_world: List[List], rewards: List[List], initial_state: Tuple):
+    # Cell types in the order of their uint8 codes, grids may hold either the types or the codes
+    CELL_TYPES: List[str] = ['Wh', 'G', 'R', 'W']
+    WALL_CODE: int = 3
+
+    # Slip outcomes relative to the intended move (dr, dc)
+    SLIP_MOVES: Dict[str, Callable[[Tuple], Tuple]] = {
+        "forward": lambda move: (move[0], move[1]),
+        "left": lambda move: (-move[1], move[0]),
+        "right": lambda move: (move[1], -move[0]),
+        "back": lambda move: (-move[0], -move[1]),
+        "stay": lambda move: (0, 0),
+    }
+
+    DEFAULT_SLIP: Dict[str, float] = {"forward": 0.8, "left": 0.1, "right": 0.1}
+
+    def __init__(self, grid_world: List[List], rewards: List[List], initial_state: Tuple, seed: Optional[int] = None,
+                 slip: Optional[Dict[str, float]] = None, terminals: Optional[Iterable[Tuple]] = None):
+        """
+        Args:
+            grid_world (List[List]): Cell types, 'W' for walls, or a uint8 array of codes into CELL_TYPES
+            rewards (List[List]): Reward of every cell
+            initial_state (Tuple): Agent's initial state
+            seed (int): Seed of the step function's random number generator (optional, default = None)
+            slip (Dict[str, float]): Probability of each outcome in SLIP_MOVES given the intended move (optional, default = DEFAULT_SLIP)
+            terminals (Iterable[Tuple]): States that end an episode, their utility is their reward (optional, default = None)
+        """
+        self.seed = seed
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.slip: Dict[str, float] = dict(slip) if slip is not None else dict(Environment.DEFAULT_SLIP)
+        assert set(self.slip) <= set(Environment.SLIP_MOVES), f"Slip outcomes must be in {list(Environment.SLIP_MOVES)}"
+        assert np.isclose(sum(self.slip.values()), 1), "Slip probabilities must sum to 1"
+        self.terminals: Set[Tuple] = {tuple(state) for state in terminals} if terminals is not None else set()
         self.generate_environment(grid_world, rewards, initial_state)
 
     def generate_environment(self, grid_world: List[List], rewards: List[List], initial_state: Tuple) -> Tuple[Tuple, float]:
@@ -19,17 +53,72 @@ class Environment:
         self.grid_height = len(grid_world)
         self.rewards: List[List] = rewards
         self.agent_pos: Tuple = initial_state
+        self.invalidate()
 
         return (initial_state, rewards[initial_state[0]][initial_state[1]])
 
+    def invalidate(self) -> None:
+        """
+        Drops compiled transition models, must be called whenever the grid or rewards change
+        """
+        self.transition_models: Dict[Tuple, TransitionModel] = {}
+        self.arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def set_reward(self, state: Tuple, reward: float) -> None:
+        self.rewards[state[0]][state[1]] = reward
+        self.invalidate()
+
+    def set_cell(self, state: Tuple, cell: str, reward: float) -> None:
+        if np.asarray(self.grid_world[state[0]]).dtype == np.uint8:
+            cell = Environment.CELL_TYPES.index(cell)
+        self.grid_world[state[0]][state[1]] = cell
+        self.rewards[state[0]][state[1]] = reward
+        self.invalidate()
+
+    def get_transition_model(self, actions: Sequence[Tuple]) -> TransitionModel:
+        """
+        Returns the compiled transition model for the action set, compiling it on first use
+
+        Args:
+            actions (Sequence[Tuple]): Actions available to the agent, in solver order
+
+        Returns:
+            TransitionModel: Dense state index and next state / probability arrays
+        """
+        key: Tuple = tuple(tuple(action) for action in actions)
+        if key not in self.transition_models:
+            self.transition_models[key] = TransitionModel(self, key)
+        return self.transition_models[key]
+
+    def wall_mask(self) -> np.ndarray:
+        cells: np.ndarray = np.asarray(self.grid_world)
+        return (cells == Environment.WALL_CODE) if cells.dtype == np.uint8 else (cells == 'W')
+
+    def terminal_mask(self) -> np.ndarray:
+        mask: np.ndarray = np.zeros((self.grid_height, self.grid_width), dtype=bool)
+        for state in self.terminals:
+            mask[state[0], state[1]] = True
+        return mask
+
+    def get_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Wall mask, rewards and terminal mask of the grid as arrays, cached until the grid or rewards change
+        """
+        if self.arrays is None:
+            self.arrays = (self.wall_mask(), np.asarray(self.rewards, dtype=np.float64), self.terminal_mask())
+        return self.arrays
+
     def get_reward(self, state: Tuple) -> float:
         return self.rewards[state[0]][state[1]]
 
     def is_within_bounds(self, state: Tuple) -> bool:
-        return (0 <= state[0] < self.grid_width and 0 <= state[1] < self.grid_height)
+        return (0 <= state[0] < self.grid_height and 0 <= state[1] < self.grid_width)
 
     def is_wall(self, state: Tuple) -> bool:
-        return (self.grid_world[state[0]][state[1]] == 'W')
+        return (self.grid_world[state[0]][state[1]] in ('W', Environment.WALL_CODE))
+
+    def is_terminal(self, state: Tuple) -> bool:
+        return (tuple(state) in self.terminals)
 
     def is_valid_state(self, state: Tuple) -> bool:
         """
@@ -43,6 +132,18 @@ class Environment:
         """
         return (self.is_within_bounds(state) and not self.is_wall(state))
 
+    def action_outcomes(self, action: Tuple) -> List[Tuple[Tuple, float]]:
+        """
+        Returns the moves the agent may actually make when taking an action, with probabilities
+
+        Args:
+            action (Tuple): Intended action
+
+        Returns:
+            List[Tuple[Tuple, float]]: Moves of the slip model with non-zero probability
+        """
+        return [(Environment.SLIP_MOVES[outcome](action), prob) for outcome, prob in self.slip.items() if prob > 0]
+
     def state_transformer(self, state: Tuple, action: Tuple) -> dict:
         """
         Returns each potential next state with probabilities given the agent's current state and action
@@ -55,10 +156,8 @@ class Environment:
             model (dict): Next states and probabilities 
         """
         model: DefaultDict = defaultdict(int)
-        possible_actions: List[Tuple] = [action, (action[1], action[0]), (-action[1], -action[0])]
-        probability_actions: Tuple = (0.8, 0.1, 0.1)
 
-        for a, prob in zip(possible_actions, probability_actions):
+        for a, prob in self.action_outcomes(action):
             next_state: Tuple = (state[0]+a[0], state[1]+a[1])
             next_state = next_state if self.is_valid_state(next_state) else state
 
@@ -81,8 +180,53 @@ class Environment:
         assert state is not None
 
         transformer_model: dict = self.state_transformer(state, action)
-        next_state: Tuple = random.choices(list(transformer_model.keys()), weights=list(transformer_model.values()), k=1)[0]
+        next_states: List[Tuple] = list(transformer_model.keys())
+        next_state: Tuple = next_states[self.rng.choice(len(next_states), p=list(transformer_model.values()))]
 
         reward: float = self.get_reward(next_state)
 
         return (next_state, reward)
+
+    def reset_batch(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Places many agents in states at the start of their episodes
+
+        Args:
+            states (np.ndarray): (n, 2) start states
+
+        Returns:
+            Tuple: (n,) rewards and (n,) terminal flags of the start states
+        """
+        _, rewards, terminal = self.get_arrays()
+        return (rewards[states[:, 0], states[:, 1]], terminal[states[:, 0], states[:, 1]])
+
+    def step_batch(self, states: np.ndarray, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized step of many agents at once, sampling every outcome from the environment's generator
+
+        Args:
+            states (np.ndarray): (n, 2) current states
+            actions (np.ndarray): (n, 2) current actions
+
+        Returns:
+            Tuple: (n, 2) next states, (n,) rewards and (n,) terminal flags of the next states
+        """
+        walls, rewards, terminal = self.get_arrays()
+
+        # Outcomes of every distinct action, (n, n_outcomes, 2) moves and (n, n_outcomes) probabilities
+        distinct, inverse = np.unique(actions, axis=0, return_inverse=True)
+        outcomes: List[List[Tuple[Tuple, float]]] = [self.action_outcomes(tuple(action)) for action in distinct.tolist()]
+        moves: np.ndarray = np.array([[move for move, _ in outcome] for outcome in outcomes], dtype=np.int64)[inverse.ravel()]
+        cumulative: np.ndarray = np.cumsum([[prob for _, prob in outcome] for outcome in outcomes], axis=1)[inverse.ravel()]
+
+        # Sample an outcome of every agent
+        outcome: np.ndarray = (self.rng.random(len(states))[:, None] * cumulative[:, -1:] >= cumulative).sum(axis=1)
+        next_states: np.ndarray = states + moves[np.arange(len(states)), np.minimum(outcome, moves.shape[1] - 1)]
+
+        # Agents moving out of bounds or into a wall stay in place
+        valid: np.ndarray = ((0 <= next_states[:, 0]) & (next_states[:, 0] < self.grid_height) &
+                             (0 <= next_states[:, 1]) & (next_states[:, 1] < self.grid_width))
+        valid[valid] = ~walls[next_states[valid, 0], next_states[valid, 1]]
+        next_states[~valid] = states[~valid]
+
+        return (next_states, rewards[next_states[:, 0], next_states[:, 1]], terminal[next_states[:, 0], next_states[:, 1]])
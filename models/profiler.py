@@ -0,0 +1,88 @@
+import time
+from contextlib import contextmanager
+from typing import *
+
+import numpy as np
+
+from models.recorder import Recorder
+from models.transition_model import StateLayout
+
+
+class Profiler:
+    """
+    Instrumentation hooks of a solver: timers for each phase and event counters.
+    The base profiler measures nothing, so disabled instrumentation costs one no-op call per hook.
+    """
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        yield
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def report(self) -> dict:
+        return {}
+
+
+class TimingProfiler(Profiler):
+    """
+    Accumulates wall time and calls of every phase, and totals of every counter
+    """
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.start_time: float = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def report(self) -> dict:
+        """
+        Returns:
+            Time and calls of every phase, counters, and wall time since the profiler was created
+        """
+        return {
+            "wall_time": time.perf_counter() - self.start_time,
+            "phases": {name: {"time": self.times[name], "calls": self.calls[name]} for name in self.times},
+            "counters": dict(self.counters),
+        }
+
+
+class ProfiledRecorder(Recorder):
+    """
+    Times every call of a wrapped recorder as the "recording" phase
+    """
+
+    def __init__(self, recorder: Recorder, profiler: Profiler):
+        self.recorder = recorder
+        self.profiler = profiler
+
+    def start(self, model: StateLayout) -> None:
+        with self.profiler.phase("recording"):
+            self.recorder.start(model)
+
+    def record(self, utilities: np.ndarray, delta: float) -> None:
+        with self.profiler.phase("recording"):
+            self.recorder.record(utilities, delta)
+
+    def progress(self, samples: int, mean_return: float) -> None:
+        self.recorder.progress(samples, mean_return)
+
+    def close(self) -> None:
+        with self.profiler.phase("recording"):
+            self.recorder.close()
+
+    def get_data(self) -> dict:
+        return self.recorder.get_data()
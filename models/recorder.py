@@ -0,0 +1,206 @@
+import csv
+import time
+from typing import *
+
+import numpy as np
+
+from models.transition_model import StateLayout
+
+
+class Recorder:
+    """
+    Records convergence telemetry of a solver, one row per sweep.
+    The base recorder records nothing and is used to switch recording off.
+    """
+
+    def start(self, model: StateLayout) -> None:
+        pass
+
+    def record(self, utilities: np.ndarray, delta: float) -> None:
+        pass
+
+    def progress(self, samples: int, mean_return: float) -> None:
+        """
+        Reports the samples drawn so far by a learning agent, called before record
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def get_data(self) -> dict:
+        return {}
+
+
+class StreamingRecorder(Recorder):
+    """
+    Abstract recorder keeping rows in a preallocated buffer.
+    If a path is given, the buffer is appended to a CSV file every chunk_size rows,
+    otherwise the buffer grows to hold the full recording in memory.
+    """
+
+    # Upper bound on buffered values, limits chunk_size for wide recordings
+    MAX_BUFFER_SIZE = 1 << 22
+
+    def __init__(self, path: Optional[str] = None, chunk_size: Optional[int] = 256):
+        """
+        Args:
+            path (str): CSV file to stream rows to (optional, default = None keeps rows in memory)
+            chunk_size (int): Number of rows buffered between writes (optional, default = 256)
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.labels: List[str] = []
+        self.buffer: np.ndarray = np.empty((0, 0))
+        self.n_rows: int = 0
+        self.n_flushed: int = 0
+        self.file: Optional[IO] = None
+
+    def columns(self, model: StateLayout) -> List[str]:
+        raise NotImplementedError
+
+    def row(self, utilities: np.ndarray, delta: float, out: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def start(self, model: StateLayout) -> None:
+        self.close()
+        self.labels = self.columns(model)
+        rows: int = max(1, min(self.chunk_size, StreamingRecorder.MAX_BUFFER_SIZE // max(len(self.labels), 1)))
+        self.buffer = np.empty((rows, len(self.labels)), dtype=np.float64)
+        self.n_rows = 0
+        self.n_flushed = 0
+
+        if self.path is not None:
+            self.file = open(self.path, "w", newline="")
+            csv.writer(self.file, lineterminator="\n").writerow(self.labels)
+
+    def record(self, utilities: np.ndarray, delta: float) -> None:
+        if self.n_rows == len(self.buffer):
+            if self.file is not None:
+                self.flush()
+            else:
+                self.buffer = np.concatenate([self.buffer, np.empty_like(self.buffer)])
+
+        self.row(utilities, delta, self.buffer[self.n_rows])
+        self.n_rows += 1
+
+    def flush(self) -> None:
+        np.savetxt(self.file, self.buffer[:self.n_rows], delimiter=",", fmt="%.17g")
+        self.file.flush()
+        self.n_flushed += self.n_rows
+        self.n_rows = 0
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def get_data(self) -> dict:
+        """
+        Returns the recording held in memory as columns, empty once streamed to disk
+        """
+        if self.path is not None:
+            return {}
+        return {label: self.buffer[:self.n_rows, c].tolist() for c, label in enumerate(self.labels)}
+
+
+class SummaryRecorder(StreamingRecorder):
+    """
+    Records the iteration, maximum utility change and mean utility of every sweep
+    """
+
+    def columns(self, model: StateLayout) -> List[str]:
+        return ["iteration", "max_delta", "mean_utility"]
+
+    def row(self, utilities: np.ndarray, delta: float, out: np.ndarray) -> None:
+        out[0] = self.n_flushed + self.n_rows + 1
+        out[1] = delta
+        out[2] = utilities.mean() if len(utilities) else 0.0
+
+
+class SampledRecorder(StreamingRecorder):
+    """
+    Records the utilities of a sample of states every sweep
+    """
+
+    def __init__(self, states: Optional[List[Tuple]] = None, n_samples: Optional[int] = 16, seed: Optional[int] = None,
+                 path: Optional[str] = None, chunk_size: Optional[int] = 256):
+        """
+        Args:
+            states (List[Tuple]): States to record, sampled at random if None (optional, default = None)
+            n_samples (int): Number of states sampled when states is None (optional, default = 16)
+            seed (int): Seed of the state sample (optional, default = None)
+            path (str): CSV file to stream rows to (optional, default = None keeps rows in memory)
+            chunk_size (int): Number of rows buffered between writes (optional, default = 256)
+        """
+        super().__init__(path, chunk_size)
+        self.states = states
+        self.n_samples = n_samples
+        self.seed = seed
+        self.indices: np.ndarray = np.empty(0, dtype=np.int64)
+
+    def columns(self, model: StateLayout) -> List[str]:
+        if self.states is not None:
+            self.indices = np.array([model.state_index[i, j] for i, j in self.states], dtype=np.int64)
+            assert (self.indices >= 0).all(), "Sampled states must not be walls"
+        else:
+            rng: np.random.Generator = np.random.default_rng(self.seed)
+            self.indices = np.sort(rng.choice(model.n_states, size=min(self.n_samples, model.n_states), replace=False))
+
+        return [str((j,i)) for i, j in model.states[self.indices].tolist()]
+
+    def row(self, utilities: np.ndarray, delta: float, out: np.ndarray) -> None:
+        np.take(utilities, self.indices, out=out)
+
+
+class HistoryRecorder(StreamingRecorder):
+    """
+    Records the utilities of every state every sweep
+    """
+
+    def columns(self, model: StateLayout) -> List[str]:
+        return [str((j,i)) for i, j in model.states.tolist()]
+
+    def row(self, utilities: np.ndarray, delta: float, out: np.ndarray) -> None:
+        out[:] = utilities
+
+
+class LearningCurveRecorder(StreamingRecorder):
+    """
+    Records the learning curve of a model-free agent: samples drawn, sampling throughput,
+    mean return of the last episodes and the change in utilities, once per round of episodes
+    """
+
+    def __init__(self, path: Optional[str] = None, chunk_size: Optional[int] = 256):
+        super().__init__(path, chunk_size)
+        self.samples: int = 0
+        self.mean_return: float = 0.0
+        self.start_time: float = 0.0
+
+    def columns(self, model: StateLayout) -> List[str]:
+        self.samples, self.mean_return = 0, 0.0
+        self.start_time = time.perf_counter()
+        return ["round", "samples", "samples_per_sec", "mean_return", "max_delta", "mean_utility"]
+
+    def progress(self, samples: int, mean_return: float) -> None:
+        self.samples = samples
+        self.mean_return = mean_return
+
+    def row(self, utilities: np.ndarray, delta: float, out: np.ndarray) -> None:
+        elapsed: float = time.perf_counter() - self.start_time
+        out[0] = self.n_flushed + self.n_rows + 1
+        out[1] = self.samples
+        out[2] = self.samples / elapsed if elapsed > 0 else 0.0
+        out[3] = self.mean_return
+        out[4] = delta
+        out[5] = utilities.mean() if len(utilities) else 0.0
+
+
+RECORDERS = {
+    "off": Recorder,
+    "summary": SummaryRecorder,
+    "sampled": SampledRecorder,
+    "history": HistoryRecorder,
+    "learning_curve": LearningCurveRecorder,
+}
@@ -0,0 +1,130 @@
+from typing import *
+
+import numpy as np
+
+from models.environment import Environment
+from models.transition_model import TransitionModel
+
+
+class Simulator:
+    """
+    Runs many episodes of a fixed policy in lockstep on an Environment.
+    Next states are sampled for all episodes at once from the compiled transition table
+    with a seeded NumPy Generator, so rollouts are reproducible.
+    """
+
+    def __init__(self, env: Environment, actions: Sequence[Tuple], seed: Optional[int] = None):
+        """
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+            actions (Sequence[Tuple]): Actions available to the agent, in solver order
+            seed (int): Seed of the random number generator (optional, default = None)
+        """
+        self.env = env
+        self.model: TransitionModel = env.get_transition_model(actions)
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+
+    def policy_indices(self, policy: List[List]) -> np.ndarray:
+        """
+        Converts a solver's policy grid of ACTIONS into per-state action indices
+        """
+        return np.array([self.model.actions.index(tuple(policy[i][j].value)) for i, j in self.model.states.tolist()], dtype=np.int64)
+
+    def run(self, policy: Union[np.ndarray, List[List]], n_episodes: int, horizon: int, gamma: Optional[float] = 1.0,
+            start: Optional[Tuple] = None, keep_episodes: Optional[bool] = True, batch_size: Optional[int] = 65536) -> dict:
+        """
+        Simulates episodes of the policy from the start state
+
+        The return of an episode is R(s0) + gamma*R(s1) + ... + gamma^T*R(sT), so with a discount
+        below 1 and a long horizon the mean return estimates the utility of the start state.
+        Episodes end early when they reach a terminal state.
+
+        Args:
+            policy: Per-state action indices, or a solver's policy grid
+            n_episodes (int): Number of episodes
+            horizon (int): Maximum number of steps of every episode
+            gamma (float): Discount factor of the returns (optional, default = 1.0)
+            start (Tuple): Start state (optional, default = environment's initial state)
+            keep_episodes (bool): Return per-episode arrays, otherwise only streaming statistics (optional, default = True)
+            batch_size (int): Episodes simulated together (optional, default = 65536)
+
+        Returns:
+            "returns", "lengths" and "successes" arrays if keep_episodes, the success rate and summary statistics
+        """
+        if not isinstance(policy, np.ndarray):
+            policy = self.policy_indices(policy)
+
+        start = self.env.agent_pos if start is None else start
+        start_index: int = int(self.model.state_index[start[0], start[1]])
+        assert start_index >= 0, "Start state must not be a wall"
+
+        statistics: Dict[str, RunningStatistics] = {"return": RunningStatistics(), "length": RunningStatistics(), "success": RunningStatistics()}
+        episodes: Dict[str, List[np.ndarray]] = {"returns": [], "lengths": [], "successes": []}
+
+        for first in range(0, n_episodes, batch_size):
+            size: int = min(batch_size, n_episodes - first)
+            states: np.ndarray = np.full(size, start_index, dtype=np.int64)
+            returns: np.ndarray = np.full(size, self.model.rewards[start_index])
+            lengths: np.ndarray = np.zeros(size, dtype=np.int64)
+            active: np.ndarray = np.full(size, not self.model.terminal[start_index])
+            discount: float = 1.0
+
+            # Step all episodes of the batch in lockstep until the horizon or a terminal state
+            for _ in range(horizon):
+                moving: np.ndarray = np.flatnonzero(active)
+                if not len(moving):
+                    break
+
+                states[moving] = self.model.sample(states[moving], policy[states[moving]], self.rng)
+                discount *= gamma
+                returns[moving] += discount * self.model.rewards[states[moving]]
+                lengths[moving] += 1
+                active[moving] = ~self.model.terminal[states[moving]]
+
+            # Episodes succeed by ending in a terminal state with positive reward
+            successes: np.ndarray = self.model.terminal[states] & (self.model.rewards[states] > 0)
+
+            for name, values in zip(statistics, (returns, lengths, successes)):
+                statistics[name].update(values)
+            if keep_episodes:
+                for name, values in zip(episodes, (returns, lengths, successes)):
+                    episodes[name].append(values)
+
+        result: dict = {"episodes": n_episodes, "success_rate": statistics.pop("success").mean}
+        for name, stats in statistics.items():
+            result.update({f"mean_{name}": stats.mean, f"std_{name}": stats.std, f"min_{name}": stats.min, f"max_{name}": stats.max})
+        if keep_episodes:
+            result.update({name: np.concatenate(arrays) if arrays else np.empty(0) for name, arrays in episodes.items()})
+
+        return result
+
+
+class RunningStatistics:
+    """
+    Streaming count, mean, variance, minimum and maximum, updated one batch at a time
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.mean: float = 0.0
+        self.m2: float = 0.0
+        self.min: float = float('inf')
+        self.max: float = float('-inf')
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+
+        # Combine the batch with the running moments (Chan et al.)
+        values = np.asarray(values, dtype=np.float64)
+        count: int = self.count + len(values)
+        delta: float = values.mean() - self.mean
+        self.m2 += ((values - values.mean()) ** 2).sum() + delta ** 2 * self.count * len(values) / count
+        self.mean += delta * len(values) / count
+        self.count = count
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
@@ -0,0 +1,188 @@
+from typing import *
+
+import numpy as np
+
+
+class StateLayout:
+    """
+    Dense index of the valid (non-wall) cells of an Environment, without any transition tables.
+    Enough for agents that only sample the environment to lay out their states and results.
+    """
+
+    def __init__(self, env):
+        """
+        Args:
+            env (Environment): Environment object defining the states
+        """
+        self.height: int = env.grid_height
+        self.width: int = env.grid_width
+
+        # Dense state index over valid cells, -1 for walls
+        valid: np.ndarray = ~env.wall_mask()
+        self.state_index: np.ndarray = np.full((self.height, self.width), -1, dtype=np.int64)
+        self.state_index[valid] = np.arange(int(valid.sum()), dtype=np.int64)
+        self.n_states: int = int(valid.sum())
+
+        rows, cols = np.nonzero(valid)
+        self.states: np.ndarray = np.stack([rows, cols], axis=1)
+
+    def to_grid(self, values: np.ndarray, fill: Any = 0.0) -> np.ndarray:
+        """
+        Scatters per-state values back onto the (height, width) grid, walls are set to fill
+        """
+        grid: np.ndarray = np.full((self.height, self.width) + values.shape[1:], fill, dtype=values.dtype)
+        grid[self.states[:, 0], self.states[:, 1]] = values
+        return grid
+
+    def from_grid(self, grid: np.ndarray) -> np.ndarray:
+        """
+        Gathers per-state values from a (height, width) grid
+        """
+        return np.asarray(grid)[self.states[:, 0], self.states[:, 1]]
+
+
+class TransitionModel(StateLayout):
+    """
+    Compiled representation of the MDP defined by an Environment.
+    Every valid (non-wall) cell is given a dense state index, and the possible next states and
+    probabilities of every (state, action) pair are stored as fixed-width COO arrays.
+    Terminal states have no next states, their utility is their reward.
+    """
+
+    def __init__(self, env, actions: Sequence[Tuple]):
+        """
+        Compiles the environment for the given action set
+
+        Args:
+            env (Environment): Environment object defining the states and transformer model
+            actions (Sequence[Tuple]): Actions available to the agent, in solver order
+        """
+        super().__init__(env)
+        self.actions: List[Tuple] = [tuple(action) for action in actions]
+        self.n_actions: int = len(self.actions)
+
+        rows, cols = self.states[:, 0], self.states[:, 1]
+        self.rewards: np.ndarray = np.asarray(env.rewards, dtype=np.float64)[rows, cols]
+
+        # Terminal states, and a 0/1 factor zeroing their expected future utility
+        self.terminal: np.ndarray = env.terminal_mask()[rows, cols]
+        self.terminal_states: np.ndarray = np.flatnonzero(self.terminal)
+        self.continuation: np.ndarray = (~self.terminal).astype(np.float64)
+
+        # Next state of every valid state for each distinct move the agent can make
+        outcomes: List[List[Tuple[Tuple, float]]] = [env.action_outcomes(action) for action in self.actions]
+        self.moves: List[Tuple] = list(dict.fromkeys(tuple(move) for outcome in outcomes for move, _ in outcome))
+        self.successors: np.ndarray = np.empty((self.n_states, len(self.moves)), dtype=np.int64)
+
+        for m, move in enumerate(self.moves):
+            next_rows: np.ndarray = rows + move[0]
+            next_cols: np.ndarray = cols + move[1]
+            in_bounds: np.ndarray = (0 <= next_rows) & (next_rows < self.height) & (0 <= next_cols) & (next_cols < self.width)
+
+            # Bumping into a wall or the boundary leaves the agent where it is
+            targets: np.ndarray = np.arange(self.n_states, dtype=np.int64)
+            targets[in_bounds] = self.state_index[next_rows[in_bounds], next_cols[in_bounds]]
+            targets[targets < 0] = np.nonzero(targets < 0)[0]
+            self.successors[:, m] = targets
+
+        # Probability of each move given the intended action
+        self.move_probabilities: np.ndarray = np.zeros((self.n_actions, len(self.moves)), dtype=np.float64)
+        for a, outcome in enumerate(outcomes):
+            for move, prob in outcome:
+                self.move_probabilities[a, self.moves.index(tuple(move))] += prob
+
+        # Next state indices and probabilities per (state, action, outcome)
+        self.n_outcomes: int = max(len(outcome) for outcome in outcomes) if outcomes else 0
+        self.next_states: np.ndarray = np.repeat(np.arange(self.n_states, dtype=np.int64)[:, None, None],
+                                                 self.n_actions, axis=1).repeat(self.n_outcomes, axis=2)
+        self.probabilities: np.ndarray = np.zeros((self.n_states, self.n_actions, self.n_outcomes), dtype=np.float64)
+        for a, outcome in enumerate(outcomes):
+            for o, (move, prob) in enumerate(outcome):
+                self.next_states[:, a, o] = self.successors[:, self.moves.index(tuple(move))]
+                self.probabilities[:, a, o] = prob
+
+        # Terminal states stay where they are with zero probability mass
+        self.next_states[self.terminal_states] = self.terminal_states[:, None, None]
+        self.probabilities[self.terminal_states] = 0.0
+
+        self._predecessors: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._cumulative_probabilities: Optional[np.ndarray] = None
+
+    def state(self, index: int) -> Tuple:
+        return (int(self.states[index, 0]), int(self.states[index, 1]))
+
+    def expected_utilities(self, utilities: np.ndarray, states: Union[int, slice, np.ndarray] = slice(None)) -> np.ndarray:
+        """
+        Expected utility of every action for the given states
+
+        Args:
+            utilities (np.ndarray): Utilities of all states, indexed by dense state index
+            states: State index, slice or index array to evaluate (optional, default = all states)
+
+        Returns:
+            Expected utilities with the action as the last axis
+        """
+        expected_utilities: np.ndarray = utilities[self.successors[states]] @ self.move_probabilities.T
+        if len(self.terminal_states):
+            expected_utilities *= self.continuation[states][..., None]
+        return expected_utilities
+
+    def predecessors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reverse transition index: the states that can move into each state under some action
+
+        Returns:
+            indptr, predecessors: predecessors of state s are predecessors[indptr[s]:indptr[s+1]]
+        """
+        if self._predecessors is None:
+            # Terminal states do not move into any state
+            moving: np.ndarray = np.flatnonzero(~self.terminal)
+            targets: np.ndarray = self.successors[moving].ravel()
+            sources: np.ndarray = np.repeat(moving, self.successors.shape[1])
+
+            # Drop duplicate edges, then group sources by target
+            edges: np.ndarray = np.unique(np.stack([targets, sources], axis=1), axis=0)
+            indptr: np.ndarray = np.zeros(self.n_states + 1, dtype=np.int64)
+            np.cumsum(np.bincount(edges[:, 0], minlength=self.n_states), out=indptr[1:])
+            self._predecessors = (indptr, edges[:, 1].copy())
+
+        return self._predecessors
+
+    def policy_matrix(self, policy: np.ndarray):
+        """
+        Sparse transition matrix P_pi of a fixed policy
+
+        Args:
+            policy (np.ndarray): Action index of every state
+
+        Returns:
+            scipy.sparse.csr_matrix: (n_states, n_states) matrix of next state probabilities
+        """
+        from scipy.sparse import csr_matrix
+
+        states: np.ndarray = np.arange(self.n_states)
+        next_states: np.ndarray = self.next_states[states, policy]
+        probabilities: np.ndarray = self.probabilities[states, policy]
+        rows: np.ndarray = np.repeat(states, next_states.shape[1])
+
+        return csr_matrix((probabilities.ravel(), (rows, next_states.ravel())), shape=(self.n_states, self.n_states))
+
+    def sample(self, states: np.ndarray, actions: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        Samples the next state of every (state, action) pair
+
+        Args:
+            states (np.ndarray): Dense state indices
+            actions (np.ndarray): Action index taken in each state
+            rng (np.random.Generator): Random number generator
+
+        Returns:
+            Dense indices of the next states
+        """
+        if self._cumulative_probabilities is None:
+            self._cumulative_probabilities = self.probabilities.cumsum(axis=-1)
+
+        cumulative: np.ndarray = self._cumulative_probabilities[states, actions]
+        outcomes: np.ndarray = (rng.random(len(states))[:, None] * cumulative[:, -1:] >= cumulative).sum(axis=1)
+        return self.next_states[states, actions, np.minimum(outcomes, self.n_outcomes - 1)]
+
@@ -0,0 +1,24 @@
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions, grid, rewards
+from models.environment import Environment
+from models.recorder import HistoryRecorder
+
+
+def environment() -> Environment:
+    return Environment(grid_world=grid, rewards=rewards, initial_state=(len(grid) - 1, 0))
+
+
+def test_default_recorder_keeps_no_per_state_history():
+    agent = VectorizedValueIteration(actions, 0.1, 0.99)
+    result = agent.solve(environment())
+
+    data = agent.get_data()
+    assert set(data) == {"iteration", "max_delta", "mean_utility"}
+    assert len(data["iteration"]) == result["iterations"]
+
+
+def test_history_is_opt_in():
+    agent = VectorizedValueIteration(actions, 0.1, 0.99, recorder=HistoryRecorder())
+    agent.solve(environment())
+
+    assert len(agent.get_data()) > 3
@@ -0,0 +1,52 @@
+import numpy as np
+
+from algos.backward_induction import BackwardInduction
+from config import actions
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+HORIZON = 37
+
+
+def environment() -> Environment:
+    cells, rewards = generate_grid_arrays(17, 23, seed=6, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::10].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(16, 0), terminals=terminals)
+
+
+def names(policy) -> list:
+    return [[action.name if action is not None else None for action in row] for row in policy]
+
+
+def test_checkpointed_output_equals_the_full_horizon():
+    env = environment()
+    full = BackwardInduction(actions, HORIZON, gamma=0.95, recorder=Recorder())
+    expected = full.solve(env)
+    policies = [full.policy_at(t) for t in range(HORIZON)]
+
+    for checkpoint in (1, 6, 10, HORIZON, 2 * HORIZON):
+        agent = BackwardInduction(actions, HORIZON, gamma=0.95, checkpoint=checkpoint, recorder=Recorder())
+        result = agent.solve(env)
+
+        assert np.array_equal(result["utilities"], expected["utilities"])
+        assert names(result["policy"]) == names(expected["policy"])
+        assert [(state, action.name) for state, action in agent.plan()] == [(state, action.name) for state, action in full.plan()]
+
+        # Forwards, backwards and out of order, recomputed segments give the stored actions
+        for t in list(range(HORIZON)) + list(range(HORIZON - 1, -1, -1)) + [0, HORIZON - 1, HORIZON // 2]:
+            assert np.array_equal(agent.policy_at(t), policies[t])
+
+
+def test_checkpoints_store_less_than_every_stage():
+    # Near sqrt(8 * horizon) stages between checkpoints keep the fewest bytes
+    horizon, checkpoint = 400, 56
+    agent = BackwardInduction(actions, horizon, checkpoint=checkpoint, recorder=Recorder())
+    agent.solve(environment())
+    for t in range(horizon):
+        agent.policy_at(t)
+
+    memory = agent.memory()
+    assert memory["stored_bytes"] < memory["tensor_bytes"] / 2
+    # A pass through the plan recomputes every segment below the last one once
+    assert memory["recomputed_stages"] == (horizon - 1) // checkpoint * checkpoint
@@ -0,0 +1,30 @@
+import numpy as np
+
+from algos.batch_value_iteration import BatchValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def environment(height: int, width: int, seed: int) -> Environment:
+    cells, rewards = generate_grid_arrays(height, width, seed=seed, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::10].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(height - 1, 0), terminals=terminals)
+
+
+def test_every_setting_matches_the_reference_solver(tmp_path):
+    # Two grids share a shape and are stacked, the third is solved as its own group
+    envs = [environment(13, 17, 0), environment(13, 17, 1), environment(9, 21, 2)]
+    agent = BatchValueIteration(actions, gammas=(0.9, 0.99), epsilons=(0.1, 0.01), workers=1, output_dir=str(tmp_path))
+    results = agent.solve(envs, ids=["a", "b", "c"])
+
+    assert len(results) == 12
+    assert list(results["grid_id"].unique()) == ["a", "b", "c"]
+    for row in results.itertuples():
+        env = envs["abc".index(row.grid_id)]
+        expected = VectorizedValueIteration(actions, 1e-6, row.gamma, recorder=Recorder()).solve(env)["utilities"]
+
+        assert np.abs(np.load(row.utilities_path) - expected).max() <= row.epsilon
+        assert row.iterations > 0
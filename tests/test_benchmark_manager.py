@@ -0,0 +1,18 @@
+import resource
+
+import numpy as np
+
+from manager.benchmark_manager import BenchmarkManager
+
+
+def test_peak_rss_is_measured_in_the_case_process():
+    # Memory held by the parent must not show up as the peak RSS of a case
+    ballast: np.ndarray = np.ones(400 * 2 ** 20 // 8)
+    parent_rss_mb: float = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    results = BenchmarkManager(sizes=[(6, 6)], densities=[(0.168, 0.332)], solvers=["vectorized_value_iteration"]).run()
+
+    assert len(results) == 1
+    assert results["peak_rss_mb"][0] < parent_rss_mb - 300
+    assert results["max_error"][0] < 0.1
+    del ballast
@@ -0,0 +1,68 @@
+from algos.q_learning import QLearning
+from algos.value_iteration import ValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions, grid, rewards
+from manager.cache_manager import CacheManager
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def environment() -> Environment:
+    return Environment(grid_world=grid, rewards=rewards, initial_state=(len(grid) - 1, 0))
+
+
+def test_hit_has_the_fields_of_the_miss(tmp_path):
+    cache = CacheManager(directory=str(tmp_path))
+    miss = cache.solve(VectorizedValueIteration(actions, 0.1, 0.99, recorder=Recorder()), environment())
+    hit = cache.solve(VectorizedValueIteration(actions, 0.1, 0.99, recorder=Recorder()), environment())
+
+    assert (miss["cache"], hit["cache"]) == ("miss", "hit")
+    assert set(hit) == set(miss)
+    assert (hit["stop_reason"], hit["error_bound"], hit["backups"]) == (miss["stop_reason"], miss["error_bound"], miss["backups"])
+
+
+def test_budget_stopped_results_are_not_cached(tmp_path):
+    cache = CacheManager(directory=str(tmp_path))
+    first = cache.solve(VectorizedValueIteration(actions, 0.1, 0.99, max_backups=10, recorder=Recorder()), environment())
+    assert first["stop_reason"] == "max_backups"
+    assert cache.stats()["entries"] == 0
+
+    # The budget is not part of the key, a converged solve is cached for every budget
+    converged = cache.solve(VectorizedValueIteration(actions, 0.1, 0.99, max_time=60.0, recorder=Recorder()), environment())
+    hit = cache.solve(VectorizedValueIteration(actions, 0.1, 0.99, recorder=Recorder()), environment())
+    assert (converged["cache"], hit["cache"]) == ("miss", "hit")
+    assert hit["stop_reason"] == "max_norm"
+
+
+def test_learner_configurations_miss_separately(tmp_path):
+    cache = CacheManager(directory=str(tmp_path))
+    env = Environment(grid_world=grid, rewards=rewards, initial_state=(len(grid) - 1, 0), seed=0)
+    first = cache.solve(QLearning(actions, episodes=5, seed=0, recorder=Recorder()), env)
+    other = cache.solve(QLearning(actions, episodes=20, alpha=0.5, seed=1, recorder=Recorder()), env)
+    hit = cache.solve(QLearning(actions, episodes=5, seed=0, recorder=Recorder()), env)
+
+    assert (first["cache"], other["cache"], hit["cache"]) == ("miss", "miss", "hit")
+    assert cache.stats()["entries"] == 2
+
+
+def test_unseeded_learners_are_not_cached(tmp_path):
+    cache = CacheManager(directory=str(tmp_path))
+    results = [cache.solve(QLearning(actions, episodes=5, recorder=Recorder()), environment()) for _ in range(2)]
+
+    assert [result["cache"] for result in results] == ["miss", "miss"]
+    assert cache.stats()["entries"] == 0
+
+
+def test_warm_start_has_the_fields_of_a_solve(tmp_path):
+    cache = CacheManager(directory=str(tmp_path), warm_start_fraction=0.5)
+    miss = cache.solve(ValueIteration(actions, 0.1, 0.99, mode="prioritized", recorder=Recorder()), environment())
+
+    changed = [row[:] for row in rewards]
+    changed[0][0] = -0.5
+    warm = cache.solve(ValueIteration(actions, 0.1, 0.99, mode="prioritized", recorder=Recorder()),
+                       Environment(grid_world=grid, rewards=changed, initial_state=(len(grid) - 1, 0)))
+
+    assert (miss["cache"], warm["cache"]) == ("miss", "warm")
+    assert set(miss) <= set(warm)
+    assert warm["stop_reason"] == "max_norm" and warm["error_bound"] == 0.1
+    assert warm["cold_backups"] == miss["backups"]
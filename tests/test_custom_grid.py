@@ -0,0 +1,42 @@
+import numpy as np
+
+from config import action_sets
+from manager.custom_grid import CODE_REWARDS, WALL, WHITE, prune_unreachable
+
+# The top right cell only touches the open cells diagonally
+CELLS = np.array([[WHITE, WALL, WHITE],
+                  [WHITE, WHITE, WALL],
+                  [WHITE, WHITE, WHITE]], dtype=np.uint8)
+
+
+def prune(moves=None):
+    cells = CELLS.copy()
+    rewards = CODE_REWARDS[cells].astype(np.float64)
+    return prune_unreachable(cells, rewards, (2, 0), moves), cells
+
+
+def test_four_connected_moves_wall_off_diagonal_neighbours():
+    pruned, cells = prune(action_sets["4"].values())
+    assert pruned == 1 and cells[0, 2] == WALL
+    assert prune()[0] == 1
+
+
+def test_diagonal_moves_keep_diagonal_neighbours():
+    for actions in ("8", "8_stay"):
+        pruned, cells = prune(action_sets[actions].values())
+        assert pruned == 0 and np.array_equal(cells, CELLS)
+
+
+def test_pruning_in_row_bands_matches_labelling_the_whole_grid():
+    from scipy.ndimage import label
+
+    rng = np.random.default_rng(0)
+    cells = np.where(rng.random((40, 30)) < 0.4, WALL, WHITE).astype(np.uint8)
+    cells[39, 0] = WHITE
+    for actions, structure in (("4", None), ("8", np.ones((3, 3), dtype=bool))):
+        components, _ = label(cells != WALL, structure=structure)
+        expected = np.where(components != components[39, 0], WALL, cells)
+        for chunk_rows in (1, 3, 64):
+            pruned = cells.copy()
+            prune_unreachable(pruned, CODE_REWARDS[pruned], (39, 0), action_sets[actions].values(), chunk_rows)
+            assert np.array_equal(pruned, expected)
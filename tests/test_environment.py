@@ -0,0 +1,22 @@
+from models.environment import Environment
+
+# 2 rows, 4 columns
+GRID = [['Wh', 'Wh', 'Wh', 'G'],
+        ['Wh', 'W', 'Wh', 'R']]
+REWARDS = [[-0.04, -0.04, -0.04, 1.0],
+           [-0.04, 0.0, -0.04, -1.0]]
+
+
+def test_bounds_of_a_rectangular_grid():
+    env = Environment(grid_world=GRID, rewards=REWARDS, initial_state=(1, 0))
+
+    assert env.is_within_bounds((1, 3)) and env.is_within_bounds((0, 2))
+    assert not env.is_within_bounds((2, 0)) and not env.is_within_bounds((0, 4))
+    assert env.is_valid_state((1, 3)) and not env.is_valid_state((3, 1))
+
+
+def test_moves_off_the_long_side_stay_in_place():
+    env = Environment(grid_world=GRID, rewards=REWARDS, initial_state=(1, 0), slip={"forward": 1.0})
+
+    assert env.state_transformer((0, 3), (0, 1)) == {(0, 3): 1.0}
+    assert env.state_transformer((0, 2), (0, 1)) == {(0, 3): 1.0}
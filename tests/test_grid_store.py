@@ -0,0 +1,59 @@
+import numpy as np
+
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.custom_grid import GREEN, generate_grid_arrays
+from manager.grid_store import decode_cells, load_environment, load_result, save_environment, save_result
+from models.environment import Environment
+from models.recorder import Recorder
+
+GRID = [['Wh', 'Wh', 'Wh', 'G'],
+        ['Wh', 'W', 'Wh', 'R'],
+        ['Wh', 'Wh', 'Wh', 'Wh']]
+REWARDS = [[-0.04, -0.04, -0.04, 1.0],
+           [-0.04, 0.0, -0.04, -1.0],
+           [-0.04, -0.04, -0.04, -0.04]]
+
+
+def generated_environment() -> Environment:
+    cells, rewards = generate_grid_arrays(19, 33, seed=8, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::9].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(18, 0), slip={"forward": 0.7, "left": 0.3},
+                       terminals=terminals)
+
+
+def test_environment_round_trip_is_exact(tmp_path):
+    cell_types = Environment(grid_world=GRID, rewards=REWARDS, initial_state=(2, 0), terminals=[(0, 3), (1, 3)])
+    for env in (cell_types, generated_environment()):
+        path = str(tmp_path / "grid.bin")
+        save_environment(path, env)
+        loaded = load_environment(path)
+
+        # Cell types are stored as uint8 codes, cell codes as they are
+        cells = np.asarray(env.grid_world)
+        assert np.array_equal(loaded.grid_world if cells.dtype == np.uint8 else decode_cells(loaded.grid_world), cells)
+        assert np.array_equal(loaded.rewards, np.asarray(env.rewards, dtype=np.float64))
+        assert loaded.agent_pos == tuple(env.agent_pos)
+        assert loaded.slip == env.slip
+        assert loaded.terminals == env.terminals
+
+        # Loaded arrays are copy-on-write, changing them leaves the file as saved
+        loaded.set_reward(loaded.agent_pos, 5.0)
+        assert load_environment(path).rewards[env.agent_pos] == env.rewards[env.agent_pos[0]][env.agent_pos[1]]
+
+
+def test_result_round_trip_is_exact(tmp_path):
+    env = generated_environment()
+    agent = VectorizedValueIteration(actions, 0.01, 0.99, recorder=Recorder())
+    result = agent.solve(env)
+
+    path = str(tmp_path / "result.bin")
+    save_result(path, result, agent.ACTIONS, info={"gamma": 0.99})
+    loaded = load_result(path, agent.ACTIONS)
+
+    assert np.array_equal(loaded["utilities"], result["utilities"])
+    assert loaded["policy"] == result["policy"]
+    assert (np.asarray(loaded["policy_index"]) >= 0).sum() == env.get_transition_model(list(actions.values())).n_states
+    assert loaded["actions"] == actions
+    assert loaded["algorithm"] == result["algorithm"] and loaded["iterations"] == result["iterations"]
+    assert loaded["info"] == {"gamma": 0.99}
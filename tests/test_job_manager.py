@@ -0,0 +1,92 @@
+import asyncio
+
+from config import grid, rewards
+from manager.job_manager import CANCELLED, DONE, QUEUED, JobManager
+from models.environment import Environment
+
+
+def environment() -> Environment:
+    return Environment(grid_world=grid, rewards=rewards, initial_state=(len(grid) - 1, 0))
+
+
+def test_duplicate_of_a_job_waiting_for_room_is_known():
+    async def run():
+        manager = JobManager(workers=1, max_pending=1)
+        # Not started: nothing takes jobs off the queue, so the first submission blocks on a full queue
+        manager.queue = asyncio.Queue(maxsize=1)
+        manager.queue.put_nowait(None)
+
+        first = asyncio.create_task(manager.submit(environment(), {"gamma": 0.9}, wait=True))
+        await asyncio.sleep(0)
+        job_id, duplicate = await manager.submit(environment(), {"gamma": 0.9}, wait=True)
+
+        assert duplicate
+        assert manager.status(job_id)["state"] == QUEUED
+
+        # The waiting submission is abandoned, the joined submission sees the job end
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert manager.status(job_id)["state"] == CANCELLED
+        assert [event["event"] async for event in manager.stream(job_id)] == [QUEUED, CANCELLED]
+        assert not manager.in_flight
+
+    asyncio.run(run())
+
+
+def test_abandoned_submission_without_duplicates_is_forgotten():
+    async def run():
+        manager = JobManager(workers=1, max_pending=1)
+        manager.queue = asyncio.Queue(maxsize=1)
+        manager.queue.put_nowait(None)
+
+        first = asyncio.create_task(manager.submit(environment(), {}, wait=True))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert not manager.jobs and not manager.in_flight
+
+    asyncio.run(run())
+
+
+def test_identical_jobs_are_solved_once():
+    async def run():
+        async with JobManager(workers=1) as manager:
+            first, _ = await manager.submit(environment(), {}, wait=True)
+            second, duplicate = await manager.submit(environment(), {}, wait=True)
+            assert duplicate and second == first
+
+            result = await manager.result(first)
+            assert manager.status(first)["state"] == DONE
+            assert len(result["policy"]) == len(grid)
+
+    asyncio.run(run())
+
+
+def test_finished_jobs_are_evicted_beyond_the_cap():
+    async def run():
+        manager = JobManager(workers=1, max_pending=4, max_finished=1)
+        manager.queue = asyncio.Queue(maxsize=4)
+
+        first, _ = await manager.submit(environment(), {"gamma": 0.9}, wait=False)
+        second, _ = await manager.submit(environment(), {"gamma": 0.8}, wait=False)
+        await manager.cancel(first)
+        await manager.cancel(second)
+        assert list(manager.jobs) == [second]
+
+        # An identical submission after eviction is a new job, not a duplicate of the evicted one
+        again, duplicate = await manager.submit(environment(), {"gamma": 0.9}, wait=False)
+        assert not duplicate and again != first
+
+    asyncio.run(run())
+
+
+def test_finished_jobs_expire_after_their_ttl():
+    async def run():
+        manager = JobManager(workers=1, max_pending=4, finished_ttl=0.0)
+        manager.queue = asyncio.Queue(maxsize=4)
+
+        job_id, _ = await manager.submit(environment(), {}, wait=False)
+        await manager.cancel(job_id)
+        assert not manager.jobs and not manager.finished
+
+    asyncio.run(run())
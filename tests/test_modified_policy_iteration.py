@@ -0,0 +1,26 @@
+import numpy as np
+
+from algos.modified_policy_iteration import ModifiedPolicyIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import action_sets
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def environment() -> Environment:
+    cells, rewards = generate_grid_arrays(21, 29, seed=3, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::12].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(20, 0), terminals=terminals)
+
+
+def test_solution_is_within_epsilon_of_the_reference_with_and_without_elimination():
+    env = environment()
+    for actions in (action_sets["4"], action_sets["8"]):
+        expected = VectorizedValueIteration(actions, 1e-6, 0.99, recorder=Recorder()).solve(env)["utilities"]
+        for elimination in (True, False):
+            agent = ModifiedPolicyIteration(actions, 0.1, 0.99, elimination=elimination, recorder=Recorder())
+            result = agent.solve(env)
+
+            assert np.abs(result["utilities"] - expected).max() <= 0.1
+            assert result["iterations"] == len(result["history"])
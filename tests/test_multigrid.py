@@ -0,0 +1,17 @@
+import numpy as np
+
+from algos.multigrid_value_iteration import coarsen
+from models.environment import Environment
+
+GRID = [['Wh', 'G', 'W', 'W'],
+        ['R', 'W', 'W', 'Wh']]
+REWARDS = [[-0.04, 1.0, 0.0, 0.0],
+           [-1.0, 0.0, 0.0, -0.04]]
+
+
+def test_coarse_cells_take_the_mean_reward_of_their_open_cells():
+    env = Environment(grid_world=GRID, rewards=REWARDS, initial_state=(1, 0))
+    coarse, gamma = coarsen(env, 0.9)
+
+    assert gamma == 0.9 ** 2
+    assert np.allclose(coarse.get_arrays()[1], [[1.9 * (-0.04 + 1.0 - 1.0) / 3, 1.9 * -0.04]])
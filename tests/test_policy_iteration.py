@@ -0,0 +1,66 @@
+from algos.policy_iteration import PolicyIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from models.environment import Environment
+from models.recorder import Recorder
+
+GRID = [['Wh', 'Wh', 'Wh', 'G'],
+        ['Wh', 'W', 'Wh', 'R'],
+        ['Wh', 'Wh', 'Wh', 'Wh']]
+REWARDS = [[-0.04, -0.04, -0.04, 1.0],
+           [-0.04, 0.0, -0.04, -1.0],
+           [-0.04, -0.04, -0.04, -0.04]]
+
+
+def environment():
+    return Environment(grid_world=GRID, rewards=REWARDS, initial_state=(2, 0), terminals=[(0, 3), (1, 3)])
+
+
+def test_auto_reports_the_resolved_strategy_and_counts_solves():
+    result = PolicyIteration(actions, gamma=0.99, evaluation="auto", recorder=Recorder()).solve(environment())
+
+    assert result["evaluation"]["strategy"] == "direct"
+    assert result["iterations"] == result["evaluation"]["outer_iterations"]
+    assert result["solves"] == result["iterations"]
+    assert result["backups"] == 0
+
+
+def test_sweep_counts_backups_of_every_sweep():
+    result = PolicyIteration(actions, k=50, gamma=0.99, recorder=Recorder()).solve(environment())
+    n_states = sum(cell != 'W' for row in GRID for cell in row)
+
+    assert result["evaluation"]["strategy"] == "sweep"
+    assert result["iterations"] == result["evaluation"]["outer_iterations"]
+    assert result["backups"] == result["evaluation"]["inner_iterations"] * n_states
+    assert result["solves"] == 0
+
+
+def test_resolve_warm_starts_from_a_value_iteration_result():
+    env = environment()
+    previous = VectorizedValueIteration(actions, 0.01, 0.99, recorder=Recorder()).solve(env)
+    del previous["backups"]
+
+    rewards = [row[:] for row in REWARDS]
+    rewards[2][3] = -0.5
+    changed_env = Environment(grid_world=GRID, rewards=rewards, initial_state=(2, 0), terminals=[(0, 3), (1, 3)])
+
+    agent = PolicyIteration(actions, gamma=0.99, evaluation="direct", recorder=Recorder())
+    warm = agent.resolve(changed_env, previous, [(2, 3)])
+    cold = PolicyIteration(actions, gamma=0.99, evaluation="direct", recorder=Recorder()).solve(changed_env)
+
+    assert warm["cold_backups"] == previous["iterations"] * 11
+    assert abs(warm["utilities"] - cold["utilities"]).max() < 1e-9
+
+
+def test_resolve_carries_the_cold_cost_forward():
+    env = environment()
+    cold = PolicyIteration(actions, k=50, gamma=0.99, recorder=Recorder()).solve(env)
+    first = PolicyIteration(actions, k=50, gamma=0.99, recorder=Recorder()).resolve(env, cold, [(2, 3)])
+    second = PolicyIteration(actions, k=50, gamma=0.99, recorder=Recorder()).resolve(env, first, [(2, 3)])
+    assert first["cold_backups"] == second["cold_backups"] == cold["backups"]
+    assert second["backups_saved"] == cold["backups"] - second["backups"]
+
+    # Direct evaluation counts sparse solves, not backups, so its cold cost is unknown
+    direct = PolicyIteration(actions, gamma=0.99, evaluation="direct", recorder=Recorder()).solve(env)
+    warm = PolicyIteration(actions, gamma=0.99, evaluation="direct", recorder=Recorder()).resolve(env, direct, [(2, 3)])
+    assert warm["cold_backups"] is None and warm["backups_saved"] is None
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.grid_store import save_result
+from manager.policy_table import PolicyStore, PolicyTable
+from models.environment import Environment
+from models.recorder import Recorder
+
+GRID = [['Wh', 'Wh', 'Wh', 'G'],
+        ['Wh', 'W', 'Wh', 'R'],
+        ['Wh', 'Wh', 'Wh', 'Wh']]
+REWARDS = [[-0.04, -0.04, -0.04, 1.0],
+           [-0.04, 0.0, -0.04, -1.0],
+           [-0.04, -0.04, -0.04, -0.04]]
+
+
+def solve():
+    env = Environment(grid_world=GRID, rewards=REWARDS, initial_state=(2, 0), terminals=[(0, 3), (1, 3)])
+    agent = VectorizedValueIteration(actions, 0.01, 0.99, recorder=Recorder())
+    return env, agent, agent.solve(env)
+
+
+def test_terminal_and_wall_states_have_no_action():
+    env, agent, result = solve()
+    table = PolicyTable.from_result(result, agent.ACTIONS, env)
+
+    positions = np.array([(0, 3), (1, 3), (1, 1)])
+    indices, utilities = table.query(positions)
+    assert indices.tolist() == [-1, -1, -1]
+    assert table.query_vectors(positions).tolist() == [[0, 0], [0, 0], [0, 0]]
+    assert utilities[:2].tolist() == [1.0, -1.0]
+
+
+def test_open_states_match_the_solver_policy():
+    env, agent, result = solve()
+    table = PolicyTable.from_result(result, agent.ACTIONS, env)
+    names = [action.name for action in agent.ACTIONS]
+
+    positions = np.array([(i, j) for i in range(3) for j in range(4) if GRID[i][j] != 'W' and (i, j) not in env.terminals])
+    indices, utilities = table.query(positions)
+    assert [names[a] for a in indices.tolist()] == [result["policy"][i][j].name for i, j in positions.tolist()]
+    assert np.array_equal(utilities, np.asarray(result["utilities"])[positions[:, 0], positions[:, 1]])
+
+
+def test_from_file_masks_terminal_states(tmp_path):
+    env, agent, result = solve()
+    save_result(str(tmp_path / "result.res"), result, agent.ACTIONS)
+
+    masked = PolicyTable.from_file(str(tmp_path / "result.res"), env)
+    assert np.array_equal(masked.policy, PolicyTable.from_result(result, agent.ACTIONS, env).policy)
+
+
+def test_queries_never_mix_swapped_tables():
+    # Every answer of a table has the same action and a utility equal to it
+    tables = [PolicyTable(np.full((50, 50), a, dtype=np.int8), np.full((50, 50), float(a)), actions) for a in (0, 1)]
+    store = PolicyStore(tables[0])
+    positions = np.random.default_rng(0).integers(0, 50, (10000, 2))
+    mixed, stop = [], threading.Event()
+
+    def query():
+        while not stop.is_set():
+            indices, utilities, _ = store.query(positions)
+            mixed.append(not (np.all(indices == indices[0]) and np.all(utilities == indices[0])))
+
+    readers = [threading.Thread(target=query) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for version in range(2000):
+        store.swap(tables[version % 2])
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert mixed and not any(mixed)
+    assert store.snapshot()[1] == 2001
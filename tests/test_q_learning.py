@@ -0,0 +1,42 @@
+import numpy as np
+
+from algos.q_learning import QLearning
+from algos.sarsa import Sarsa
+from config import actions
+from models.environment import Environment
+from models.recorder import Recorder
+
+GRID = [['Wh', 'Wh', 'Wh', 'G'],
+        ['Wh', 'W', 'Wh', 'R'],
+        ['Wh', 'Wh', 'Wh', 'Wh']]
+REWARDS = [[-0.04, -0.04, -0.04, 1.0],
+           [-0.04, 0.0, -0.04, -1.0],
+           [-0.04, -0.04, -0.04, -0.04]]
+
+
+def environment(seed):
+    return Environment(grid_world=GRID, rewards=REWARDS, initial_state=(2, 0), seed=seed, terminals=[(0, 3), (1, 3)])
+
+
+def test_step_batch_reports_rewards_and_terminal_states():
+    env = environment(0)
+    states = np.array([[0, 2], [2, 3]])
+    next_states, rewards, done = env.step_batch(states, np.array([[0, 1], [-1, 0]]))
+
+    assert rewards.tolist() == [REWARDS[i][j] for i, j in next_states.tolist()]
+    assert done.tolist() == [tuple(state) in env.terminals for state in next_states.tolist()]
+    assert [flags.tolist() for flags in env.reset_batch(np.array([[0, 3], [2, 0]]))] == [[1.0, -0.04], [True, False]]
+
+
+def test_seeded_learners_are_reproducible():
+    for learner in (QLearning, Sarsa):
+        runs = [learner(actions, episodes=64, horizon=20, n_envs=16, seed=1, recorder=Recorder()).solve(environment(1))
+                for _ in range(2)]
+        assert np.array_equal(runs[0]["utilities"], runs[1]["utilities"])
+
+
+def test_learners_do_not_compile_the_transition_model():
+    for learner in (QLearning, Sarsa):
+        env = environment(0)
+        learner(actions, episodes=16, horizon=10, n_envs=16, seed=0, recorder=Recorder()).solve(env)
+        assert env.transition_models == {}
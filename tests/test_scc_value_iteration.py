@@ -0,0 +1,36 @@
+import numpy as np
+
+from algos.scc_value_iteration import SCCValueIteration, strongly_connected_components
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def environment() -> Environment:
+    cells, rewards = generate_grid_arrays(23, 31, seed=5, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::8].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(22, 0), terminals=terminals)
+
+
+def test_solution_is_within_epsilon_of_the_reference_for_any_number_of_workers():
+    env = environment()
+    expected = VectorizedValueIteration(actions, 1e-6, 0.99, recorder=Recorder()).solve(env)["utilities"]
+
+    for workers in (1, 4):
+        result = SCCValueIteration(actions, 0.1, 0.99, workers=workers, recorder=Recorder()).solve(env)
+        model = env.get_transition_model(list(actions.values()))
+
+        assert np.abs(result["utilities"] - expected).max() <= 0.1
+        assert sum(component["states"] for component in result["components"]) == model.n_states
+        assert len(result["components"]) > 1
+
+
+def test_components_only_move_into_lower_levels():
+    model = environment().get_transition_model(list(actions.values()))
+    labels, levels, edges = strongly_connected_components(model)
+
+    assert len(labels) == model.n_states
+    assert (levels >= 0).all()
+    assert (levels[edges[:, 0]] > levels[edges[:, 1]]).all()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from models.environment import Environment
+from models.recorder import Recorder
+from models.simulator import Simulator
+
+GRID = [['Wh', 'Wh', 'Wh', 'G'],
+        ['Wh', 'W', 'Wh', 'R'],
+        ['Wh', 'Wh', 'Wh', 'Wh']]
+REWARDS = [[-0.04, -0.04, -0.04, 1.0],
+           [-0.04, 0.0, -0.04, -1.0],
+           [-0.04, -0.04, -0.04, -0.04]]
+
+
+def environment():
+    return Environment(grid_world=GRID, rewards=REWARDS, initial_state=(2, 0), terminals=[(0, 3), (1, 3)])
+
+
+def test_mean_discounted_return_estimates_the_start_utility():
+    env = environment()
+    result = VectorizedValueIteration(actions, 1e-6, 0.9, recorder=Recorder()).solve(env)
+
+    rollouts = Simulator(env, list(actions.values()), seed=0).run(result["policy"], 20000, 200, gamma=0.9)
+    standard_error = rollouts["std_return"] / np.sqrt(rollouts["episodes"])
+
+    assert abs(rollouts["mean_return"] - result["utilities"][2][0]) < 4 * standard_error
+    assert rollouts["success_rate"] == rollouts["successes"].mean()
+    assert rollouts["success_rate"] > 0.5
+
+
+def test_seeded_runs_are_reproducible_and_batching_keeps_the_statistics():
+    env = environment()
+    policy = VectorizedValueIteration(actions, 0.01, 0.99, recorder=Recorder()).solve(env)["policy"]
+
+    first = Simulator(env, list(actions.values()), seed=7).run(policy, 5000, 100, batch_size=5000)
+    second = Simulator(env, list(actions.values()), seed=7).run(policy, 5000, 100, batch_size=5000)
+    assert np.array_equal(first["returns"], second["returns"])
+    assert np.array_equal(first["lengths"], second["lengths"])
+
+    # Streaming statistics over small batches match the statistics of the kept episodes
+    streamed = Simulator(env, list(actions.values()), seed=7).run(policy, 5000, 100, keep_episodes=False, batch_size=512)
+    batched = Simulator(env, list(actions.values()), seed=7).run(policy, 5000, 100, batch_size=512)
+    assert "returns" not in streamed
+    for name in ("return", "length"):
+        values = batched[f"{name}s"]
+        assert np.isclose(streamed[f"mean_{name}"], values.mean())
+        assert np.isclose(streamed[f"std_{name}"], values.std())
+        assert streamed[f"min_{name}"] == values.min() and streamed[f"max_{name}"] == values.max()
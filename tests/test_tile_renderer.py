@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+
+from manager.custom_grid import WALL, WHITE
+from manager.display_manager import DisplayManager, TileRenderer
+
+ACTIONS = {"UP": (-1, 0), "DOWN": (1, 0), "LEFT": (0, -1), "RIGHT": (0, 1)}
+
+
+def renderer(output: str = "", tile_size: int = 64, **kwargs) -> TileRenderer:
+    # 40x24 grid with a wall column, utilities rising along the rows
+    cells = np.full((40, 24), WHITE, dtype=np.uint8)
+    cells[:, 5] = WALL
+    utilities = np.repeat(np.linspace(-1, 1, 40)[:, None], 24, axis=1)
+    policy_index = np.where(cells == WALL, -1, 0).astype(np.int8)
+    return TileRenderer(cells, utilities, policy_index, ACTIONS, output, tile_size=tile_size, **kwargs)
+
+
+def mosaic(tiles: TileRenderer, level: int) -> np.ndarray:
+    rows, cols = tiles.tile_counts(level)
+    return np.concatenate([np.concatenate([tiles.render_tile(level, row, col) for col in range(cols)], axis=1)
+                           for row in range(rows)], axis=0)
+
+
+def test_pyramid_levels_and_tile_counts():
+    tiles = renderer(cell_size=8)
+
+    # 40 cells of 8 pixels need 5 tiles of 64 pixels, so 3 levels double up to it from one tile
+    assert tiles.levels == 4
+    assert [tiles.tile_counts(level) for level in range(tiles.levels)] == [(1, 1), (2, 1), (3, 2), (5, 3)]
+    assert tiles.scale(0) == (1, 1) and tiles.scale(3) == (8, 1)
+
+
+def test_last_level_tiles_colour_every_cell():
+    tiles = renderer(cell_size=4)
+    level = tiles.levels - 1
+    assert tiles.scale(level) == (4, 1)
+
+    # Below the arrow size the cells are plain blocks of their utility colour
+    colors = tiles.colormap(tiles.utilities)
+    colors[tiles.cells == WALL] = DisplayManager.GREY
+    expected = np.repeat(np.repeat(colors, 4, axis=0), 4, axis=1)
+    image = mosaic(tiles, level)
+
+    assert np.array_equal(image[:160, :96], expected)
+    assert (image[160:] == DisplayManager.SCREEN_COLOR).all() and (image[:, 96:] == DisplayManager.SCREEN_COLOR).all()
+    assert (colors[0, 0] == DisplayManager.RED).all() and (colors[-1, 0] == DisplayManager.GREEN).all()
+
+
+def test_coarse_levels_average_the_utilities_under_a_pixel():
+    tiles = renderer(tile_size=16, cell_size=1)
+
+    # At level 0 every pixel covers 4x4 cells, walls are left out of the mean and the wall column leaves 3 open cells
+    assert tiles.scale(0) == (1, 4)
+    tile = tiles.render_tile(0, 0, 0)
+    means = tiles.utilities[:, 0].reshape(10, 4).mean(axis=1)
+
+    assert np.array_equal(tile[:10, 0], tiles.colormap(means))
+    assert np.array_equal(tile[:10, 1], tiles.colormap(means))
+    assert (tile[10:] == DisplayManager.SCREEN_COLOR).all() and (tile[:, 6:] == DisplayManager.SCREEN_COLOR).all()
+
+    # A pixel over walls only is grey
+    tiles.cells[:, 4:8] = WALL
+    assert (tiles.render_tile(0, 0, 0)[:10, 1] == DisplayManager.GREY).all()
+
+
+def test_save_levels_writes_every_tile(tmp_path):
+    tiles = renderer(str(tmp_path), cell_size=8)
+    paths = tiles.save_levels(max_tiles=6)
+
+    assert sorted(os.path.relpath(path, tmp_path) for path in paths) == sorted(
+        os.path.join(str(level), f"{row}_{col}.png") for level in range(3)
+        for row in range(tiles.tile_counts(level)[0]) for col in range(tiles.tile_counts(level)[1]))
+    assert all(os.path.getsize(path) > 0 for path in paths)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from algos.tiled_value_iteration import TiledValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def environment() -> Environment:
+    cells, rewards = generate_grid_arrays(37, 53, seed=0, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::200].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(36, 0), terminals=terminals)
+
+
+def test_tiles_match_the_reference_within_epsilon():
+    env = environment()
+    reference = VectorizedValueIteration(actions, 0.001, 0.99, recorder=Recorder()).solve(env)
+    for local_sweeps in (1, 3):
+        result = TiledValueIteration(actions, 0.01, 0.99, tile_size=16, workers=2, local_sweeps=local_sweeps,
+                                     recorder=Recorder()).solve(env)
+        assert np.abs(result["utilities"] - reference["utilities"]).max() <= 0.01 + 0.001
+
+
+def test_backup_budget_counts_every_local_sweep():
+    env = environment()
+    n_states = int((~env.get_arrays()[0]).sum())
+    result = TiledValueIteration(actions, 0.01, 0.99, tile_size=16, workers=2, local_sweeps=4, max_backups=8 * n_states,
+                                 recorder=Recorder()).solve(env)
+
+    assert result["stop_reason"] == "max_backups"
+    assert result["iterations"] == 2 and result["backups"] == 8 * n_states
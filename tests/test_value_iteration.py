@@ -0,0 +1,58 @@
+import numpy as np
+
+from algos.value_iteration import ValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import actions
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def environment() -> Environment:
+    cells, rewards = generate_grid_arrays(19, 27, seed=4, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[::15].tolist()]
+    return Environment(grid_world=cells, rewards=rewards, initial_state=(18, 0), terminals=terminals)
+
+
+def reference(env: Environment) -> np.ndarray:
+    return VectorizedValueIteration(actions, 1e-6, 0.99, recorder=Recorder()).solve(env)["utilities"]
+
+
+def test_in_place_modes_are_within_epsilon_of_the_reference():
+    env = environment()
+    expected = reference(env)
+    for mode in ("gauss_seidel", "prioritized"):
+        result = ValueIteration(actions, 0.1, 0.99, mode=mode, recorder=Recorder()).solve(env)
+        assert np.abs(result["utilities"] - expected).max() <= 0.1
+        assert result["algorithm"] == f"value_iteration_{mode}"
+
+
+def test_stopping_rules_stay_within_their_error_bound():
+    env = environment()
+    expected = reference(env)
+    max_norm = ValueIteration(actions, 0.1, 0.99, recorder=Recorder()).solve(env)
+
+    # The span rule shifts the utilities to the middle of its bounds, halving the error of the max_norm rule
+    span = ValueIteration(actions, 0.1, 0.99, stopping="span", recorder=Recorder()).solve(env)
+    assert span["stop_reason"] == "span"
+    assert np.abs(span["utilities"] - expected).max() <= span["error_bound"] <= 0.1 / 2
+
+    # The policy rule stops once the greedy policy settles, its bound then covers the larger error
+    policy = ValueIteration(actions, 0.1, 0.99, stopping="policy", recorder=Recorder()).solve(env)
+    assert policy["stop_reason"] == "policy"
+    assert policy["iterations"] < max_norm["iterations"]
+    assert np.abs(policy["utilities"] - expected).max() <= policy["error_bound"]
+
+
+def test_anytime_bounds_hold_after_every_sweep():
+    env = environment()
+    expected = reference(env)
+    agent = ValueIteration(actions, 0.1, 0.99, stopping="span", recorder=Recorder())
+
+    for step in agent.anytime(env):
+        model = step["model"]
+        assert np.abs(model.to_grid(step["utilities"]) - expected).max() <= step["value_bound"] + 1e-9
+    assert step["stop_reason"] == "span"
+
+    budget = ValueIteration(actions, 0.1, 0.99, max_backups=20 * model.n_states, recorder=Recorder()).solve(env)
+    assert budget["stop_reason"] == "max_backups" and budget["iterations"] == 20
@@ -0,0 +1,23 @@
+import numpy as np
+
+from algos.value_iteration import ValueIteration
+from algos.vectorized_value_iteration import VectorizedValueIteration
+from config import action_sets
+from manager.custom_grid import GREEN, generate_grid_arrays
+from models.environment import Environment
+from models.recorder import Recorder
+
+
+def test_matches_the_reference_solver_on_a_rectangular_grid_with_terminals():
+    cells, rewards = generate_grid_arrays(23, 41, seed=2, prune=False)
+    terminals = [tuple(cell) for cell in np.argwhere(cells == GREEN)[:3].tolist()]
+    env = Environment(grid_world=cells, rewards=rewards, initial_state=(22, 0), terminals=terminals)
+    assert len(terminals) == 3 and (~env.get_arrays()[0]).sum() > 700
+
+    for actions in ("4", "8"):
+        reference = ValueIteration(action_sets[actions], 0.01, 0.99, recorder=Recorder()).solve(env)
+        result = VectorizedValueIteration(action_sets[actions], 0.01, 0.99, recorder=Recorder()).solve(env)
+
+        assert np.abs(result["utilities"] - reference["utilities"]).max() < 1e-9
+        assert [[action.name if action else None for action in row] for row in result["policy"]] == \
+               [[action.name if action else None for action in row] for row in reference["policy"]]